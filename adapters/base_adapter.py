@@ -3,51 +3,48 @@ Base adapter utilities for common transformations.
 """
 import logging
 import uuid
-import os
 import yaml
-from typing import Optional, Any, Dict
+from typing import Optional, Any, Dict, Mapping, Sequence
 from datetime import datetime, timezone, timedelta
 
+from services.endpoint_registry import EndpointRegistry, EndpointSpec, compile_path, get_endpoint_registry
+
 logger = logging.getLogger(__name__)
 
 
 class BaseAdapter:
     """Base class with common utility methods for adapters"""
     
-    # Cache for config
-    _config_cache: Optional[Dict[str, Any]] = None
-    _config_path: str = "config/manufacturer_api.yaml"
+    # Compiled endpoint registry (shared with ManufacturerAPIService)
+    _registry: Optional[EndpointRegistry] = None
+    _registry_unavailable: bool = False
     
     @classmethod
-    def _load_config(cls) -> Dict[str, Any]:
-        """Load API configuration from YAML file"""
-        if cls._config_cache is not None:
-            return cls._config_cache
-        
-        config_path = os.getenv("MANUFACTURER_API_CONFIG", cls._config_path)
+    def _get_registry(cls) -> Optional[EndpointRegistry]:
+        """Get the compiled endpoint registry, or None if config can't be loaded"""
+        if BaseAdapter._registry is not None or BaseAdapter._registry_unavailable:
+            return BaseAdapter._registry
         try:
-            with open(config_path, 'r') as f:
-                cls._config_cache = yaml.safe_load(f)
-                return cls._config_cache
+            BaseAdapter._registry = get_endpoint_registry()
         except FileNotFoundError:
-            logger.warning(f"Config file not found at {config_path}, adapters will use defaults")
-            return {}
-        except yaml.YAMLError as e:
-            logger.error(f"Error parsing YAML config: {e}")
-            return {}
+            logger.warning("Manufacturer API config not found, adapters will use defaults")
+            BaseAdapter._registry_unavailable = True
+        except (yaml.YAMLError, ValueError) as e:
+            logger.error(f"Error loading manufacturer API config: {e}")
+            BaseAdapter._registry_unavailable = True
+        return BaseAdapter._registry
     
     @classmethod
-    def get_endpoint_config(cls, endpoint_name: str) -> Optional[Dict[str, Any]]:
-        """Get configuration for a specific endpoint"""
-        config = cls._load_config()
-        profile = os.getenv("MANUFACTURER_API_PROFILE", "default")
-        
-        if not config or "profiles" not in config:
-            return None
-        
-        profile_config = config.get("profiles", {}).get(profile, {})
-        endpoints = profile_config.get("endpoints", {})
-        return endpoints.get(endpoint_name)
+    def get_endpoint_spec(cls, endpoint_name: str) -> Optional[EndpointSpec]:
+        """Get compiled spec for a specific endpoint"""
+        registry = cls._get_registry()
+        return registry.get(endpoint_name) if registry else None
+    
+    @classmethod
+    def get_endpoint_config(cls, endpoint_name: str) -> Optional[Mapping[str, Any]]:
+        """Get configuration for a specific endpoint (read-only view of the YAML)"""
+        spec = cls.get_endpoint_spec(endpoint_name)
+        return spec.raw if spec else None
     
     @staticmethod
     def generate_correlation_id() -> str:
@@ -172,23 +169,8 @@ class BaseAdapter:
         Returns:
             Extracted value or default
         """
-        parts = path.split(".")
-        value = data
-        try:
-            for part in parts:
-                # Try as dict key first
-                if isinstance(value, dict):
-                    value = value.get(part)
-                # Try as list index
-                elif isinstance(value, list):
-                    value = value[int(part)]
-                else:
-                    return default
-                if value is None:
-                    return default
-            return value
-        except (KeyError, IndexError, ValueError, TypeError):
-            return default
+        value = compile_path(path)(data)
+        return default if value is None else value
     
     @staticmethod
     def normalize_state_code(state: Optional[int]) -> Optional[bool]:
@@ -270,13 +252,13 @@ class BaseAdapter:
         Returns:
             Data path string (dot notation) or None
         """
-        endpoint_config = cls.get_endpoint_config(endpoint_name)
-        if endpoint_config and "response" in endpoint_config:
-            return endpoint_config["response"].get("data_path", default_path)
+        spec = cls.get_endpoint_spec(endpoint_name)
+        if spec and spec.data_path:
+            return spec.data_path
         return default_path
     
     @classmethod
-    def get_response_success_codes(cls, endpoint_name: str, default_codes: list = [200, 0]) -> list:
+    def get_response_success_codes(cls, endpoint_name: str, default_codes: Sequence[int] = (200, 0)) -> Sequence[int]:
         """
         Get success codes from config for an endpoint.
         
@@ -285,11 +267,11 @@ class BaseAdapter:
             default_codes: Default success codes
         
         Returns:
-            List of success codes
+            Sequence of success codes
         """
-        endpoint_config = cls.get_endpoint_config(endpoint_name)
-        if endpoint_config and "response" in endpoint_config:
-            return endpoint_config["response"].get("success_codes", default_codes)
+        spec = cls.get_endpoint_spec(endpoint_name)
+        if spec and spec.success_codes is not None:
+            return spec.success_codes
         return default_codes
     
     @classmethod
@@ -297,6 +279,9 @@ class BaseAdapter:
         """
         Extract data from vendor response using config-defined path.
         
+        Uses the precompiled getter for the endpoint's data_path; the
+        default path is compiled once and cached.
+        
         Args:
             vendor_response: Raw vendor API response
             endpoint_name: Internal endpoint name
@@ -305,9 +290,11 @@ class BaseAdapter:
         Returns:
             Extracted data or None
         """
-        data_path = cls.get_response_data_path(endpoint_name, default_path)
-        if data_path:
-            return cls.extract_nested_value(vendor_response, data_path)
+        spec = cls.get_endpoint_spec(endpoint_name)
+        if spec is not None:
+            return spec.extract_data(vendor_response, default_path)
+        if default_path:
+            return compile_path(default_path)(vendor_response)
         
         # Fallback to default locations
         return vendor_response.get("data")
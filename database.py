@@ -1,6 +1,11 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -41,8 +46,59 @@ if DATABASE_URL and DATABASE_URL.startswith("postgresql://"):
         "keepalives_count": 5,
     }
 
+
+class _PoolStats:
+    """Checkout wait times and peak connections held per request."""
+
+    WAIT_BUCKETS_MS = (1, 10, 100, 1000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.wait_hist = [0] * (len(self.WAIT_BUCKETS_MS) + 1)
+        self.requests = 0
+        self.per_request = [0, 0, 0, 0]  # 0, 1, 2, 3+ connections
+
+    def record_wait(self, wait_ms: float, timed_out: bool = False):
+        bucket = next((i for i, b in enumerate(self.WAIT_BUCKETS_MS) if wait_ms < b), len(self.WAIT_BUCKETS_MS))
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+            self.wait_hist[bucket] += 1
+
+    def record_request(self, connections: int):
+        with self._lock:
+            self.requests += 1
+            self.per_request[min(connections, 3)] += 1
+
+
+pool_stats = _PoolStats()
+
+
+class _TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except Exception:
+            pool_stats.record_wait((time.perf_counter() - started) * 1000, timed_out=True)
+            raise
+        pool_stats.record_wait((time.perf_counter() - started) * 1000)
+        return conn
+
+
 engine = create_engine(
     DATABASE_URL,
+    poolclass=_TimedQueuePool,
     pool_pre_ping=True,
     pool_recycle=1800,
     pool_size=10,
@@ -52,3 +108,115 @@ engine = create_engine(
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
+
+
+# ----------------------------------------------------------------------
+# Request-scoped session
+#
+# main.py's middleware opens a RequestScope per HTTP request. Inside it,
+# open_session() returns one lazily created Session shared by get_db and
+# every helper (get_user_devices, register_user, device_acl, ...), so a
+# request checks out at most one pooled connection. Outside a request
+# (background jobs, scripts) open_session() is a plain SessionLocal().
+# close_session() only closes sessions that open_session() created for
+# the caller; the request's session is closed when the request ends.
+#
+# Helpers still commit their own work. A request's session must only be
+# used from one thread at a time: don't hand it to concurrent executor
+# jobs (the geocoding batch and background services keep SessionLocal).
+# ----------------------------------------------------------------------
+
+class RequestScope:
+
+    def __init__(self):
+        self.session: Optional[Session] = None
+        self.held = 0
+        self.peak_held = 0
+        self.closed = False
+        self._lock = threading.Lock()
+
+    def get_session(self) -> Optional[Session]:
+        with self._lock:
+            if self.closed:
+                return None
+            if self.session is None:
+                self.session = SessionLocal()
+            return self.session
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+            session, self.session = self.session, None
+        if session is not None:
+            session.close()
+        pool_stats.record_request(self.peak_held)
+
+
+_request_scope: ContextVar[Optional[RequestScope]] = ContextVar("db_request_scope", default=None)
+
+
+def begin_request_scope():
+    """Start a request scope; returns (scope, token) for end_request_scope."""
+    scope = RequestScope()
+    return scope, _request_scope.set(scope)
+
+
+def end_request_scope(token):
+    """Detach the scope from this context; the caller then calls scope.close()."""
+    _request_scope.reset(token)
+
+
+def open_session() -> Session:
+    scope = _request_scope.get()
+    session = scope.get_session() if scope is not None else None
+    return session if session is not None else SessionLocal()
+
+
+def close_session(session: Session):
+    scope = _request_scope.get()
+    if scope is not None and scope.session is session:
+        return
+    session.close()
+
+
+def get_db():
+    """FastAPI dependency: the request's shared session."""
+    db = open_session()
+    try:
+        yield db
+    finally:
+        close_session(db)
+
+
+@event.listens_for(engine, "checkout")
+def _track_request_checkout(dbapi_connection, connection_record, connection_proxy):
+    scope = _request_scope.get()
+    if scope is not None:
+        connection_record.info["request_scope"] = scope
+        scope.held += 1
+        scope.peak_held = max(scope.peak_held, scope.held)
+
+
+@event.listens_for(engine, "checkin")
+def _track_request_checkin(dbapi_connection, connection_record):
+    scope = connection_record.info.pop("request_scope", None)
+    if scope is not None:
+        scope.held -= 1
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    pool = engine.pool
+    stats = pool_stats
+    labels = [f"<{b}ms" for b in stats.WAIT_BUCKETS_MS] + [f">={stats.WAIT_BUCKETS_MS[-1]}ms"]
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "checkouts": stats.checkouts,
+        "timeouts": stats.timeouts,
+        "avg_wait_ms": round(stats.total_wait_ms / stats.checkouts, 2) if stats.checkouts else 0,
+        "max_wait_ms": round(stats.max_wait_ms, 1),
+        "wait_histogram": dict(zip(labels, stats.wait_hist)),
+        "requests": stats.requests,
+        "connections_per_request": dict(zip(["0", "1", "2", "3+"], stats.per_request)),
+    }
@@ -1,10 +1,12 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse, JSONResponse
+from starlette.concurrency import run_in_threadpool
 from contextlib import asynccontextmanager
 from concurrent.futures import ThreadPoolExecutor
 import logging
 import asyncio
+import anyio
 import time
 
 # Configure logging to show INFO level messages in Render logs
@@ -16,15 +18,27 @@ logging.basicConfig(
 from routers import auth, devices, media, gps, alarms, tasks, reports, admin, database_info, forwarding, notifications
 from routers import orders, inventory, worker_auth, uploads, income  # OMS
 from routers import monitoring as monitoring_router
-from database import Base, engine
+from database import Base, engine, begin_request_scope, end_request_scope
 from models.device_db import DeviceDB
 from models.user_db import UserDB
 from models.device_cache_db import DeviceCacheDB, AlarmDB  # New cache models
 from models.fcm_token_db import FCMTokenDB, UserNotificationSettingsDB  # Push notification models
 from models.order_db import OrderDB, OrderPhotoDB, OrderActivityDB  # OMS models
 from models.inventory_db import ProductDB, WorkerInventoryDB, InventoryTransactionDB, WorkerPaymentDB, ManualCarsDB  # Inventory models
+from models.geocode_cache_db import GeocodeCacheDB  # Persistent geocode cache
+from models.service_lease_db import ServiceLeaseDB  # Background job leader leases
+from models.track_cache_db import TrackCacheDB  # Persistent track playback cache
+from models.cache_generation_db import CacheGenerationDB  # Cross-process cache invalidation stamps
+from models.job_control_db import JobControlDB  # Shared job pause/trigger state
 from services.device_auto_config_service import device_auto_config  # Auto-configuration service
 from services.vms_sync_service import vms_sync  # Background VMS polling for device_cache freshness
+from services.geocoding_service import GeocodingService
+from services.address_backfill_service import address_backfill  # Background address backfill for device_cache
+from services.alert_aggregator import alert_aggregator  # Push burst aggregation / digests
+from services.leader_election import leader_election  # One runner per background job across workers
+from services.job_scheduler import scheduler  # Periodic background jobs
+from services.password_hasher import password_hasher  # Login hashing off the request threads
+from services.track_cache import track_cache  # Cached /gps/history playbacks
 
 # Create all tables (with error handling for connection issues)
 try:
@@ -39,23 +53,66 @@ except Exception as e:
 async def lifespan(app: FastAPI):
     """
     Lifespan context manager for startup and shutdown events.
-    Starts the device auto-configuration background worker.
+    Starts the background workers (leader-elected ones via leader_election).
     """
     # Startup
     loop = asyncio.get_running_loop()
     loop.set_default_executor(ThreadPoolExecutor(max_workers=20))
     print("🚀 Starting background services...")
-    device_auto_config.start()
-    print("✅ Device Auto-Configuration Service started")
-    vms_sync.start()
-    print("✅ VMS Sync Service started")
+    # Periodic jobs. leader= jobs run only in the process holding that lease.
+    scheduler.register(
+        "vms_sync", vms_sync.run_cycle,
+        interval=vms_sync.SYNC_INTERVAL_SECONDS, timeout=vms_sync.SYNC_CYCLE_TIMEOUT,
+        jitter=5, leader="vms_sync",
+        description="Poll stale devices and GPS gaps from the VMS",
+    )
+    scheduler.register(
+        "autoconfig_status_sync", device_auto_config.sync_device_statuses,
+        interval=device_auto_config.CHECK_INTERVAL_SECONDS, timeout=device_auto_config.CYCLE_TIMEOUT,
+        leader="device_auto_config",
+        description="Copy ACC/online state from device_cache into devices.status",
+    )
+    scheduler.register(
+        "autoconfig_reconcile", device_auto_config.reconcile,
+        interval=device_auto_config.RECONCILE_INTERVAL_SECONDS, timeout=device_auto_config.CYCLE_TIMEOUT,
+        jitter=10, leader="device_auto_config",
+        description="Re-queue unconfigured online devices for auto-configuration",
+    )
+    scheduler.register(
+        "address_backfill", address_backfill.run_scheduled,
+        interval=address_backfill.INTERVAL_SECONDS, timeout=address_backfill.CYCLE_TIMEOUT,
+        jitter=30, leader="address_backfill",
+        description="Geocode device_cache rows without an address",
+    )
+    scheduler.register(
+        "track_cache_prune", track_cache.prune,
+        interval=track_cache.PRUNE_INTERVAL_SECONDS, timeout=300,
+        jitter=60, leader="track_cache_prune",
+        description="Evict least recently read track_cache rows beyond the size budget",
+    )
+    # Per-process: digests for the windows this process opened
+    scheduler.register(
+        "alert_digest_flush", alert_aggregator.flush_digests,
+        interval=alert_aggregator.FLUSH_INTERVAL_SECONDS, timeout=60,
+        description="Send digests for expired alert aggregation windows",
+    )
+    # Event-driven auto-config dispatcher follows the same lease as its jobs
+    leader_election.register("device_auto_config", device_auto_config.start, device_auto_config.stop)
+    leader_election.start()
+    print(f"✅ Leader election started (node {leader_election.node_id})")
+    scheduler.start()
+    print("✅ Job scheduler started")
+    password_hasher.start()
+    print(f"✅ Password hasher started ({password_hasher.workers} processes)")
     
     yield  # App is running
     
     # Shutdown
     print("🛑 Stopping background services...")
-    device_auto_config.stop()
-    vms_sync.stop()
+    scheduler.stop()
+    leader_election.stop()
+    password_hasher.shutdown()
+    GeocodingService.flush_pending()
     print("✅ Background services stopped")
 
 app = FastAPI(
@@ -83,6 +140,38 @@ app.add_middleware(
     allow_headers=["*"],    # allow all headers
 )
 
+class RequestDBSessionMiddleware:
+    """
+    One shared DB session per request (see database.open_session).
+
+    Added before the timeout middleware so it sits inside it. When a request
+    times out, the 504 goes out but a sync handler keeps running on its
+    threadpool thread; this middleware only returns once that thread is done,
+    so the session is never closed while the handler may still be using it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_scope, token = begin_request_scope()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            end_request_scope(token)
+            # Closing returns the connection to the pool (a rollback round trip);
+            # shielded so a cancelled request still releases it
+            if request_scope.session is not None:
+                with anyio.CancelScope(shield=True):
+                    await run_in_threadpool(request_scope.close)
+            else:
+                request_scope.close()
+
+app.add_middleware(RequestDBSessionMiddleware)
+
 # Request metrics middleware
 from services.monitoring_service import monitoring
 
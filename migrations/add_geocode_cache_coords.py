@@ -0,0 +1,48 @@
+"""
+Migration: Add latitude/longitude columns to geocode_cache for
+spatial-neighbourhood lookups.
+
+Run on the server with:
+    python migrations/add_geocode_cache_coords.py
+
+Safe to run multiple times — uses exception handling for existing columns.
+Rows written before this migration keep NULL coordinates and are only
+matched by exact cell key.
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import engine
+from sqlalchemy import text
+
+
+def migrate():
+    statements = [
+        "ALTER TABLE geocode_cache ADD COLUMN latitude DOUBLE PRECISION",
+        "ALTER TABLE geocode_cache ADD COLUMN longitude DOUBLE PRECISION",
+        "CREATE INDEX ix_geocode_cache_lat_lng ON geocode_cache (latitude, longitude)",
+    ]
+
+    with engine.connect() as conn:
+        for stmt in statements:
+            try:
+                conn.execute(text(stmt))
+                conn.commit()
+                print(f"  ✅  {stmt}")
+            except Exception as e:
+                conn.rollback()
+                msg = str(e).lower()
+                if "already exists" in msg or "duplicate" in msg:
+                    print(f"  ⏭️  Already applied, skipping: {stmt}")
+                else:
+                    print(f"  ❌  Error: {e}")
+                    raise
+
+    print("\n✅ Migration complete.")
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, String, BigInteger, DateTime
+from database import Base
+from datetime import datetime
+
+
+class CacheGenerationDB(Base):
+    """
+    Cross-process invalidation stamp for an in-memory cache (see
+    services/cache_generation.py). One row per cache; every invalidation
+    increments generation, and each process drops its cached entries when
+    it sees a number it hasn't seen before.
+    """
+    __tablename__ = "cache_generations"
+
+    name = Column(String(64), primary_key=True)  # e.g. "device_acl"
+    generation = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
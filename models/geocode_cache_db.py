@@ -0,0 +1,27 @@
+from sqlalchemy import Column, String, Integer, Float, DateTime, Text, Index
+from database import Base
+from datetime import datetime
+
+
+class GeocodeCacheDB(Base):
+    """
+    Persistent reverse-geocode cache (L2 tier behind GeocodingService's
+    in-memory LRU). Keyed by the same rounded cell as the in-memory cache
+    (~111 m at 3 decimals), shared by all workers and kept across deploys.
+    """
+    __tablename__ = "geocode_cache"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    cell_key = Column(String(32), unique=True, index=True, nullable=False)  # "24.713,46.675"
+    address = Column(Text, nullable=False)
+
+    # Point the address was resolved for (spatial-neighbourhood lookups)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+    __table_args__ = (
+        Index("ix_geocode_cache_lat_lng", "latitude", "longitude"),
+    )
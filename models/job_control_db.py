@@ -0,0 +1,26 @@
+from sqlalchemy import Column, String, Boolean, DateTime, Float
+from database import Base
+from datetime import datetime
+
+
+class JobControlDB(Base):
+    """
+    Shared control and last-run state of a scheduled job (see
+    services/job_scheduler.py). Admin pause/resume/trigger write here and
+    every process applies the row on its next control poll, so the action
+    reaches whichever process actually runs the job. The process that ran
+    the job last records the outcome.
+    """
+    __tablename__ = "job_controls"
+
+    name = Column(String(64), primary_key=True)  # scheduler job name
+    paused = Column(Boolean, nullable=False, default=False)
+    trigger_requested_at = Column(DateTime, nullable=True)
+    updated_by = Column(String(128), nullable=True)  # node id that last changed paused/trigger
+    updated_at = Column(DateTime, nullable=True)
+
+    last_run_node = Column(String(128), nullable=True)
+    last_run_started_at = Column(DateTime, nullable=True)
+    last_run_finished_at = Column(DateTime, nullable=True)
+    last_run_duration_s = Column(Float, nullable=True)
+    last_run_error = Column(String(500), nullable=True)
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, String, DateTime
+from database import Base
+from datetime import datetime
+
+
+class ServiceLeaseDB(Base):
+    """
+    Leader lease for a background job (see services/leader_election.py).
+    One row per job; the holder renews expires_at while it runs the job and
+    any other process may take the row over once it has expired.
+    """
+    __tablename__ = "service_leases"
+
+    name = Column(String(64), primary_key=True)  # e.g. "vms_sync"
+    holder = Column(String(128), nullable=True)  # node id "host:pid"
+    acquired_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    expires_at = Column(DateTime, nullable=True, default=datetime.utcnow)
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, String, Integer, DateTime, LargeBinary
+from database import Base
+from datetime import datetime
+
+
+class TrackCacheDB(Base):
+    """
+    Persistent track playback cache (L2 tier behind services/track_cache.py).
+    One row per (device, date, time window) of a finished day: the parsed
+    points as a zlib-compressed columnar MessagePack blob. Rows are never
+    updated; the least recently read ones are pruned to stay under the
+    size budget.
+    """
+    __tablename__ = "track_cache"
+
+    cache_key = Column(String(160), primary_key=True)  # "device|2024-01-01|00:00:00-23:59:59"
+    device_id = Column(String(100), index=True, nullable=False)
+    track_date = Column(String(10), nullable=False)
+    blob = Column(LargeBinary(length=16 * 1024 * 1024), nullable=False)  # MEDIUMBLOB on MySQL
+    size_bytes = Column(Integer, nullable=False)
+    point_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_accessed_at = Column(DateTime, default=datetime.utcnow, index=True)
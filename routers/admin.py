@@ -6,13 +6,19 @@ from services.auth_service import get_current_user, create_user
 from services.manufacturer_api_service import manufacturer_api
 from services.device_sync_service import sync_devices_from_manufacturer, get_sync_status
 from services.device_auto_config_service import device_auto_config
+from services.device_acl import device_acl
+from services.leader_election import leader_election
+from services.job_scheduler import scheduler
+from services.address_backfill_service import address_backfill
+from services.geocoding_service import GeocodingService
 from models.user import UserCreate, UserResponse
 from models.user_db import UserDB
 from models.device_db import DeviceDB
-from database import SessionLocal
+from database import open_session, close_session
 from typing import Optional, List
 from pydantic import BaseModel
 from datetime import datetime, timedelta
+import time
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
@@ -43,6 +49,22 @@ class ForwardingPolicyRequest(BaseModel):
 class ManualConfigRequest(BaseModel):
     device_id: str
 
+class GeocodePoint(BaseModel):
+    latitude: float
+    longitude: float
+
+class BatchGeocodeRequest(BaseModel):
+    points: List[GeocodePoint]
+
+# Geocoding stops after this many seconds so the request ends well inside
+# main.REQUEST_TIMEOUT_SECONDS; the cap is what the budget covers if every
+# point is an uncached cell hitting provider timeouts
+BATCH_GEOCODE_BUDGET_SECONDS = 90
+MAX_BATCH_GEOCODE_POINTS = int(
+    BATCH_GEOCODE_BUDGET_SECONDS / GeocodingService.WORST_CASE_LOOKUP_SECONDS
+    * address_backfill.GEOCODE_CONCURRENCY
+)
+
 def is_admin_user(current_user: dict) -> bool:
     """Check if current user has admin privileges"""
     return current_user.get("is_admin", False) or current_user.get("role") == "admin"
@@ -60,7 +82,8 @@ def get_autoconfig_status(current_user: dict = Depends(get_current_user)):
     
     return {
         "success": True,
-        "service_status": device_auto_config.get_status()
+        "service_status": device_auto_config.get_status(),
+        "leadership": leader_election.get_job_status("device_auto_config"),
     }
 
 @router.get("/autoconfig/devices")
@@ -72,7 +95,7 @@ def get_autoconfig_device_status(current_user: dict = Depends(get_current_user))
     if not is_admin_user(current_user):
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    db = SessionLocal()
+    db = open_session()
     try:
         devices = db.query(DeviceDB).all()
         
@@ -113,7 +136,7 @@ def get_autoconfig_device_status(current_user: dict = Depends(get_current_user))
             }
         }
     finally:
-        db.close()
+        close_session(db)
 
 @router.post("/autoconfig/configure/{device_id}")
 async def manual_configure_device(
@@ -154,7 +177,7 @@ def reset_all_device_configs(current_user: dict = Depends(get_current_user)):
     if not is_admin_user(current_user):
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    db = SessionLocal()
+    db = open_session()
     try:
         # Reset all devices
         db.query(DeviceDB).update({
@@ -163,13 +186,80 @@ def reset_all_device_configs(current_user: dict = Depends(get_current_user)):
             DeviceDB.config_last_attempt: None
         })
         db.commit()
+        device_auto_config.request_reconcile()
         
         return {
             "success": True,
             "message": "All device configurations have been reset. Devices will be reconfigured when they come online."
         }
     finally:
-        db.close()
+        close_session(db)
+
+
+# ==================== BACKGROUND JOBS ====================
+
+@router.get("/jobs")
+def list_background_jobs(current_user: dict = Depends(get_current_user)):
+    """
+    List scheduled background jobs with schedule, leadership and run metrics.
+    Counters are for the process that served the request (served_by); each
+    job's last_run is shared and shows the latest run in any process.
+    """
+    if not is_admin_user(current_user):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return {
+        "success": True,
+        "served_by": leader_election.node_id,
+        "scheduler": scheduler.get_status(),
+        "leadership": leader_election.get_status(),
+    }
+
+def _job_action_response(job_name: str) -> dict:
+    return {
+        "success": True,
+        "served_by": leader_election.node_id,
+        "applies_within_seconds": scheduler.CONTROL_POLL_SECONDS,
+        "job": scheduler.get_job_status(job_name),
+    }
+
+@router.post("/jobs/{job_name}/pause")
+def pause_background_job(job_name: str, current_user: dict = Depends(get_current_user)):
+    """Stop scheduling a job in every process until it is resumed."""
+    if not is_admin_user(current_user):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    try:
+        found = scheduler.pause(job_name)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Failed to store job control: {str(e)}")
+    if not found:
+        raise HTTPException(status_code=404, detail=f"Job {job_name} not found")
+    return _job_action_response(job_name)
+
+@router.post("/jobs/{job_name}/resume")
+def resume_background_job(job_name: str, current_user: dict = Depends(get_current_user)):
+    """Resume a paused job in every process."""
+    if not is_admin_user(current_user):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    try:
+        found = scheduler.resume(job_name)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Failed to store job control: {str(e)}")
+    if not found:
+        raise HTTPException(status_code=404, detail=f"Job {job_name} not found")
+    return _job_action_response(job_name)
+
+@router.post("/jobs/{job_name}/trigger")
+def trigger_background_job(job_name: str, current_user: dict = Depends(get_current_user)):
+    """
+    Run a job now, in whichever process runs it (the lease holder for
+    leader-elected jobs). Still skipped if a previous run is in flight.
+    """
+    if not is_admin_user(current_user):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    if not scheduler.trigger(job_name):
+        raise HTTPException(status_code=404, detail=f"Job {job_name} not found")
+    return _job_action_response(job_name)
 
 
 # ==================== USER MANAGEMENT ====================
@@ -211,7 +301,7 @@ def create_new_user(
     if not is_admin_user(current_user):
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    db = SessionLocal()
+    db = open_session()
     try:
         result = create_user({
             "invoice_no": user_data.invoice_no,
@@ -224,7 +314,7 @@ def create_new_user(
         db_user = db.query(UserDB).filter(UserDB.invoice_no == user_data.invoice_no).first()
         return db_user
     finally:
-        db.close()
+        close_session(db)
 
 @router.get("/users")
 def list_all_users(
@@ -243,7 +333,7 @@ def list_all_users(
     if not is_admin_user(current_user):
         raise HTTPException(status_code=403, detail="Admin access required")
 
-    db = SessionLocal()
+    db = open_session()
     try:
         query = db.query(UserDB)
 
@@ -273,7 +363,7 @@ def list_all_users(
             },
         }
     finally:
-        db.close()
+        close_session(db)
 
 
 @router.get("/users/{user_id}")
@@ -285,14 +375,14 @@ def get_user_detail(
     if not is_admin_user(current_user):
         raise HTTPException(status_code=403, detail="Admin access required")
 
-    db = SessionLocal()
+    db = open_session()
     try:
         user = db.query(UserDB).filter(UserDB.id == user_id).first()
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         return {"success": True, "user": _serialize_user(user, db)}
     finally:
-        db.close()
+        close_session(db)
 
 
 @router.post("/users/{user_id}/reset-password")
@@ -311,9 +401,9 @@ def reset_user_password(
         raise HTTPException(status_code=403, detail="Admin access required")
 
     import secrets, string
-    from services.auth_service import hash_password
+    from services.password_hasher import password_hasher
 
-    db = SessionLocal()
+    db = open_session()
     try:
         user = db.query(UserDB).filter(UserDB.id == user_id).first()
         if not user:
@@ -322,7 +412,7 @@ def reset_user_password(
         password = new_password or "".join(
             secrets.choice(string.ascii_letters + string.digits) for _ in range(10)
         )
-        user.password_hash = hash_password(password)
+        user.password_hash = password_hasher.hash_blocking(password)
         db.commit()
 
         return {
@@ -333,7 +423,7 @@ def reset_user_password(
             "temporary_password": password,
         }
     finally:
-        db.close()
+        close_session(db)
 
 
 @router.delete("/users/{user_id}")
@@ -353,7 +443,7 @@ def delete_user(
 
     from services.auth_service import delete_user_account
 
-    db = SessionLocal()
+    db = open_session()
     try:
         user = db.query(UserDB).filter(UserDB.id == user_id).first()
         if not user:
@@ -366,7 +456,7 @@ def delete_user(
             "message": f"User '{user_name}' has been deleted",
         }
     finally:
-        db.close()
+        close_session(db)
 
 
 @router.post("/users/reset-password-by-invoice")
@@ -383,9 +473,9 @@ def reset_password_by_invoice(
         raise HTTPException(status_code=403, detail="Admin access required")
 
     import secrets, string
-    from services.auth_service import hash_password
+    from services.password_hasher import password_hasher
 
-    db = SessionLocal()
+    db = open_session()
     try:
         user = db.query(UserDB).filter(UserDB.invoice_no == invoice_no).first()
         if not user:
@@ -394,7 +484,7 @@ def reset_password_by_invoice(
         password = new_password or "".join(
             secrets.choice(string.ascii_letters + string.digits) for _ in range(10)
         )
-        user.password_hash = hash_password(password)
+        user.password_hash = password_hasher.hash_blocking(password)
         db.commit()
 
         return {
@@ -405,7 +495,71 @@ def reset_password_by_invoice(
             "temporary_password": password,
         }
     finally:
-        db.close()
+        close_session(db)
+
+
+# ==================== GEOCODING ====================
+
+@router.post("/geocode/batch")
+def batch_geocode(
+    request: BatchGeocodeRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Reverse-geocode a list of points (admin only).
+    Points in the same cache cell are resolved once; results keep request order.
+    """
+    if not is_admin_user(current_user):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    if len(request.points) > MAX_BATCH_GEOCODE_POINTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BATCH_GEOCODE_POINTS} points per request"
+        )
+    
+    addresses = GeocodingService.batch_reverse_geocode(
+        [(p.latitude, p.longitude) for p in request.points],
+        max_workers=address_backfill.GEOCODE_CONCURRENCY,
+        deadline=time.monotonic() + BATCH_GEOCODE_BUDGET_SECONDS,
+    )
+    return {
+        "success": True,
+        "count": len(addresses),
+        "resolved": sum(1 for a in addresses if a),
+        "results": [
+            {"latitude": p.latitude, "longitude": p.longitude, "address": a}
+            for p, a in zip(request.points, addresses)
+        ],
+    }
+
+@router.post("/geocode/backfill")
+async def run_address_backfill(
+    limit: Optional[int] = Query(None, ge=1, le=5000),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Run one address backfill pass over device_cache now (admin only).
+    """
+    if not is_admin_user(current_user):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    result = await address_backfill.run_once(limit)
+    return {"success": True, "result": result}
+
+@router.get("/geocode/backfill/status")
+def get_address_backfill_status(current_user: dict = Depends(get_current_user)):
+    """
+    Get address backfill service status and geocode cache stats (admin only).
+    """
+    if not is_admin_user(current_user):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return {
+        "success": True,
+        "service_status": address_backfill.get_status(),
+        "leadership": leader_election.get_job_status("address_backfill"),
+        "cache": GeocodingService.get_cache_stats(),
+    }
 
 
 # ==================== DEVICE MANAGEMENT ====================
@@ -450,7 +604,7 @@ def assign_device_to_user(
     if not is_admin_user(current_user):
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    db = SessionLocal()
+    db = open_session()
     try:
         # Check if user exists
         user = db.query(UserDB).filter(UserDB.id == assignment.user_id).first()
@@ -474,6 +628,7 @@ def assign_device_to_user(
         db.add(new_device)
         db.commit()
         db.refresh(new_device)
+        device_acl.invalidate_user(assignment.user_id)
         
         return {
             "success": True,
@@ -486,7 +641,7 @@ def assign_device_to_user(
             }
         }
     finally:
-        db.close()
+        close_session(db)
 
 @router.get("/devices/unassigned")
 def get_unassigned_devices(current_user: dict = Depends(get_current_user)):
@@ -508,7 +663,7 @@ def get_unassigned_devices(current_user: dict = Depends(get_current_user)):
     manufacturer_devices = result.get("data", {}).get("devices", [])
     
     # Get assigned devices from local database
-    db = SessionLocal()
+    db = open_session()
     try:
         assigned_device_ids = db.query(DeviceDB.device_id).all()
         assigned_device_ids = [device_id[0] for device_id in assigned_device_ids]
@@ -535,7 +690,7 @@ def get_unassigned_devices(current_user: dict = Depends(get_current_user)):
             "total_assigned": len(assigned_device_ids)
         }
     finally:
-        db.close()
+        close_session(db)
 
 
 # ==================== SYSTEM CONFIGURATION ====================
@@ -695,7 +850,7 @@ def get_admin_dashboard_overview(current_user: dict = Depends(get_current_user))
     if not is_admin_user(current_user):
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    db = SessionLocal()
+    db = open_session()
     try:
         # Get basic statistics
         total_users = db.query(UserDB).count()
@@ -729,4 +884,4 @@ def get_admin_dashboard_overview(current_user: dict = Depends(get_current_user))
             }
         }
     finally:
-        db.close()
+        close_session(db)
@@ -3,6 +3,7 @@ Alarms Router - Handles device alarms and alarm management
 """
 from fastapi import APIRouter, Depends, HTTPException, Query
 from services.auth_service import get_current_user, get_user_devices
+from services.device_acl import verify_device_access
 from services.manufacturer_api_service import manufacturer_api
 from typing import Optional
 from pydantic import BaseModel
@@ -25,13 +26,6 @@ class AttachmentRequest(BaseModel):
     alarm_id: str
     attachment_type: Optional[str] = "image"  # image, video, etc.
 
-def verify_device_access(device_id: str, current_user: dict) -> bool:
-    """Verify that the current user has access to the specified device"""
-    is_admin = current_user.get("is_admin", False)
-    user_devices = get_user_devices(current_user["user_id"], is_admin=is_admin)
-    user_device_ids = [device.device_id for device in user_devices]
-    return device_id in user_device_ids
-
 @router.get("/recent/{device_id}")
 def get_recent_alarms(
     device_id: str,
@@ -1,7 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import HTMLResponse
+from starlette.concurrency import run_in_threadpool
 from models.user import UserCreate, UserLogin, ChangePassword, UserResponse, PasswordResetRequest, ProfileUpdateRequest, ProfileResponse
 import services.auth_service as auth_service
+from services.password_hasher import password_hasher
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
@@ -74,23 +76,25 @@ def delete_account_info():
     """
 
 @router.post("/register")
-def register(user: UserCreate):
+async def register(user: UserCreate):
     """
     Register a new user with invoice number, device ID, name, email, and password.
     Returns a JWT access token if registration is successful.
     """
-    return auth_service.register_user(user)
+    await run_in_threadpool(auth_service.validate_registration, user)
+    password_hash = await password_hasher.hash(user.password)
+    return await run_in_threadpool(auth_service.register_user, user, password_hash)
 
 @router.post("/login")
-def login(user: UserLogin):
+async def login(user: UserLogin):
     """
     Login with invoice number & password.
     Returns a JWT access token if credentials are valid.
     """
-    return auth_service.login_user(user)
+    return await auth_service.login_user(user)
 
 @router.post("/change-password")
-def change_password(
+async def change_password(
     password_data: ChangePassword, 
     current_user: dict = Depends(auth_service.get_current_user)
 ):
@@ -98,7 +102,7 @@ def change_password(
     Change the current user's password.
     Requires valid JWT token and current password verification.
     """
-    return auth_service.change_password(
+    return await auth_service.change_password(
         current_user["invoice_no"], 
         password_data.current_password,
         password_data.new_password
@@ -117,27 +121,27 @@ def get_current_user_info(current_user: dict = Depends(auth_service.get_current_
     """
     Get current user information from JWT token.
     """
-    from database import SessionLocal
+    from database import open_session, close_session
     from models.user_db import UserDB
     
-    db = SessionLocal()
+    db = open_session()
     try:
         db_user = db.query(UserDB).filter(UserDB.id == current_user["user_id"]).first()
         if not db_user:
             raise HTTPException(status_code=404, detail="User not found")
         return db_user
     finally:
-        db.close()
+        close_session(db)
 
 @router.get("/profile", response_model=ProfileResponse)
 def get_user_profile(current_user: dict = Depends(auth_service.get_current_user)):
     """
     Get current user's profile (invoice_no, name, email, phone).
     """
-    from database import SessionLocal
+    from database import open_session, close_session
     from models.user_db import UserDB
     
-    db = SessionLocal()
+    db = open_session()
     try:
         db_user = db.query(UserDB).filter(UserDB.id == current_user["user_id"]).first()
         if not db_user:
@@ -150,7 +154,7 @@ def get_user_profile(current_user: dict = Depends(auth_service.get_current_user)
             phone=db_user.phone
         )
     finally:
-        db.close()
+        close_session(db)
 
 @router.put("/profile", response_model=ProfileResponse)
 def update_user_profile(
@@ -160,10 +164,10 @@ def update_user_profile(
     """
     Update current user's profile (name, email, phone).
     """
-    from database import SessionLocal
+    from database import open_session, close_session
     from models.user_db import UserDB
     
-    db = SessionLocal()
+    db = open_session()
     try:
         db_user = db.query(UserDB).filter(UserDB.id == current_user["user_id"]).first()
         if not db_user:
@@ -192,7 +196,7 @@ def update_user_profile(
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Error updating profile: {str(e)}")
     finally:
-        db.close()
+        close_session(db)
 
 @router.delete("/account")
 def delete_account(current_user: dict = Depends(auth_service.get_current_user)):
@@ -213,9 +217,9 @@ def admin_delete_account_by_device(
     if not current_user.get("is_admin", False):
         raise HTTPException(status_code=403, detail="Admin access required")
 
-    from database import SessionLocal
+    from database import open_session, close_session
     from models.device_db import DeviceDB
-    db = SessionLocal()
+    db = open_session()
     try:
         device = db.query(DeviceDB).filter(DeviceDB.device_id == device_id).first()
         if not device:
@@ -224,4 +228,4 @@ def admin_delete_account_by_device(
             raise HTTPException(status_code=404, detail="No user assigned to this device")
         return auth_service.delete_user_account(device.assigned_user_id, db=db)
     finally:
-        db.close()
+        close_session(db)
@@ -3,14 +3,16 @@ Devices Router - Handles device management and configuration
 """
 from fastapi import APIRouter, Depends, HTTPException
 from services.auth_service import get_current_user, get_user_devices
+from services.device_acl import device_acl, verify_device_access
 from services.manufacturer_api_service import manufacturer_api
 from services.chinamdvr_service import chinamdvr_service
 from typing import Optional, List
 from pydantic import BaseModel
-from database import SessionLocal
+from database import open_session, close_session
 from models.device_db import DeviceDB
 from models.device_cache_db import DeviceCacheDB, AlarmDB
 from models.fcm_token_db import UserNotificationSettingsDB
+from services.subscription_graph import subscription_graph
 from adapters import GPSAdapter
 from datetime import datetime, timezone
 from fastapi import Query
@@ -41,6 +43,7 @@ def _create_default_notification_settings(user_id: int, device_id: str, db_sessi
             )
             db_session.add(new_setting)
             db_session.commit()
+            subscription_graph.invalidate_device(device_id)
             logger.info(f"✅ Created default notification settings for user {user_id}, device {device_id}")
             return True
         else:
@@ -60,7 +63,7 @@ def _populate_device_cache(device_id: str, db_session=None):
     """
     close_db = False
     if db_session is None:
-        db_session = SessionLocal()
+        db_session = open_session()
         close_db = True
     
     try:
@@ -123,7 +126,7 @@ def _populate_device_cache(device_id: str, db_session=None):
         return False
     finally:
         if close_db:
-            db_session.close()
+            close_session(db_session)
 
 class DeviceResponse(BaseModel):
     id: int
@@ -210,10 +213,7 @@ def get_device_details(
     Only devices assigned to the current user are accessible.
     """
     # Verify user has access to this device
-    user_devices = get_user_devices(current_user["user_id"], is_admin=current_user.get("is_admin", False))
-    user_device_ids = [device.device_id for device in user_devices]
-    
-    if device_id not in user_device_ids:
+    if not verify_device_access(device_id, current_user):
         raise HTTPException(status_code=403, detail="Device not accessible")
     
     # Find the device in user's devices
@@ -269,10 +269,7 @@ def get_device_config(
     Only devices assigned to the current user are accessible.
     """
     # Verify user has access to this device
-    user_devices = get_user_devices(current_user["user_id"], is_admin=current_user.get("is_admin", False))
-    user_device_ids = [device.device_id for device in user_devices]
-    
-    if device_id not in user_device_ids:
+    if not verify_device_access(device_id, current_user):
         raise HTTPException(status_code=403, detail="Device not accessible")
     
     # Call manufacturer API
@@ -388,7 +385,7 @@ def add_device_to_user(
       * Regular users get an error
     - If device doesn't exist: Create it and link to user
     """
-    db = SessionLocal()
+    db = open_session()
     try:
         device_id = request.device_id.strip()
         user_id = current_user["user_id"]
@@ -406,6 +403,7 @@ def add_device_to_user(
                 # Device is unassigned - link it to user
                 device.assigned_user_id = user_id
                 db.commit()
+                device_acl.invalidate_user(user_id)
                 
                 # Try to populate cache with VMS data (non-blocking)
                 _populate_device_cache(device_id, db)
@@ -448,6 +446,7 @@ def add_device_to_user(
                     old_user_id = device.assigned_user_id
                     device.assigned_user_id = user_id
                     db.commit()
+                    device_acl.invalidate_user(old_user_id, user_id)
                     
                     # Try to populate cache with VMS data (non-blocking)
                     _populate_device_cache(device_id, db)
@@ -484,6 +483,7 @@ def add_device_to_user(
             db.add(new_device)
             db.commit()
             db.refresh(new_device)
+            device_acl.invalidate_user(user_id)
             
             # Try to populate cache with VMS data (non-blocking)
             _populate_device_cache(device_id, db)
@@ -507,7 +507,7 @@ def add_device_to_user(
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Error adding device: {str(e)}")
     finally:
-        db.close()
+        close_session(db)
 
 class RemoveDeviceRequest(BaseModel):
     device_id: str
@@ -521,7 +521,7 @@ def remove_device_from_user(
     Remove a device from the current user's account.
     The device is unassigned (not deleted from database) so it can be reassigned later.
     """
-    db = SessionLocal()
+    db = open_session()
     try:
         device_id = request.device_id.strip()
         user_id = current_user["user_id"]
@@ -540,6 +540,7 @@ def remove_device_from_user(
         if is_admin:
             db.delete(device)
             db.commit()
+            device_acl.invalidate_device(device_id)
             return {
                 "success": True,
                 "message": f"Device {device_id} has been permanently deleted"
@@ -547,6 +548,7 @@ def remove_device_from_user(
         else:
             device.assigned_user_id = None
             db.commit()
+            device_acl.invalidate_user(user_id)
             return {
                 "success": True,
                 "message": f"Device {device_id} has been removed from your account"
@@ -557,7 +559,7 @@ def remove_device_from_user(
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Error removing device: {str(e)}")
     finally:
-        db.close()
+        close_session(db)
 
 @router.put("/rename")
 def rename_device(
@@ -567,7 +569,7 @@ def rename_device(
     """
     Rename a device. Only the user who owns the device can rename it.
     """
-    db = SessionLocal()
+    db = open_session()
     try:
         # Find the device
         device = db.query(DeviceDB).filter(
@@ -584,6 +586,7 @@ def rename_device(
         # Update device name
         device.name = rename_request.new_name
         db.commit()
+        subscription_graph.invalidate_device(device.device_id)
         
         return {
             "success": True,
@@ -599,7 +602,7 @@ def rename_device(
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Error renaming device: {str(e)}")
     finally:
-        db.close()
+        close_session(db)
 
 
 @router.post("/{device_id}/activate")
@@ -619,10 +622,7 @@ def activate_device(
     - A device needs to be reconfigured to point to our server
     """
     # Verify user has access to this device
-    user_devices = get_user_devices(current_user["user_id"], is_admin=current_user.get("is_admin", False))
-    user_device_ids = [device.device_id for device in user_devices]
-    
-    if device_id not in user_device_ids:
+    if not verify_device_access(device_id, current_user):
         raise HTTPException(status_code=403, detail="Device not accessible")
     
     logger.info(f"🚀 User {current_user['user_id']} activating device {device_id}")
@@ -665,16 +665,10 @@ def set_parking_mode(
     Enabling queues a command to the device (command string TBD).
     Disabling sends the standard auto-config command to reset the device.
     """
-    user_devices = get_user_devices(
-        current_user["user_id"],
-        is_admin=current_user.get("is_admin", False),
-    )
-    user_device_ids = [d.device_id for d in user_devices]
-
-    if device_id not in user_device_ids:
+    if not verify_device_access(device_id, current_user):
         raise HTTPException(status_code=403, detail="Device not accessible")
 
-    db = SessionLocal()
+    db = open_session()
     try:
         device = db.query(DeviceDB).filter(DeviceDB.device_id == device_id).first()
         if not device:
@@ -760,7 +754,7 @@ def set_parking_mode(
         logger.error(f"❌ Error setting parking mode for {device_id}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error setting parking mode: {str(e)}")
     finally:
-        db.close()
+        close_session(db)
 
 
 @router.get("/{device_id}/sleep-sessions")
@@ -778,14 +772,10 @@ def get_sleep_sessions(
     and the device cache still shows acc_status=False, the session is
     marked as ongoing with end_time=null.
     """
-    user_devices = get_user_devices(
-        current_user["user_id"],
-        is_admin=current_user.get("is_admin", False),
-    )
-    if device_id not in [d.device_id for d in user_devices]:
+    if not verify_device_access(device_id, current_user):
         raise HTTPException(status_code=403, detail="Device not accessible")
 
-    db = SessionLocal()
+    db = open_session()
     try:
         # Only return sleep sessions if parking mode is currently enabled
         device_row = db.query(DeviceDB).filter(DeviceDB.device_id == device_id).first()
@@ -880,5 +870,5 @@ def get_sleep_sessions(
         logger.error(f"❌ Error fetching sleep sessions for {device_id}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        db.close()
+        close_session(db)
 
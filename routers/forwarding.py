@@ -21,11 +21,14 @@ import json
 import logging
 import os
 
-from database import SessionLocal
+from database import get_db
 from models.device_cache_db import DeviceCacheDB, AlarmDB
 from models.device_db import DeviceDB
-from models.fcm_token_db import FCMTokenDB, UserNotificationSettingsDB
+from models.fcm_token_db import UserNotificationSettingsDB
 from services.notification_service import NotificationService
+from services.subscription_graph import subscription_graph
+from services.alert_aggregator import alert_aggregator
+from services.device_auto_config_service import device_auto_config
 from utils.acc_mode import acc_mode_response
 
 router = APIRouter(prefix="/api/forwarding", tags=["Data Forwarding"])
@@ -36,15 +39,6 @@ logger = logging.getLogger(__name__)
 VENDOR_SECRET_KEY = os.getenv("VENDOR_FORWARDING_SECRET", None)
 
 
-def get_db():
-    """Database session dependency"""
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 # =============================================================================
 # ALARM TYPE MAPPINGS - Based on Vendor Documentation (6-digit typeId format)
 # Format: AABBCC where AA=primary, BB=secondary, CC=tertiary category
@@ -380,26 +374,33 @@ def _check_speed_limit(db: Session, device_id: str, actual_speed_kmh: float, lat
     """
     from datetime import timedelta
     
-    # Find all notification settings for this device that have a speed limit configured
-    settings = db.query(UserNotificationSettingsDB).filter(
-        UserNotificationSettingsDB.device_id == device_id,
-        UserNotificationSettingsDB.speed_limit.isnot(None),
-        UserNotificationSettingsDB.speed_limit > 0
-    ).all()
-    
-    if not settings:
+    # Speed-limit subscribers come from the cached subscription graph, so the
+    # common case (no limit configured / not exceeded) costs no queries
+    graph = subscription_graph.get(db, device_id)
+    exceeded = {
+        sub.user_id: sub for sub in graph.speed_limit_subscribers
+        if actual_speed_kmh >= sub.speed_limit
+    }
+    if not exceeded:
         return
     
     now = datetime.utcnow()
     cooldown_minutes = 5  # Minimum time between speed alerts per user-device
+    device_name = graph.device_name
     
-    # Get device name for notification
-    device = db.query(DeviceDB).filter(DeviceDB.device_id == device_id).first()
-    device_name = device.name if device else device_id
+    # Load the settings rows only for users over their limit (cooldown state lives there)
+    settings = db.query(UserNotificationSettingsDB).filter(
+        UserNotificationSettingsDB.device_id == device_id,
+        UserNotificationSettingsDB.user_id.in_(list(exceeded)),
+        UserNotificationSettingsDB.speed_limit.isnot(None),
+        UserNotificationSettingsDB.speed_limit > 0
+    ).all()
     
+    groups = {}
+    alerted = set()
     for setting in settings:
         # Skip if speed is below this user's limit
-        if actual_speed_kmh < setting.speed_limit:
+        if actual_speed_kmh < setting.speed_limit or setting.user_id in alerted:
             continue
         
         # Check cooldown — don't spam notifications
@@ -408,6 +409,7 @@ def _check_speed_limit(db: Session, device_id: str, actual_speed_kmh: float, lat
             if elapsed < timedelta(minutes=cooldown_minutes):
                 logger.debug(f"⏳ Speed alert cooldown for user {setting.user_id}, device {device_id}")
                 continue
+        alerted.add(setting.user_id)
         
         # Create alarm record in alarms table
         alarm_type_id = 999001  # Custom type for speed limit violation
@@ -432,16 +434,18 @@ def _check_speed_limit(db: Session, device_id: str, actual_speed_kmh: float, lat
         # Update cooldown timestamp
         setting.last_speed_alert_at = now
         
-        # Send push notification to all user's active FCM tokens
-        tokens = db.query(FCMTokenDB).filter(
-            FCMTokenDB.user_id == setting.user_id,
-            FCMTokenDB.is_active == True
-        ).all()
-        
+        tokens = exceeded[setting.user_id].tokens
         if not tokens:
             logger.debug(f"📝 No active FCM tokens for user {setting.user_id}")
             continue
         
+        # The alarm is always recorded; a repeat push within the SPEED
+        # window is folded into a digest instead
+        if not alert_aggregator.admit(
+            setting.user_id, device_id, "SPEED", {"speed": int(actual_speed_kmh)}
+        ):
+            continue
+        
         # Build notification message based on user's language
         lang = setting.language or "en"
         if lang == "ar":
@@ -451,34 +455,29 @@ def _check_speed_limit(db: Session, device_id: str, actual_speed_kmh: float, lat
             title = "⚠️ Speed Limit Exceeded"
             body = f'Your car "{device_name}" exceeded the speed limit of {setting.speed_limit} km/h (current speed: {int(actual_speed_kmh)} km/h)'
         
-        sent_count = 0
-        for token_record in tokens:
-            result = NotificationService.send_notification(
-                token=token_record.fcm_token,
-                title=title,
-                body=body,
-                data={
-                    "type": "speed_limit",
-                    "device_id": device_id,
-                    "speed": str(int(actual_speed_kmh)),
-                    "limit": str(setting.speed_limit),
-                    "timestamp": now.isoformat()
-                }
-            )
-            if result is True:
-                token_record.last_used_at = now
-                sent_count += 1
-            elif result is False:
-                # Token permanently invalid — deactivate it
-                token_record.is_active = False
-            # result is None → temporary error, leave token active
-        
-        logger.info(
-            f"🚨 Speed alert for {device_id}: {int(actual_speed_kmh)} km/h > {setting.speed_limit} km/h "
-            f"(sent {sent_count} notifications to user {setting.user_id})"
+        # One multicast per user (the body carries that user's own limit)
+        groups[setting.user_id] = (
+            {"title": title, "body": body},
+            {fcm_token: (token_id, setting.user_id) for token_id, fcm_token in tokens},
+            {
+                "type": "speed_limit",
+                "device_id": device_id,
+                "speed": str(int(actual_speed_kmh)),
+                "limit": str(setting.speed_limit),
+                "timestamp": now.isoformat()
+            },
         )
     
-    db.commit()
+    if not alerted:
+        return
+    
+    sent_ids, invalid = NotificationService.send_grouped(groups)
+    sent_count = NotificationService.apply_token_results(db, sent_ids, invalid)
+    
+    logger.info(
+        f"🚨 Speed alert for {device_id}: {int(actual_speed_kmh)} km/h "
+        f"(alerted {len(alerted)} users, sent {sent_count} notifications)"
+    )
 
 
 def _create_acc_alarm(db: Session, device_id: str, acc_on: bool, lat=None, lng=None, speed_kmh=None):
@@ -631,6 +630,10 @@ def handle_gps_data(db: Session, data: dict):
             )
             db.add(new_cache)
         
+        # ACC just turned ON: queue auto-configuration
+        if acc_status and not previous_acc_status:
+            device_auto_config.notify_acc_on(device_id)
+        
         # Send push notification and create alarm record if ACC status changed
         if previous_acc_status is not None and previous_acc_status != acc_status:
             try:
@@ -739,6 +742,10 @@ def handle_device_status(db: Session, data: dict, extracted_device_id: str = Non
     
     db.commit()
     
+    # ACC just turned ON: queue auto-configuration
+    if acc_status and not previous_acc_status:
+        device_auto_config.notify_acc_on(device_id)
+    
     # Send push notification and create alarm record if ACC status changed
     if acc_status is not None and previous_acc_status is not None and previous_acc_status != acc_status:
         try:
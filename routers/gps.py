@@ -1,30 +1,29 @@
 """
 GPS Router - Handles GPS tracking, location, and history
 """
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from services.auth_service import get_current_user, get_user_devices
+from services.device_acl import verify_device_access
 from services.manufacturer_api_service import manufacturer_api
 from services.geocoding_service import GeocodingService
-from typing import Optional
+from services.vms_sync_service import vms_sync
+from services.track_cache import track_cache
+from typing import Optional, Tuple
 from pydantic import BaseModel
-from datetime import datetime
+from datetime import datetime, timezone
 import logging
+import time
 import uuid
 from models.dto import LatestGpsDto, TrackPlaybackDto, TrackPointDto, AccStateDto
-from models.device_cache_db import DeviceCacheDB
+from models.device_cache_db import DeviceCacheDB, AlarmDB
 from models.device_db import DeviceDB
 from adapters import GPSAdapter, DeviceAdapter
-from database import SessionLocal
+from database import get_db
 from utils.acc_mode import acc_mode_response
+from utils import track_simplify, track_encoding
 
-# Database dependency for FastAPI
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 
 logger = logging.getLogger(__name__)
 
@@ -98,12 +97,53 @@ class DetailedTrackRequest(BaseModel):
     date: str        # format: "2024-01-01"
     start_time: Optional[str] = None  # format: "10:00:00"
     end_time: Optional[str] = None    # format: "11:00:00"
+    # Server-side simplification: tolerance in meters, or the map zoom to
+    # derive it from (1 screen pixel). Omit both for every raw point.
+    tolerance_m: Optional[float] = None
+    zoom: Optional[float] = None
 
-def verify_device_access(device_id: str, current_user: dict) -> bool:
-    """Verify that the current user has access to the specified device"""
-    user_devices = get_user_devices(current_user["user_id"], is_admin=current_user.get("is_admin", False))
-    user_device_ids = [device.device_id for device in user_devices]
-    return device_id in user_device_ids
+
+def _simplify_playback(
+    playback: TrackPlaybackDto, request: DetailedTrackRequest, db: Session, correlation_id: str
+) -> Tuple[TrackPlaybackDto, dict]:
+    """
+    Drop points that wouldn't be visible at the requested tolerance/zoom.
+    Stops (start/end of each stationary run or reporting gap) and the
+    points nearest to the device's alarms are always kept. Returns a copy;
+    the input may be shared with track_cache.
+    """
+    started = time.perf_counter()
+    points = playback.points
+    raw_count = len(points)
+    lats = [p.latitude for p in points]
+    timestamps = [p.timestamp_ms for p in points]
+    tolerance_m = request.tolerance_m
+    if tolerance_m is None:
+        tolerance_m = track_simplify.tolerance_for_zoom(request.zoom, sum(lats) / raw_count)
+
+    keep = track_simplify.stop_indices([p.speed_kmh for p in points], timestamps)
+    alarm_times = db.query(AlarmDB.alarm_time).filter(
+        AlarmDB.device_id == request.device_id,
+        AlarmDB.alarm_time >= datetime.utcfromtimestamp(min(timestamps) / 1000),
+        AlarmDB.alarm_time <= datetime.utcfromtimestamp(max(timestamps) / 1000),
+    ).all()
+    if alarm_times:
+        keep += track_simplify.nearest_indices(timestamps, (
+            int(row.alarm_time.replace(tzinfo=timezone.utc).timestamp() * 1000) for row in alarm_times
+        ))
+
+    indices = track_simplify.simplify(lats, [p.longitude for p in points], tolerance_m, keep)
+    playback = playback.model_copy(update={"points": [points[i] for i in indices]})
+    stats = {
+        "tolerance_m": round(tolerance_m, 2),
+        "raw_points": raw_count,
+        "points": len(playback.points),
+        "kept_stops_and_alarms": len(set(keep)),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+    logger.info(f"[{correlation_id}] Simplified track {raw_count} → {stats['points']} points "
+                f"(tolerance {stats['tolerance_m']} m, {stats['elapsed_ms']} ms)")
+    return playback, stats
 
 @router.get("/latest/{device_id}")
 def get_latest_gps(
@@ -122,6 +162,8 @@ def get_latest_gps(
     if not verify_device_access(device_id, current_user):
         raise HTTPException(status_code=403, detail="Device not accessible")
     
+    vms_sync.note_viewed([device_id])
+    
     # Generate correlation ID for this request
     correlation_id = str(uuid.uuid4())[:8]
     
@@ -225,13 +267,63 @@ def query_track_dates(
             detail=f"Failed to query track dates: {result.get('message', 'Unknown error')}"
         )
 
+def _fetch_track_playback(
+    request: DetailedTrackRequest, start_time: int, end_time: int, correlation_id: str
+) -> Optional[TrackPlaybackDto]:
+    """Query the vendor for a track window. None means no data for that window."""
+    # Call manufacturer API with Unix timestamps
+    track_data = {
+        "deviceId": request.device_id,
+        "startTime": start_time,
+        "endTime": end_time
+    }
+
+    # Log the actual request details for debugging
+    logger.info(f"[{correlation_id}] Requesting track data:")
+    logger.info(f"[{correlation_id}]   Device ID: {request.device_id}")
+    logger.info(f"[{correlation_id}]   Date: {request.date}")
+    logger.info(f"[{correlation_id}]   Start Time (Unix): {start_time} ({datetime.fromtimestamp(start_time)})")
+    logger.info(f"[{correlation_id}]   End Time (Unix): {end_time} ({datetime.fromtimestamp(end_time)})")
+    logger.info(f"[{correlation_id}]   Request data: {track_data}")
+
+    result = manufacturer_api.query_detailed_track(track_data)
+
+    # Log the vendor API response
+    logger.info(f"[{correlation_id}] Vendor API response: code={result.get('code')}, message={result.get('message')}")
+
+    # Check if vendor API returned an error
+    if result.get("code") == -1 or result.get("code") not in [200, 0]:
+        error_msg = result.get("message", "Unknown error from vendor API")
+        logger.error(f"[{correlation_id}] Vendor API error: {error_msg}")
+
+        # Check if it's a 404 - might mean no data for this date
+        if "404" in str(error_msg) or "not found" in str(error_msg).lower():
+            return None
+
+        raise HTTPException(
+            status_code=400,
+            detail=f"Failed to get track history: {error_msg}"
+        )
+
+    # Parse response using adapter with correlation ID
+    return GPSAdapter.parse_track_history_response(result, request.device_id, correlation_id)
+
 @router.post("/history")
 def get_detailed_track_history(
     request: DetailedTrackRequest,
-    current_user: dict = Depends(get_current_user)
+    http_request: Request,
+    response: Response,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
 ):
     """
     Get detailed GPS tracking history for a specific date and time range.
+    With tolerance_m or zoom, the track is simplified server-side (see
+    _simplify_playback) and a "simplification" summary is included.
+
+    The point list format follows the Accept header (utils/track_encoding):
+    application/json (default, one object per point),
+    application/vnd.dashcam.track.polyline+json or application/x-msgpack.
     """
     # Verify user has access to this device
     if not verify_device_access(request.device_id, current_user):
@@ -273,51 +365,44 @@ def get_detailed_track_history(
         logger.error(f"[{correlation_id}] Error parsing date/time: {e}")
         raise HTTPException(status_code=400, detail=f"Invalid date/time format: {e}")
     
-    # Call manufacturer API with Unix timestamps
-    track_data = {
-        "deviceId": request.device_id,
-        "startTime": start_time,
-        "endTime": end_time
-    }
-    
-    # Log the actual request details for debugging
-    logger.info(f"[{correlation_id}] Requesting track data:")
-    logger.info(f"[{correlation_id}]   Device ID: {request.device_id}")
-    logger.info(f"[{correlation_id}]   Date: {request.date}")
-    logger.info(f"[{correlation_id}]   Start Time (Unix): {start_time} ({datetime.fromtimestamp(start_time)})")
-    logger.info(f"[{correlation_id}]   End Time (Unix): {end_time} ({datetime.fromtimestamp(end_time)})")
-    logger.info(f"[{correlation_id}]   Request data: {track_data}")
-    
-    result = manufacturer_api.query_detailed_track(track_data)
-    
-    # Log the vendor API response
-    logger.info(f"[{correlation_id}] Vendor API response: code={result.get('code')}, message={result.get('message')}")
-    
-    # Check if vendor API returned an error
-    if result.get("code") == -1 or result.get("code") not in [200, 0]:
-        error_msg = result.get("message", "Unknown error from vendor API")
-        logger.error(f"[{correlation_id}] Vendor API error: {error_msg}")
-        
-        # Check if it's a 404 - might mean no data for this date
-        if "404" in str(error_msg) or "not found" in str(error_msg).lower():
-            return {
-                "success": False,
-                "message": f"No track data available for {request.date}",
-                "device_id": request.device_id,
-                "date": request.date,
-                "points": []
-            }
-        
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Failed to get track history: {error_msg}"
-        )
-    
-    # Parse response using adapter with correlation ID
-    playback = GPSAdapter.parse_track_history_response(result, request.device_id, correlation_id)
-    
-    if playback:
-        return {"success": True, **playback.model_dump(by_alias=False)}
+    # Key on the parsed window so "2024-1-5" and "2024-01-05" share an entry
+    track_date = date_obj.date().isoformat()
+    window_start = start_datetime.strftime("%H:%M:%S")
+    window_end = end_datetime.strftime("%H:%M:%S")
+    cache_key = track_cache.make_key(request.device_id, track_date, window_start, window_end)
+    playback = track_cache.get(cache_key)
+    if playback is not None:
+        logger.info(f"[{correlation_id}] Track served from cache ({len(playback.points)} points)")
+    else:
+        playback = _fetch_track_playback(request, start_time, end_time, correlation_id)
+        if playback is not None:
+            track_cache.put(
+                cache_key, request.device_id, track_date,
+                track_cache.is_immutable(track_date, window_end), playback,
+            )
+    
+    if playback is not None:
+        simplification = None
+        if playback.points and (request.tolerance_m is not None or request.zoom is not None):
+            playback, simplification = _simplify_playback(playback, request, db, correlation_id)
+        extra = {"simplification": simplification} if simplification else None
+        media_type = track_encoding.negotiate(http_request.headers.get("accept"))
+        headers = {"Vary": "Accept"}
+        if media_type == track_encoding.POLYLINE_MEDIA_TYPE:
+            return JSONResponse(
+                track_encoding.encode_polyline_track(playback, extra),
+                media_type=media_type, headers=headers,
+            )
+        if media_type == track_encoding.MSGPACK_MEDIA_TYPE:
+            return Response(
+                track_encoding.encode_msgpack_track(playback, extra),
+                media_type=media_type, headers=headers,
+            )
+        response.headers.update(headers)
+        body = {"success": True, **playback.model_dump(by_alias=False)}
+        if extra:
+            body.update(extra)
+        return body
     else:
         # Adapter returned None - likely no data or parsing issue
         logger.warning(f"[{correlation_id}] Adapter returned no data for device {request.device_id} on {request.date}")
@@ -351,6 +436,7 @@ def get_user_devices_with_gps_status(
     
     # Get device IDs for efficient database query
     device_ids = [device.device_id for device in user_devices]
+    vms_sync.note_viewed(device_ids)
     
     # Fetch ALL cached data in ONE database query (no VMS API calls!)
     cached_devices = db.query(DeviceCacheDB).filter(
@@ -460,6 +546,8 @@ def get_device_states(
     if not verify_device_access(device_id, current_user):
         raise HTTPException(status_code=403, detail="Device not accessible")
     
+    vms_sync.note_viewed([device_id])
+    
     # Generate correlation ID for this request
     correlation_id = str(uuid.uuid4())[:8]
     
@@ -4,7 +4,7 @@ Income Router — Worker income tracking, chart data, and payment records
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import func, extract, text
-from database import SessionLocal
+from database import get_db
 from models.order_db import OrderDB
 from models.inventory_db import WorkerPaymentDB, ManualCarsDB
 from models.user_db import UserDB
@@ -42,14 +42,6 @@ class AddManualCarsRequest(BaseModel):
     notes: Optional[str] = None
 
 
-def _get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 # ════════════════════════════════════════════════════════════
 #  INCOME SUMMARY — monthly cars installed + income
 # ════════════════════════════════════════════════════════════
@@ -60,7 +52,7 @@ def get_income_summary(
     month: Optional[int] = Query(None),
     year: Optional[int] = Query(None),
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(_get_db),
+    db: Session = Depends(get_db),
 ):
     """
     Get income summary for a worker in a specific month/year.
@@ -166,7 +158,7 @@ def get_income_chart(
     year: Optional[int] = Query(None),
     period: str = Query("month"),  # "month" = daily in that month, "year" = monthly in that year
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(_get_db),
+    db: Session = Depends(get_db),
 ):
     """
     Get chart data for income visualization.
@@ -293,7 +285,7 @@ def get_payments(
     worker_id: Optional[int] = Query(None),
     limit: int = Query(50),
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(_get_db),
+    db: Session = Depends(get_db),
 ):
     """
     Get payment transactions for a worker.
@@ -336,7 +328,7 @@ def get_payments(
 def add_payment(
     req: AddPaymentRequest,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(_get_db),
+    db: Session = Depends(get_db),
 ):
     """
     Add a manual payment record. Admin only.
@@ -388,7 +380,7 @@ def add_payment(
 def delete_payment(
     payment_id: int,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(_get_db),
+    db: Session = Depends(get_db),
 ):
     """Delete a payment record. Admin only."""
     user = db.query(UserDB).filter(UserDB.id == current_user["user_id"]).first()
@@ -414,7 +406,7 @@ def delete_payment(
 def add_manual_cars(
     req: AddManualCarsRequest,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(_get_db),
+    db: Session = Depends(get_db),
 ):
     """Add manual car installations (outside system). Admin only."""
     user = db.query(UserDB).filter(UserDB.id == current_user["user_id"]).first()
@@ -455,7 +447,7 @@ def add_manual_cars(
 def get_manual_cars(
     worker_id: Optional[int] = Query(None),
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(_get_db),
+    db: Session = Depends(get_db),
 ):
     """Get manual car entries for a worker."""
     user = db.query(UserDB).filter(UserDB.id == current_user["user_id"]).first()
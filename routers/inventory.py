@@ -3,7 +3,7 @@ Inventory Router — Products, worker inventory, consignment
 """
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from database import SessionLocal
+from database import get_db
 from models.inventory_db import ProductDB, WorkerInventoryDB, InventoryTransactionDB
 from models.user_db import UserDB
 from models.fcm_token_db import FCMTokenDB
@@ -54,13 +54,6 @@ class AdjustmentRequest(BaseModel):
 #  Helpers
 # ════════════════════════════════════════════════════════════
 
-def _get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 
 def _require_admin(current_user: dict):
     if not current_user.get("is_admin"):
@@ -75,7 +68,7 @@ def _require_admin(current_user: dict):
 def create_product(
     req: ProductCreate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(_get_db),
+    db: Session = Depends(get_db),
 ):
     _require_admin(current_user)
 
@@ -108,7 +101,7 @@ def create_product(
 @router.get("/products")
 def list_products(
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(_get_db),
+    db: Session = Depends(get_db),
 ):
     """List all products (admin + worker)."""
     products = db.query(ProductDB).order_by(ProductDB.name).all()
@@ -129,7 +122,7 @@ def update_product(
     product_id: int,
     req: ProductUpdate,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(_get_db),
+    db: Session = Depends(get_db),
 ):
     _require_admin(current_user)
 
@@ -154,7 +147,7 @@ def update_product(
 def delete_product(
     product_id: int,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(_get_db),
+    db: Session = Depends(get_db),
 ):
     _require_admin(current_user)
 
@@ -175,7 +168,7 @@ def delete_product(
 def consign_inventory(
     req: ConsignmentRequest,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(_get_db),
+    db: Session = Depends(get_db),
 ):
     """Admin sends N units of a product to a worker."""
     _require_admin(current_user)
@@ -252,7 +245,7 @@ def consign_inventory(
 def adjust_inventory(
     req: AdjustmentRequest,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(_get_db),
+    db: Session = Depends(get_db),
 ):
     """Admin sets exact quantity (correction)."""
     _require_admin(current_user)
@@ -301,7 +294,7 @@ def adjust_inventory(
 @router.get("/my")
 def my_inventory(
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(_get_db),
+    db: Session = Depends(get_db),
 ):
     """Get current worker's inventory."""
     user = db.query(UserDB).filter(UserDB.id == current_user["user_id"]).first()
@@ -337,7 +330,7 @@ def my_inventory(
 def worker_inventory(
     worker_id: int,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(_get_db),
+    db: Session = Depends(get_db),
 ):
     """View a specific worker's inventory (admin only)."""
     _require_admin(current_user)
@@ -376,7 +369,7 @@ def worker_inventory(
 @router.get("/overview")
 def inventory_overview(
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(_get_db),
+    db: Session = Depends(get_db),
 ):
     """Overview of all workers' inventory (admin)."""
     _require_admin(current_user)
@@ -417,7 +410,7 @@ def list_transactions(
     product_id: Optional[int] = None,
     limit: int = Query(50, ge=1, le=200),
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(_get_db),
+    db: Session = Depends(get_db),
 ):
     """View inventory transaction history (admin only)."""
     _require_admin(current_user)
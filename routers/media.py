@@ -3,7 +3,8 @@ Media Router - Handles video preview, playback, and file management
 """
 from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.responses import StreamingResponse, Response
-from services.auth_service import get_current_user, get_user_devices
+from services.auth_service import get_current_user
+from services.device_acl import verify_device_access
 from services.manufacturer_api_service import manufacturer_api
 from typing import Optional, List
 from pydantic import BaseModel
@@ -40,12 +41,6 @@ class FileListRequest(BaseModel):
     date: str  # format: "2024-01-15"
     channel: Optional[int] = 1
 
-def verify_device_access(device_id: str, current_user: dict) -> bool:
-    """Verify that the current user has access to the specified device"""
-    user_devices = get_user_devices(current_user["user_id"], is_admin=current_user.get("is_admin", False))
-    user_device_ids = [device.device_id for device in user_devices]
-    return device_id in user_device_ids
-
 @router.post("/preview")
 def start_preview(
     request: PreviewRequest,
@@ -10,23 +10,23 @@ import time
 import logging
 import os
 
-from database import SessionLocal, engine
+from database import SessionLocal, engine, get_db, get_pool_stats
 from services.monitoring_service import monitoring
 from services.manufacturer_api_service import manufacturer_api
 from services.auth_service import get_current_user
+from services.geocoding_service import GeocodingService
+from services.subscription_graph import subscription_graph
+from services.device_acl import device_acl
+from services.alert_aggregator import alert_aggregator
+from services.leader_election import leader_election
+from services.job_scheduler import scheduler
+from services.password_hasher import password_hasher
+from services.track_cache import track_cache
 
 router = APIRouter(prefix="/monitoring", tags=["Monitoring"])
 logger = logging.getLogger(__name__)
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 @router.get("/health")
 async def comprehensive_health(current_user: dict = Depends(get_current_user)):
     """Full system health check — tests every dependency"""
@@ -119,11 +119,52 @@ async def full_metrics(current_user: dict = Depends(get_current_user)):
         "api": monitoring.get_api_metrics(),
         "system": monitoring.get_system_metrics(),
         "vms": monitoring.get_vms_metrics(),
+        "vendor": monitoring.get_vendor_metrics(),
+        "geocoding": GeocodingService.get_cache_stats(),
+        "notification_targets": subscription_graph.get_stats(),
+        "device_acl": device_acl.get_stats(),
+        "password_hasher": password_hasher.get_stats(),
+        "track_cache": track_cache.get_stats(),
+        "alert_digests": alert_aggregator.get_status(),
+        "leadership": leader_election.get_status(),
+        "jobs": scheduler.get_status()["jobs"],
         "database": monitoring.get_db_metrics(),
+        "db_pool": get_pool_stats(),
         "forwarding": monitoring.get_forwarding_metrics(),
     }
 
 
+@router.get("/vendor")
+async def vendor_metrics(current_user: dict = Depends(get_current_user)):
+    """Manufacturer API telemetry — per-endpoint latency, retries, payload sizes, rate budget"""
+    if not current_user.get("is_admin", False):
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        **monitoring.get_vendor_metrics(),
+    }
+
+
+@router.get("/geocoding")
+async def geocoding_cache(current_user: dict = Depends(get_current_user)):
+    """Geocode cache tiers — in-memory L1, persistent L2, provider calls"""
+    if not current_user.get("is_admin", False):
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    stats = GeocodingService.get_cache_stats()
+    try:
+        db = SessionLocal()
+        try:
+            stats["l2"]["rows"] = db.execute(text("SELECT COUNT(*) FROM geocode_cache")).scalar() or 0
+        finally:
+            db.close()
+    except Exception as e:
+        stats["l2"]["rows_error"] = str(e)[:100]
+
+    return {"timestamp": datetime.utcnow().isoformat(), **stats}
+
+
 @router.get("/fleet")
 async def fleet_status(
     current_user: dict = Depends(get_current_user),
@@ -309,10 +350,24 @@ async def dashboard_summary(
         has_token = manufacturer_api._ensure_valid_token()
         vms_ms = round((time.time() - start) * 1000, 1)
         monitoring.record_vms_response(vms_ms)
+        vendor = monitoring.get_vendor_metrics()
         result["vms"] = {
             "status": "ok" if has_token else "error",
             "response_ms": vms_ms,
             "avg_response_ms": vms_metrics["avg_ms"],
+            "p95_response_ms": vms_metrics["p95_ms"],
+            "rate_budget": vendor["rate_budget"],
+            "calls": vendor["totals"]["calls"],
+            "errors": vendor["totals"]["errors"],
+            "retries": vendor["totals"]["retries"],
+            "timeouts": vendor["totals"]["timeouts"],
+            "top_budget_consumers": [
+                {"endpoint": ep["endpoint"], "last_minute": ep["budget_used_last_minute"]}
+                for ep in sorted(
+                    vendor["endpoints"], key=lambda e: e["budget_used_last_minute"], reverse=True
+                )[:5]
+                if ep["budget_used_last_minute"] > 0
+            ],
         }
         if not has_token:
             result["status"] = "degraded"
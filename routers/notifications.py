@@ -12,24 +12,16 @@ from typing import Optional, List
 from datetime import datetime
 import logging
 
-from database import SessionLocal
+from database import get_db
 from models.fcm_token_db import FCMTokenDB, UserNotificationSettingsDB, NotificationPreference
 from models.device_db import DeviceDB
 from services.auth_service import get_current_user
+from services.subscription_graph import subscription_graph
 
 router = APIRouter(prefix="/api/notifications", tags=["Notifications"])
 logger = logging.getLogger(__name__)
 
 
-def get_db():
-    """Database session dependency"""
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 # =============================================================================
 # Request/Response Models
 # =============================================================================
@@ -100,12 +92,15 @@ def register_fcm_token(
     
     if existing:
         # Update existing token
+        previous_user_id = existing.user_id
         existing.user_id = user_id  # Re-assign to current user (in case of re-login)
         existing.device_type = request.device_type
         existing.device_name = request.device_name
         existing.is_active = True
         existing.updated_at = datetime.utcnow()
         db.commit()
+        subscription_graph.invalidate_user(previous_user_id)
+        subscription_graph.invalidate_user(user_id)
         
         logger.info(f"✅ Updated FCM token for user {user_id}")
         return {
@@ -125,6 +120,7 @@ def register_fcm_token(
     db.add(new_token)
     db.commit()
     db.refresh(new_token)
+    subscription_graph.invalidate_user(user_id)
     
     logger.info(f"✅ Registered new FCM token for user {user_id}")
     return {
@@ -153,6 +149,7 @@ def unregister_fcm_token(
     if token:
         token.is_active = False
         db.commit()
+        subscription_graph.invalidate_user(user_id)
         logger.info(f"✅ Unregistered FCM token for user {user_id}")
         return {"success": True, "message": "Token unregistered"}
     
@@ -238,6 +235,7 @@ def update_notification_settings(
         db.add(new_setting)
     
     db.commit()
+    subscription_graph.invalidate_device(request.device_id)
     
     logger.info(f"✅ Updated notification settings for user {user_id}, device {request.device_id} (speed_limit={request.speed_limit})")
     return {
@@ -344,6 +342,7 @@ def delete_device_notification_settings(
     if setting:
         db.delete(setting)
         db.commit()
+        subscription_graph.invalidate_device(device_id)
         return {"success": True, "message": "Settings deleted"}
     
     return {"success": True, "message": "No settings found (already default)"}
@@ -380,6 +379,7 @@ def update_all_notification_language(
     ).update({"language": request.language, "updated_at": datetime.utcnow()})
     
     db.commit()
+    subscription_graph.invalidate_user(user_id)
     
     logger.info(f"✅ Updated language to '{request.language}' for {updated_count} notification settings (user {user_id})")
     
@@ -432,6 +432,7 @@ def migrate_existing_users_notification_settings(
             skipped_count += 1
     
     db.commit()
+    subscription_graph.clear()
     
     logger.info(f"✅ Migration complete: Created {created_count} settings, skipped {skipped_count} existing")
     
@@ -3,12 +3,13 @@ Orders Router — Rekaz webhook + full order CRUD for workers & admin
 """
 from fastapi import APIRouter, Depends, HTTPException, Request, Query
 from sqlalchemy.orm import Session
-from database import SessionLocal
+from database import SessionLocal, get_db
 from models.order_db import OrderDB, OrderPhotoDB, OrderActivityDB
 from models.inventory_db import WorkerInventoryDB, InventoryTransactionDB, ProductDB
 from models.user_db import UserDB
 from models.fcm_token_db import FCMTokenDB
 from services.notification_service import NotificationService
+from services.district_gazetteer import get_district_gazetteer
 from services.auth_service import get_current_user
 from datetime import datetime
 from typing import Optional, List
@@ -81,13 +82,6 @@ class EditOrderRequest(BaseModel):
 #  Helpers
 # ════════════════════════════════════════════════════════════
 
-def _get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 
 def _haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
     """Calculate distance in km between two lat/lng points using Haversine formula."""
@@ -353,9 +347,16 @@ def _deduct_inventory(order: OrderDB, db: Session):
 def _geocode_district(district: str, city: str = "الرياض") -> tuple:
     """
     Forward-geocode a district name to (lat, lng).
-    Uses the Nominatim free API (same as geocoding_service).
+    Resolved from the local district gazetteer first; only unknown names
+    go to the Nominatim free API (same as geocoding_service), and those
+    results are remembered locally.
     Returns (None, None) on failure.
     """
+    gazetteer = get_district_gazetteer()
+    point = gazetteer.forward(district, city)
+    if point is not None:
+        return point
+
     import requests as _requests
     try:
         query = f"{district}, {city}, Saudi Arabia"
@@ -367,7 +368,9 @@ def _geocode_district(district: str, city: str = "الرياض") -> tuple:
         )
         if resp.status_code == 200 and resp.json():
             hit = resp.json()[0]
-            return float(hit["lat"]), float(hit["lon"])
+            lat, lng = float(hit["lat"]), float(hit["lon"])
+            gazetteer.remember(district, city, lat, lng)
+            return lat, lng
     except Exception as e:
         logger.warning(f"⚠️ Geocode failed for '{district}': {e}")
     return None, None
@@ -376,9 +379,14 @@ def _geocode_district(district: str, city: str = "الرياض") -> tuple:
 def _reverse_geocode_city(lat: float, lng: float) -> Optional[str]:
     """
     Reverse-geocode (lat, lng) to extract the city name.
-    Uses Nominatim free API. Returns Arabic city name if available.
+    Uses the offline gazetteer's city polygons, falling back to the
+    Nominatim free API. Returns Arabic city name if available.
     Returns None on failure.
     """
+    city = get_district_gazetteer().city_at(lat, lng)
+    if city:
+        return city
+
     import requests as _requests
     try:
         resp = _requests.get(
@@ -645,7 +653,7 @@ async def rekaz_webhook(request: Request):
 def create_manual_order(
     req: ManualOrderRequest,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(_get_db),
+    db: Session = Depends(get_db),
 ):
     """Create order manually (admin only)."""
     if not current_user.get("is_admin"):
@@ -713,7 +721,7 @@ def list_orders(
     page: int = Query(1, ge=1),
     limit: int = Query(1000, ge=1, le=5000),
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(_get_db),
+    db: Session = Depends(get_db),
 ):
     """
     List orders.
@@ -772,7 +780,7 @@ def list_orders(
 def get_order(
     order_id: int,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(_get_db),
+    db: Session = Depends(get_db),
 ):
     """Get single order detail."""
     order = db.query(OrderDB).filter(OrderDB.id == order_id).first()
@@ -794,7 +802,7 @@ def get_order(
 def get_order_timeline(
     order_id: int,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(_get_db),
+    db: Session = Depends(get_db),
 ):
     """
     Get the activity timeline for an order.
@@ -841,7 +849,7 @@ def assign_order(
     order_id: int,
     req: AssignOrderRequest,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(_get_db),
+    db: Session = Depends(get_db),
 ):
     """Assign order to a worker (admin only)."""
     if not current_user.get("is_admin"):
@@ -880,7 +888,7 @@ def update_order_status(
     order_id: int,
     req: UpdateStatusRequest,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(_get_db),
+    db: Session = Depends(get_db),
 ):
     """
     Update order status.
@@ -956,7 +964,7 @@ def edit_order(
     order_id: int,
     req: EditOrderRequest,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(_get_db),
+    db: Session = Depends(get_db),
 ):
     """Admin can edit any order fields."""
     user = db.query(UserDB).filter(UserDB.id == current_user["user_id"]).first()
@@ -1032,7 +1040,7 @@ def edit_order(
 def delete_order(
     order_id: int,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(_get_db),
+    db: Session = Depends(get_db),
 ):
     """
     Delete an order.
@@ -1077,7 +1085,7 @@ def add_order_photo(
     order_id: int,
     req: AddPhotoRequest,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(_get_db),
+    db: Session = Depends(get_db),
 ):
     """Add completion photo to an order (max 3)."""
     order = db.query(OrderDB).filter(OrderDB.id == order_id).first()
@@ -1121,7 +1129,7 @@ def add_order_photo(
 @router.get("/workers/list")
 def list_workers(
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(_get_db),
+    db: Session = Depends(get_db),
 ):
     """List all workers (admin only)."""
     if not current_user.get("is_admin"):
@@ -3,6 +3,7 @@ Reports Router - Handles statistics and reporting
 """
 from fastapi import APIRouter, Depends, HTTPException, Query
 from services.auth_service import get_current_user, get_user_devices
+from services.device_acl import verify_device_access
 from services.manufacturer_api_service import manufacturer_api
 from typing import Optional
 from pydantic import BaseModel
@@ -26,12 +27,6 @@ class VehicleDetailRequest(BaseModel):
     date: str        # format: "2024-01-01"
     detail_type: Optional[str] = "all"  # all, driving, stops, alarms
 
-def verify_device_access(device_id: str, current_user: dict) -> bool:
-    """Verify that the current user has access to the specified device"""
-    user_devices = get_user_devices(current_user["user_id"])
-    user_device_ids = [device.device_id for device in user_devices]
-    return device_id in user_device_ids
-
 @router.get("/statistics/{device_id}")
 def get_vehicle_statistics(
     device_id: str,
@@ -272,11 +267,8 @@ def get_comparative_report(
     device_id_list = [d.strip() for d in device_ids.split(",") if d.strip()]
     
     # Verify user has access to all requested devices
-    user_devices = get_user_devices(current_user["user_id"])
-    user_device_ids = [device.device_id for device in user_devices]
-    
     for device_id in device_id_list:
-        if device_id not in user_device_ids:
+        if not verify_device_access(device_id, current_user):
             raise HTTPException(status_code=403, detail=f"Device {device_id} not accessible")
     
     comparison_data = {
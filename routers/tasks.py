@@ -3,6 +3,7 @@ Tasks Router - Handles task creation, management, and text delivery
 """
 from fastapi import APIRouter, Depends, HTTPException, Query
 from services.auth_service import get_current_user, get_user_devices
+from services.device_acl import verify_device_access
 from services.manufacturer_api_service import manufacturer_api
 from typing import Optional, List
 from pydantic import BaseModel
@@ -36,15 +37,6 @@ class ChangeWifiPasswordRequest(BaseModel):
     new_password: str
     ssid: Optional[str] = "TLAP"
 
-def verify_device_access(device_id: str, current_user: dict) -> bool:
-    """Verify that the current user has access to the specified device"""
-    user_devices = get_user_devices(
-        current_user["user_id"],
-        is_admin=current_user.get("is_admin", False)
-    )
-    user_device_ids = [device.device_id for device in user_devices]
-    return device_id in user_device_ids
-
 @router.post("/create")
 def create_text_delivery_task(
     request: CreateTextDeliveryRequest,
@@ -5,11 +5,13 @@ Worker Authentication Router
 """
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from database import SessionLocal
+from starlette.concurrency import run_in_threadpool
+from database import get_db
 from models.user_db import UserDB
 from services.auth_service import (
-    get_current_user, hash_password, verify_password, create_access_token,
+    get_current_user, create_access_token,
 )
+from services.password_hasher import password_hasher
 from pydantic import BaseModel
 from typing import Optional
 import logging
@@ -51,30 +53,25 @@ class UpdateWorkerRequest(BaseModel):
 #  Helpers
 # ════════════════════════════════════════════════════════════
 
-def _get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 
 # ════════════════════════════════════════════════════════════
 #  Worker login
 # ════════════════════════════════════════════════════════════
 
 @router.post("/login")
-def worker_login(req: WorkerLoginRequest, db: Session = Depends(_get_db)):
+async def worker_login(req: WorkerLoginRequest, db: Session = Depends(get_db)):
     """
     Worker login with phone number + password.
     Returns JWT token that works with all /orders and /inventory endpoints.
     """
-    worker = db.query(UserDB).filter(
-        UserDB.phone == req.phone,
-        UserDB.role == "worker",
-    ).first()
+    worker = await run_in_threadpool(
+        lambda: db.query(UserDB).filter(
+            UserDB.phone == req.phone,
+            UserDB.role == "worker",
+        ).first()
+    )
 
-    if not worker or not verify_password(req.password, worker.password_hash):
+    if not worker or not await password_hasher.verify(req.password, worker.password_hash):
         raise HTTPException(status_code=401, detail="رقم الجوال أو كلمة المرور غير صحيحة")
 
     token = create_access_token({
@@ -105,7 +102,7 @@ def worker_login(req: WorkerLoginRequest, db: Session = Depends(_get_db)):
 @router.get("/workers")
 def list_workers(
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(_get_db),
+    db: Session = Depends(get_db),
 ):
     """Admin lists all workers with order/inventory summary."""
     if not current_user.get("is_admin"):
@@ -162,7 +159,7 @@ def list_workers(
 def create_worker(
     req: CreateWorkerRequest,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(_get_db),
+    db: Session = Depends(get_db),
 ):
     """Admin creates a worker account."""
     if not current_user.get("is_admin"):
@@ -179,7 +176,7 @@ def create_worker(
 
     worker = UserDB(
         invoice_no=invoice_no,
-        password_hash=hash_password(req.password),
+        password_hash=password_hasher.hash_blocking(req.password),
         name=req.name,
         phone=req.phone,
         role="worker",
@@ -219,7 +216,7 @@ def update_worker(
     worker_id: int,
     req: UpdateWorkerRequest,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(_get_db),
+    db: Session = Depends(get_db),
 ):
     """Admin updates a worker's details."""
     if not current_user.get("is_admin"):
@@ -236,7 +233,7 @@ def update_worker(
     if req.city is not None:
         worker.city = req.city
     if req.password is not None:
-        worker.password_hash = hash_password(req.password)
+        worker.password_hash = password_hasher.hash_blocking(req.password)
     if req.geofence_lat is not None:
         worker.geofence_lat = req.geofence_lat
     if req.geofence_lng is not None:
@@ -268,7 +265,7 @@ def update_worker(
 def delete_worker(
     worker_id: int,
     current_user: dict = Depends(get_current_user),
-    db: Session = Depends(_get_db),
+    db: Session = Depends(get_db),
 ):
     """Admin deletes a worker account."""
     if not current_user.get("is_admin"):
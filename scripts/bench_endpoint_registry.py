@@ -0,0 +1,114 @@
+"""
+Micro-benchmark: per-call overhead of endpoint config resolution.
+
+Compares the legacy per-call dict walks (profile lookup from env, nested
+config lookups, copy + defaults + required checks, dot-path splitting)
+against the compiled EndpointRegistry used by ManufacturerAPIService and
+BaseAdapter. No network or database access.
+
+Run: python scripts/bench_endpoint_registry.py [iterations]
+"""
+import os
+import sys
+import timeit
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.endpoint_registry import EndpointRegistry
+
+CONFIG_PATH = os.getenv("MANUFACTURER_API_CONFIG", "config/manufacturer_api.yaml")
+
+with open(CONFIG_PATH, "r") as f:
+    CONFIG = yaml.safe_load(f)
+
+REGISTRY = EndpointRegistry(CONFIG, os.getenv("MANUFACTURER_API_PROFILE", "default"))
+
+REQUEST = {"deviceIds": ["D1", "D2", "D3"]}
+LIST_REQUEST = {"page": 2}
+RESPONSE = {
+    "code": 200,
+    "data": {
+        "list": [{"deviceId": f"D{i}", "state": 1, "accState": 1} for i in range(50)],
+        "gpsInfo": [{"latitude": 24_000_000, "longitude": 46_000_000}],
+    },
+}
+
+
+# ----------------------------------------------------------------------
+# Legacy implementation (what every call did before the registry)
+# ----------------------------------------------------------------------
+
+def _legacy_endpoint_config(name):
+    profile = os.getenv("MANUFACTURER_API_PROFILE", "default")
+    return CONFIG.get("profiles", {}).get(profile, {}).get("endpoints", {}).get(name)
+
+
+def _legacy_build_request(name, data):
+    request_config = _legacy_endpoint_config(name).get("request", {})
+    request_data = data.copy() if data else {}
+    for key, value in request_config.get("defaults", {}).items():
+        if key not in request_data:
+            request_data[key] = value
+    required = request_config.get("required", [])
+    if required:
+        missing = [f for f in required if f not in request_data]
+        if missing:
+            raise ValueError(missing)
+    return request_data
+
+
+def _legacy_extract(response, name, default_path):
+    config = _legacy_endpoint_config(name)
+    path = config["response"].get("data_path", default_path) if "response" in config else default_path
+    value = response
+    for part in path.split("."):
+        if isinstance(value, dict):
+            value = value.get(part)
+        elif isinstance(value, list):
+            value = value[int(part)]
+        else:
+            return None
+        if value is None:
+            return None
+    return value
+
+
+def legacy_call():
+    _legacy_endpoint_config("device_states")
+    _legacy_build_request("device_states", REQUEST)
+    _legacy_build_request("device_list", LIST_REQUEST)
+    _legacy_extract(RESPONSE, "device_states", "data.list")
+    _legacy_extract(RESPONSE, "gps_query_detailed_track_v1", "data.gpsInfo")
+
+
+# ----------------------------------------------------------------------
+# Compiled registry
+# ----------------------------------------------------------------------
+
+def compiled_call():
+    spec = REGISTRY.require("device_states")
+    spec.build_request(REQUEST)
+    REGISTRY.require("device_list").build_request(LIST_REQUEST)
+    spec.extract_data(RESPONSE, "data.list")
+    REGISTRY.require("gps_query_detailed_track_v1").extract_data(RESPONSE, "data.gpsInfo")
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+
+    assert _legacy_build_request("device_list", LIST_REQUEST) == REGISTRY.require("device_list").build_request(LIST_REQUEST)
+    assert _legacy_extract(RESPONSE, "device_states", "data.list") is REGISTRY.require("device_states").extract_data(RESPONSE)
+
+    results = {}
+    for label, fn in (("legacy", legacy_call), ("compiled", compiled_call)):
+        best = min(timeit.repeat(fn, number=iterations, repeat=5))
+        results[label] = best / iterations * 1e6
+        print(f"{label:>9}: {results[label]:.2f} µs per call cycle")
+
+    print(f"  speedup: {results['legacy'] / results['compiled']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
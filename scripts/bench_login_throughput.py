@@ -0,0 +1,176 @@
+"""
+Benchmark: login throughput and /gps/latest latency during a login burst.
+
+Builds a temporary SQLite database (users with pbkdf2_sha256 hashes and a
+device_cache fleet) and runs a shared 20-thread executor, like main.py's
+lifespan. A probe submits a /gps/latest-style cache read to that executor
+every --probe-interval-ms and records how long each one waited. Three passes:
+
+  idle     probes only (baseline latency)
+  threads  logins verify inline on the shared executor (the old path)
+  pool     logins look the user up on the executor and verify in the
+           password_hasher process pool
+
+Run: python scripts/bench_login_throughput.py [--users 200] [--logins 400]
+     [--clients 40] [--probe-interval-ms 20] [--hash-workers 2]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import HTTPException
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models.device_cache_db import DeviceCacheDB
+from models.user_db import UserDB
+from services.password_hasher import PasswordHasher, pwd_context
+
+PASSWORD = "bench-password"
+
+
+def build_db(path: str, users: int, devices: int):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine, tables=[UserDB.__table__, DeviceCacheDB.__table__])
+    password_hash = pwd_context.hash(PASSWORD)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    session = Session()
+    session.execute(insert(UserDB), [
+        {"invoice_no": f"INV{u:06d}", "password_hash": password_hash, "name": f"User {u}"}
+        for u in range(users)
+    ])
+    session.execute(insert(DeviceCacheDB), [
+        {"device_id": f"BENCH{d:06d}", "latitude": 24.7 + d * 1e-4, "longitude": 46.6,
+         "speed": 40.0, "acc_status": True, "is_online": True}
+        for d in range(devices)
+    ])
+    session.commit()
+    session.close()
+    return Session
+
+
+def make_handlers(Session, devices: int):
+    def find_user(invoice_no: str):
+        db = Session()
+        try:
+            return db.query(UserDB).filter(UserDB.invoice_no == invoice_no).first()
+        finally:
+            db.close()
+
+    def legacy_login(invoice_no: str) -> bool:
+        user = find_user(invoice_no)
+        return bool(user and pwd_context.verify(PASSWORD, user.password_hash))
+
+    def gps_latest(rng: random.Random):
+        db = Session()
+        try:
+            device_id = f"BENCH{rng.randrange(devices):06d}"
+            return db.query(DeviceCacheDB).filter(DeviceCacheDB.device_id == device_id).first()
+        finally:
+            db.close()
+
+    return find_user, legacy_login, gps_latest
+
+
+async def run_pass(label, logins, clients, probe_interval, login_once, gps_latest, seed):
+    loop = asyncio.get_running_loop()
+    rng = random.Random(seed)
+    probe_ms = []
+    remaining = [logins]
+    done = asyncio.Event()
+    rejected = [0]
+
+    async def client():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            try:
+                await login_once(f"INV{rng.randrange(args.users):06d}")
+            except HTTPException:
+                rejected[0] += 1
+
+    async def probe():
+        while not done.is_set():
+            started = time.perf_counter()
+            await loop.run_in_executor(None, gps_latest, rng)
+            probe_ms.append((time.perf_counter() - started) * 1000)
+            await asyncio.sleep(probe_interval)
+
+    probe_task = asyncio.create_task(probe())
+    start = time.perf_counter()
+    if login_once is None:
+        await asyncio.sleep(2)
+    else:
+        await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await probe_task
+
+    probe_ms.sort()
+    q = statistics.quantiles(probe_ms, n=100, method="inclusive") if len(probe_ms) > 1 else probe_ms * 99
+    rate = f"{(logins - rejected[0]) / elapsed:>7.1f} logins/s" if login_once else f"{'-':>7} logins/s"
+    print(
+        f"{label:<8} {rate}  rejected {rejected[0]:>4}  "
+        f"/gps/latest p50 {q[49]:>7.1f} ms  p95 {q[94]:>7.1f} ms  "
+        f"p99 {q[98]:>7.1f} ms  max {probe_ms[-1]:>7.1f} ms  ({len(probe_ms)} probes)"
+    )
+
+
+async def main_async():
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=20))
+
+    tmp = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+    tmp.close()
+    try:
+        Session = build_db(tmp.name, args.users, args.devices)
+        find_user, legacy_login, gps_latest = make_handlers(Session, args.devices)
+
+        os.environ["PASSWORD_HASH_WORKERS"] = str(args.hash_workers)
+        hasher = PasswordHasher()
+        hasher.start()
+
+        async def threaded(invoice_no):
+            return await loop.run_in_executor(None, legacy_login, invoice_no)
+
+        async def pooled(invoice_no):
+            user = await loop.run_in_executor(None, find_user, invoice_no)
+            return bool(user and await hasher.verify(PASSWORD, user.password_hash))
+
+        print(
+            f"{args.users} users, {args.devices} devices, {args.logins} logins from "
+            f"{args.clients} clients; executor 20 threads, hasher {args.hash_workers} processes\n"
+        )
+        interval = args.probe_interval_ms / 1000
+        await run_pass("idle", 0, 0, interval, None, gps_latest, args.seed)
+        await run_pass("threads", args.logins, args.clients, interval, threaded, gps_latest, args.seed)
+        await run_pass("pool", args.logins, args.clients, interval, pooled, gps_latest, args.seed)
+        print(f"\nhasher: {hasher.get_stats()}")
+        hasher.shutdown()
+    finally:
+        os.unlink(tmp.name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--devices", type=int, default=500)
+    parser.add_argument("--logins", type=int, default=400)
+    parser.add_argument("--clients", type=int, default=40)
+    parser.add_argument("--probe-interval-ms", type=float, default=20.0)
+    parser.add_argument("--hash-workers", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.WARNING)
+
+    asyncio.run(main_async())
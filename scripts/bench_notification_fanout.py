@@ -0,0 +1,195 @@
+"""
+Benchmark: ACC notification fan-out throughput without Firebase.
+
+Builds an in-memory SQLite fleet (devices, per-device subscribers, FCM
+tokens), swaps NotificationService onto LocalFCMTransport and replays a
+storm of ACC flips against random devices. Three passes:
+
+  legacy     per-user token query + one FCM request per token (the old path)
+  multicast  subscription graph + language-grouped multicast, aggregation off
+  storm      same, with the default ACC digest window (flapping collapses)
+
+Run: python scripts/bench_notification_fanout.py [--devices 250] [--users-per-device 8]
+     [--tokens-per-user 2] [--events 200] [--latency-ms 20] [--skip-legacy]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base, SessionLocal
+from models.cache_generation_db import CacheGenerationDB
+from models.device_db import DeviceDB
+from models.fcm_token_db import FCMTokenDB, UserNotificationSettingsDB, NotificationPreference
+from models.user_db import UserDB  # noqa: F401  (registers users table for FKs)
+from services.alert_aggregator import alert_aggregator
+from services.notification_service import NotificationService, LocalFCMTransport, set_transport
+from services.subscription_graph import subscription_graph
+
+
+def build_fleet(session, devices: int, users_per_device: int, tokens_per_user: int, seed: int):
+    rng = random.Random(seed)
+    prefs = [NotificationPreference.BOTH.value] * 6 + [
+        NotificationPreference.ON_ONLY.value,
+        NotificationPreference.OFF_ONLY.value,
+        NotificationPreference.NONE.value,
+    ]
+    device_rows, setting_rows, token_rows = [], [], []
+    user_id = 0
+    for d in range(devices):
+        device_id = f"BENCH{d:06d}"
+        device_rows.append({"device_id": device_id, "name": f"Car {d}", "org_id": "bench"})
+        for _ in range(users_per_device):
+            user_id += 1
+            setting_rows.append({
+                "user_id": user_id,
+                "device_id": device_id,
+                "acc_notification": rng.choice(prefs),
+                "language": rng.choice(["en", "ar"]),
+            })
+            for t in range(tokens_per_user):
+                prefix = "invalid" if rng.random() < 0.01 else "tok"
+                token_rows.append({
+                    "user_id": user_id,
+                    "fcm_token": f"{prefix}-{user_id}-{t}-{'x' * 120}",
+                    "is_active": True,
+                })
+    session.execute(insert(DeviceDB), device_rows)
+    session.execute(insert(UserNotificationSettingsDB), setting_rows)
+    session.execute(insert(FCMTokenDB), token_rows)
+    session.commit()
+    return [row["device_id"] for row in device_rows], user_id, len(token_rows)
+
+
+def legacy_send_acc(session, device_id: str, acc_on: bool) -> int:
+    """The pre-multicast path: N+1 token queries, one request per token."""
+    device = session.query(DeviceDB).filter(DeviceDB.device_id == device_id).first()
+    device_name = device.name if device else device_id
+    settings = session.query(UserNotificationSettingsDB).filter(
+        UserNotificationSettingsDB.device_id == device_id
+    ).all()
+    sent = 0
+    for setting in settings:
+        pref = setting.acc_notification
+        if pref == NotificationPreference.NONE.value:
+            continue
+        if pref == NotificationPreference.ON_ONLY.value and not acc_on:
+            continue
+        if pref == NotificationPreference.OFF_ONLY.value and acc_on:
+            continue
+        tokens = session.query(FCMTokenDB).filter(
+            FCMTokenDB.user_id == setting.user_id, FCMTokenDB.is_active == True
+        ).all()
+        msg = NotificationService.get_message(setting.language or "en", acc_on, device_name)
+        for token in tokens:
+            result = NotificationService.send_notification(token.fcm_token, msg["title"], msg["body"], {})
+            if result is True:
+                token.last_used_at = datetime.utcnow()
+                sent += 1
+            elif result is False:
+                token.is_active = False
+    session.commit()
+    return sent
+
+
+def reset_tokens(session):
+    session.query(FCMTokenDB).update({FCMTokenDB.is_active: True}, synchronize_session=False)
+    session.commit()
+    subscription_graph.clear()
+
+
+def run_pass(label, session, device_ids, events, seed, send):
+    rng = random.Random(seed)
+    state = {d: False for d in device_ids}
+    sent = 0
+    start = time.perf_counter()
+    for _ in range(events):
+        device_id = rng.choice(device_ids)
+        state[device_id] = not state[device_id]
+        sent += send(session, device_id, state[device_id])
+    elapsed = time.perf_counter() - start
+    print(
+        f"{label:<10} {events:>6} events  {sent:>7} pushes  {elapsed:>8.2f}s  "
+        f"{sent / elapsed:>9.0f} pushes/s  {events / elapsed:>7.1f} events/s"
+    )
+    return sent, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=250)
+    parser.add_argument("--users-per-device", type=int, default=8)
+    parser.add_argument("--tokens-per-user", type=int, default=2)
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--unregistered-rate", type=float, default=0.005)
+    parser.add_argument("--quota-error-rate", type=float, default=0.005)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.WARNING)
+
+    engine = create_engine(
+        "sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False}
+    )
+    Base.metadata.create_all(
+        engine,
+        tables=[DeviceDB.__table__, UserNotificationSettingsDB.__table__, FCMTokenDB.__table__,
+                CacheGenerationDB.__table__],
+    )
+    # subscription_graph publishes invalidations through the app's SessionLocal
+    SessionLocal.configure(bind=engine)
+    session = sessionmaker(bind=engine, autoflush=False)()
+
+    device_ids, users, tokens = build_fleet(
+        session, args.devices, args.users_per_device, args.tokens_per_user, args.seed
+    )
+    transport = LocalFCMTransport(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.latency_ms / 4,
+        unregistered_rate=args.unregistered_rate,
+        quota_error_rate=args.quota_error_rate,
+        seed=args.seed,
+    )
+    set_transport(transport)
+    print(
+        f"Fleet: {len(device_ids)} devices, {users} users, {tokens} tokens; "
+        f"simulated FCM latency {args.latency_ms:.0f} ms/request\n"
+    )
+
+    acc_window = alert_aggregator.windows.get("ACC", 0)
+    try:
+        if not args.skip_legacy:
+            reset_tokens(session)
+            run_pass("legacy", session, device_ids, args.events, args.seed, legacy_send_acc)
+
+        def multicast(s, device_id, acc_on):
+            return NotificationService.send_acc_notification(s, device_id, acc_on)
+
+        alert_aggregator.windows["ACC"] = 0
+        reset_tokens(session)
+        run_pass("multicast", session, device_ids, args.events, args.seed, multicast)
+
+        alert_aggregator.windows["ACC"] = acc_window
+        reset_tokens(session)
+        run_pass("storm", session, device_ids, args.events, args.seed, multicast)
+        status = alert_aggregator.get_status()
+        print(f"\nstorm: {status['suppressed']} per-user alerts held for {status['open_windows']} digest windows")
+        print(f"FCM requests issued (all passes): {transport.stats['requests']}")
+    finally:
+        alert_aggregator.windows["ACC"] = acc_window
+        set_transport(None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark: /gps/history response formats — serialization CPU and bytes.
+
+Encodes the same synthetic driving day (see bench_track_simplify.py) as:
+
+  json      TrackPlaybackDto.model_dump() + json.dumps (the default body)
+  polyline  track_encoding.encode_polyline_track + json.dumps
+  msgpack   track_encoding.encode_msgpack_track
+
+and reports best-of-N encode and decode time, body size, and gzip size
+(what the wire carries when the proxy compresses). Decoding is checked to
+reproduce the points within each format's precision.
+
+Run: python scripts/bench_track_encoding.py [--hours 10] [--repeat 5]
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_track_simplify import synth_track
+from models.dto import TrackPlaybackDto, TrackPointDto
+from utils import track_encoding
+
+
+def timed(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return result, best * 1000
+
+
+def decode_polyline_body(body: bytes):
+    data = json.loads(body)
+    coords = track_encoding.decode_polyline(data["polyline"], data["precision"])
+    ts = track_encoding.delta_decode(data["timestamp_ms_delta"])
+    speed = track_encoding.delta_decode(data["speed_x10_delta"])
+    direction = track_encoding.delta_decode(data["direction_delta"])
+    return [
+        {"latitude": lat, "longitude": lng, "timestamp_ms": t,
+         "speed_kmh": None if s is None else s / 10, "direction_deg": d}
+        for (lat, lng), t, s, d in zip(coords, ts, speed, direction)
+    ]
+
+
+def check(points, decoded, coord_tol):
+    assert len(points) == len(decoded)
+    for p, d in zip(points, decoded):
+        assert abs(p.latitude - d["latitude"]) <= coord_tol and abs(p.longitude - d["longitude"]) <= coord_tol
+        assert p.timestamp_ms == d["timestamp_ms"]
+        assert abs(p.speed_kmh - d["speed_kmh"]) <= 0.05
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    raw = synth_track(args.hours, args.seed)
+    playback = TrackPlaybackDto(
+        deviceId="BENCH000001",
+        start_time_ms=raw[0]["timestamp_ms"],
+        end_time_ms=raw[-1]["timestamp_ms"],
+        points=[TrackPointDto(**p) for p in raw],
+    )
+    points = playback.points
+
+    formats = {
+        "json": (
+            lambda: json.dumps({"success": True, **playback.model_dump(by_alias=False)}).encode(),
+            lambda body: json.loads(body)["points"],
+            1e-9,
+        ),
+        "polyline": (
+            lambda: json.dumps(track_encoding.encode_polyline_track(playback)).encode(),
+            decode_polyline_body,
+            0.5 / 10 ** track_encoding.POLYLINE_PRECISION + 1e-9,
+        ),
+        "msgpack": (
+            lambda: track_encoding.encode_msgpack_track(playback),
+            lambda body: track_encoding.decode_msgpack_track(body)["points"],
+            0.5 / track_encoding.MSGPACK_COORD_SCALE + 1e-9,
+        ),
+    }
+
+    print(f"{len(points)} points over {args.hours:g} h\n")
+    print(f"{'format':<9} {'encode':>9} {'decode':>9} {'bytes':>10} {'B/point':>8} {'gzip':>9} {'B/point':>8}")
+    for name, (encode, decode, coord_tol) in formats.items():
+        body, encode_ms = timed(encode, args.repeat)
+        decoded, decode_ms = timed(lambda: decode(body), args.repeat)
+        check(points, decoded, coord_tol)
+        gz = len(gzip.compress(body, 6))
+        print(f"{name:<9} {encode_ms:>7.1f}ms {decode_ms:>7.1f}ms {len(body):>10} "
+              f"{len(body) / len(points):>8.1f} {gz:>9} {gz / len(points):>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark: /gps/history track simplification — server cost vs. payload.
+
+Synthesizes a long driving day (1 Hz points, city driving with turns,
+traffic-light stops and a few parked gaps, ~1 m GPS jitter) and, for each
+zoom level, simplifies it the way /gps/history does. Reports kept points,
+simplification time, JSON payload size (raw and gzipped) and the client
+side json.loads time, as a proxy for what the app saves before drawing.
+
+Run: python scripts/bench_track_simplify.py [--hours 10] [--repeat 5]
+"""
+import argparse
+import gzip
+import json
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import track_simplify
+
+
+def synth_track(hours: float, seed: int):
+    rng = random.Random(seed)
+    lat, lng, heading = 24.7136, 46.6753, 0.0
+    t_ms = 1_700_000_000_000
+    points = []
+    stop_left = 0
+    for _ in range(int(hours * 3600)):
+        if stop_left > 0:
+            speed = 0.0
+            stop_left -= 1
+        else:
+            speed = max(0.0, rng.gauss(45, 12))
+            if rng.random() < 0.004:
+                stop_left = rng.randint(20, 90)  # traffic light
+            if rng.random() < 0.01:
+                heading += rng.choice([-90, 90]) + rng.gauss(0, 5)  # turn
+            heading += rng.gauss(0, 1.5)
+        step_m = speed / 3.6
+        lat += step_m * math.cos(math.radians(heading)) / 111_320 + rng.gauss(0, 1e-5)
+        lng += step_m * math.sin(math.radians(heading)) / (111_320 * math.cos(math.radians(lat))) + rng.gauss(0, 1e-5)
+        t_ms += 1000
+        if rng.random() < 0.0005:
+            t_ms += rng.randint(10, 60) * 60_000  # parked, device off
+        points.append({
+            "latitude": round(lat, 6), "longitude": round(lng, 6), "timestamp_ms": t_ms,
+            "speed_kmh": round(speed, 1), "direction_deg": round(heading % 360, 1),
+        })
+    return points
+
+
+def payload(points):
+    body = json.dumps({"success": True, "points": points}).encode()
+    return body, len(body), len(gzip.compress(body, 6))
+
+
+def timed(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return result, best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    points = synth_track(args.hours, args.seed)
+    lats = [p["latitude"] for p in points]
+    lngs = [p["longitude"] for p in points]
+    timestamps = [p["timestamp_ms"] for p in points]
+    mean_lat = sum(lats) / len(lats)
+
+    body, raw_bytes, raw_gz = payload(points)
+    _, raw_parse = timed(lambda: json.loads(body), args.repeat)
+    print(f"{len(points)} points over {args.hours:g} h\n")
+    print(f"{'zoom':>5} {'tol m':>7} {'points':>7} {'simplify':>9} {'json KB':>8} {'gzip KB':>8} {'parse':>8}")
+    print(f"{'raw':>5} {'-':>7} {len(points):>7} {'-':>9} {raw_bytes / 1024:>8.0f} {raw_gz / 1024:>8.0f} {raw_parse:>6.1f}ms")
+
+    for zoom in (10, 12, 14, 16, 18):
+        tolerance = track_simplify.tolerance_for_zoom(zoom, mean_lat)
+
+        def run():
+            keep = track_simplify.stop_indices([p["speed_kmh"] for p in points], timestamps)
+            return track_simplify.simplify(lats, lngs, tolerance, keep)
+
+        indices, simplify_ms = timed(run, args.repeat)
+        kept = [points[i] for i in indices]
+        body, size, gz = payload(kept)
+        _, parse_ms = timed(lambda: json.loads(body), args.repeat)
+        print(f"{zoom:>5} {tolerance:>7.2f} {len(kept):>7} {simplify_ms:>7.1f}ms "
+              f"{size / 1024:>8.0f} {gz / 1024:>8.0f} {parse_ms:>6.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Build the offline reverse-geocoding gazetteer from an OpenStreetMap extract.
+
+Input is GeoJSON exported from an OSM extract, e.g.:
+
+    osmium tags-filter saudi-arabia-latest.osm.pbf \
+        nwr/place nwr/boundary=administrative w/highway -o ksa-filtered.osm.pbf
+    osmium export ksa-filtered.osm.pbf -f geojsonseq -o ksa.geojsonseq
+
+Either a FeatureCollection (.geojson) or newline-delimited features
+(.geojsonseq) is accepted. Output is the gzipped JSON loaded by
+services/offline_geocoder.py.
+
+Run: python scripts/import_osm_gazetteer.py ksa.geojsonseq [data/gazetteer/ksa.json.gz]
+"""
+import gzip
+import json
+import os
+import sys
+import logging
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.offline_geocoder import DEFAULT_GAZETTEER_PATH
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+logger = logging.getLogger(__name__)
+
+CITY_PLACES = {"city", "town", "village"}
+DISTRICT_PLACES = {"suburb", "neighbourhood", "quarter", "borough"}
+CITY_ADMIN_LEVELS = {"5", "6"}
+DISTRICT_ADMIN_LEVELS = {"8", "9", "10"}
+ROAD_CLASSES = {
+    "motorway", "trunk", "primary", "secondary", "tertiary",
+    "unclassified", "residential", "living_street", "service",
+    "motorway_link", "trunk_link", "primary_link", "secondary_link", "tertiary_link",
+}
+COORD_PRECISION = 6
+
+
+def _name(props: dict):
+    return props.get("name:ar") or props.get("name")
+
+
+def _classify_area(props: dict):
+    place = props.get("place")
+    admin_level = str(props.get("admin_level", ""))
+    if place in CITY_PLACES or (props.get("boundary") == "administrative" and admin_level in CITY_ADMIN_LEVELS):
+        return "city"
+    if place in DISTRICT_PLACES or (props.get("boundary") == "administrative" and admin_level in DISTRICT_ADMIN_LEVELS):
+        return "district"
+    return None
+
+
+def _round_ring(ring):
+    return [[round(x, COORD_PRECISION), round(y, COORD_PRECISION)] for x, y, *_ in ring]
+
+
+def _iter_features(path: str):
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        first = f.read(1)
+        f.seek(0)
+        if path.endswith((".geojsonseq", ".geojsonl", ".jsonl")) or first == "\x1e":
+            for line in f:
+                line = line.strip().lstrip("\x1e")
+                if line:
+                    yield json.loads(line)
+        else:
+            yield from json.load(f).get("features", [])
+
+
+def build(input_path: str) -> dict:
+    areas = []
+    road_lines = defaultdict(list)
+
+    for feature in _iter_features(input_path):
+        props = feature.get("properties") or {}
+        geom = feature.get("geometry") or {}
+        name = _name(props)
+        if not name:
+            continue
+
+        gtype = geom.get("type")
+        coords = geom.get("coordinates") or []
+
+        if gtype in ("Polygon", "MultiPolygon"):
+            kind = _classify_area(props)
+            if not kind:
+                continue
+            polygons = [coords] if gtype == "Polygon" else coords
+            areas.append({
+                "kind": kind,
+                "name": name,
+                "polygons": [[_round_ring(ring) for ring in poly] for poly in polygons],
+            })
+
+        elif gtype in ("LineString", "MultiLineString") and props.get("highway") in ROAD_CLASSES:
+            lines = [coords] if gtype == "LineString" else coords
+            road_lines[name].extend(_round_ring(line) for line in lines if len(line) >= 2)
+
+    roads = [{"name": name, "lines": lines} for name, lines in road_lines.items()]
+    logger.info(
+        f"Gazetteer: {sum(a['kind'] == 'city' for a in areas)} cities, "
+        f"{sum(a['kind'] == 'district' for a in areas)} districts, {len(roads)} roads"
+    )
+    return {"version": 1, "source": os.path.basename(input_path), "areas": areas, "roads": roads}
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    input_path = sys.argv[1]
+    output_path = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_GAZETTEER_PATH
+
+    gazetteer = build(input_path)
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with gzip.open(output_path, "wt", encoding="utf-8") as f:
+        json.dump(gazetteer, f, ensure_ascii=False, separators=(",", ":"))
+    logger.info(f"Wrote {output_path} ({os.path.getsize(output_path) / 1024 / 1024:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
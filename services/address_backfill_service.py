@@ -0,0 +1,167 @@
+"""
+Address Backfill Service
+
+Finds device_cache rows that have coordinates but no address and fills
+them in the background, so the first user to open a fleet view doesn't
+pay for N sequential geocode calls inside /gps/latest or /gps/devices.
+
+Per cycle:
+1. Load up to BATCH_LIMIT address-less rows (one query)
+2. Dedup by geocode cell and resolve each cell once with bounded
+   parallelism (GeocodingService.batch_reverse_geocode), stopping at the
+   cycle's time budget; cells left over are picked up next cycle
+3. Write all addresses back in one executemany UPDATE, guarded so rows
+   that got an address in the meantime are left alone
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any
+
+from sqlalchemy import bindparam, or_, update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models.device_cache_db import DeviceCacheDB
+from services.geocoding_service import GeocodingService
+from services.job_scheduler import scheduler
+
+logger = logging.getLogger(__name__)
+
+_backfill_thread_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="addr-backfill")
+
+
+class AddressBackfillService:
+
+    INTERVAL_SECONDS = 300
+    GEOCODE_CONCURRENCY = 4
+    CYCLE_TIMEOUT = 240
+    # Geocoding stops here, leaving time for the write-back before CYCLE_TIMEOUT
+    CYCLE_GEOCODE_BUDGET = CYCLE_TIMEOUT * 0.8
+    # Rows whose cells can all be resolved within the budget in the worst case
+    BATCH_LIMIT = int(
+        CYCLE_GEOCODE_BUDGET / GeocodingService.WORST_CASE_LOOKUP_SECONDS * GEOCODE_CONCURRENCY
+    )
+    # Manual runs from /admin/geocode/backfill must finish inside the request timeout
+    MANUAL_GEOCODE_BUDGET = 90
+
+    def __init__(self):
+        self._last_run_at: Optional[datetime] = None
+        self._last_run_duration: Optional[float] = None
+        self._last_result: Dict[str, int] = {}
+        self._last_error: Optional[str] = None
+        self._total_filled = 0
+        logger.info("🏷️ Address Backfill Service initialized")
+
+    # ------------------------------------------------------------------
+    # Status
+    # ------------------------------------------------------------------
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "running": scheduler.is_active("address_backfill"),
+            "interval_seconds": self.INTERVAL_SECONDS,
+            "last_run_at": self._last_run_at.isoformat() if self._last_run_at else None,
+            "last_run_duration_s": round(self._last_run_duration, 2) if self._last_run_duration else None,
+            "last_result": self._last_result,
+            "total_filled": self._total_filled,
+            "last_error": self._last_error,
+        }
+
+    # ------------------------------------------------------------------
+    # Entry points
+    # ------------------------------------------------------------------
+
+    def run_scheduled(self) -> Dict[str, int]:
+        """One pass; scheduled as the "address_backfill" job (see main.py)."""
+        try:
+            return self._backfill_blocking(self.BATCH_LIMIT, self.CYCLE_GEOCODE_BUDGET)
+        except Exception as e:
+            self._last_error = str(e)
+            raise
+
+    async def run_once(self, limit: Optional[int] = None) -> Dict[str, int]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            _backfill_thread_pool, self._backfill_blocking,
+            limit or self.BATCH_LIMIT, self.MANUAL_GEOCODE_BUDGET,
+        )
+
+    # ------------------------------------------------------------------
+    # Single pass
+    # ------------------------------------------------------------------
+
+    def _backfill_blocking(self, limit: int, geocode_budget: float) -> Dict[str, int]:
+        start = datetime.now(timezone.utc)
+        deadline = time.monotonic() + geocode_budget
+        db: Session = SessionLocal()
+        try:
+            rows = (
+                db.query(DeviceCacheDB.id, DeviceCacheDB.latitude, DeviceCacheDB.longitude)
+                .filter(
+                    DeviceCacheDB.latitude.isnot(None),
+                    DeviceCacheDB.longitude.isnot(None),
+                    or_(DeviceCacheDB.address.is_(None), DeviceCacheDB.address == ""),
+                )
+                .order_by(DeviceCacheDB.updated_at.desc())
+                .limit(limit)
+                .all()
+            )
+            # Filter out 0,0 fixes — same rule as get_location_name
+            rows = [r for r in rows if r.latitude and r.longitude]
+
+            result = {"candidates": len(rows), "cells": 0, "resolved": 0, "filled": 0}
+            if not rows:
+                self._finish(start, result)
+                return result
+
+            points = [(r.latitude, r.longitude) for r in rows]
+            result["cells"] = len({GeocodingService._cell_key(lat, lng) for lat, lng in points})
+
+            addresses = GeocodingService.batch_reverse_geocode(
+                points, max_workers=self.GEOCODE_CONCURRENCY, deadline=deadline
+            )
+            updates = [
+                {"_id": r.id, "_address": address}
+                for r, address in zip(rows, addresses) if address
+            ]
+            result["resolved"] = len(updates)
+
+            if updates:
+                table = DeviceCacheDB.__table__
+                stmt = (
+                    update(table)
+                    .where(table.c.id == bindparam("_id"))
+                    .where(or_(table.c.address.is_(None), table.c.address == ""))
+                    # Keep updated_at: it tracks data freshness, not address fills
+                    .values(address=bindparam("_address"), updated_at=table.c.updated_at)
+                )
+                db.execute(stmt, updates)
+                db.commit()
+                result["filled"] = len(updates)
+
+            self._finish(start, result)
+            return result
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _finish(self, start: datetime, result: Dict[str, int]):
+        self._last_run_at = datetime.now(timezone.utc)
+        self._last_run_duration = (self._last_run_at - start).total_seconds()
+        self._last_result = result
+        self._last_error = None
+        self._total_filled += result.get("filled", 0)
+        if result.get("candidates"):
+            logger.info(
+                f"🏷️ Address backfill: {result['candidates']} rows, {result['cells']} cells, "
+                f"{result['filled']} filled in {self._last_run_duration:.1f}s"
+            )
+
+
+address_backfill = AddressBackfillService()
@@ -0,0 +1,184 @@
+"""
+Alert Aggregator - Burst collapsing for push notifications
+
+ACC flapping, repeated overspeed and noisy alarm sessions can produce many
+pushes per minute for the same car. Every push goes through a window keyed
+by (user_id, device_id, category):
+
+1. No open window → the event is sent immediately and a window opens
+2. Window open → the event is counted instead of sent
+3. Window expires with suppressed events → one digest is sent
+   ("7 more alerts in the last 5 min") and a fresh window opens, so a
+   storm that keeps going yields one digest per window
+4. Window expires quietly → it's dropped
+
+Window lengths are per category. Categories are "ACC", "SPEED" and the
+alarm categories of the forwarding taxonomy (get_alarm_category: ADAS,
+DSM, BSD, SDA, Common, Channel, Geofence). Override with
+ALERT_DIGEST_WINDOWS='{"ADAS": 600, "ACC": 0}' (seconds, 0 disables
+aggregation for that category).
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from database import SessionLocal
+from services.job_scheduler import scheduler
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOWS = {
+    "ACC": 120,
+    "SPEED": 300,
+    "ADAS": 300,
+    "DSM": 300,
+    "BSD": 300,
+    "SDA": 300,
+    "Common": 300,
+    "Channel": 600,
+    "Geofence": 300,
+}
+DEFAULT_WINDOW_SECONDS = 300
+
+WindowKey = Tuple[int, str, str]  # (user_id, device_id, category)
+
+
+@dataclass
+class _Window:
+    opened_at: float
+    expires_at: float
+    suppressed: int = 0
+    last_event: Dict[str, Any] = field(default_factory=dict)
+
+
+def _load_windows() -> Dict[str, int]:
+    windows = dict(DEFAULT_WINDOWS)
+    raw = os.getenv("ALERT_DIGEST_WINDOWS")
+    if raw:
+        try:
+            windows.update({str(k): int(v) for k, v in json.loads(raw).items()})
+        except (ValueError, TypeError, AttributeError) as e:
+            logger.error(f"❌ Invalid ALERT_DIGEST_WINDOWS ({e}), using defaults")
+    return windows
+
+
+class AlertAggregator:
+
+    FLUSH_INTERVAL_SECONDS = 15
+
+    def __init__(self):
+        self.windows = _load_windows()
+        self._open: Dict[WindowKey, _Window] = {}
+        self._lock = threading.Lock()
+        self._sent_immediately = 0
+        self._suppressed = 0
+        self._digests_sent = 0
+        logger.info("🧺 Alert Aggregator initialized")
+
+    def window_for(self, category: str) -> int:
+        return self.windows.get(category, DEFAULT_WINDOW_SECONDS)
+
+    # ------------------------------------------------------------------
+    # Gate
+    # ------------------------------------------------------------------
+
+    def admit(
+        self,
+        user_id: int,
+        device_id: str,
+        category: str,
+        event: Optional[Dict[str, Any]] = None,
+    ) -> bool:
+        """
+        True if this event should be pushed now, False if it was folded
+        into the open window's digest.
+
+        Args:
+            event: Small payload describing the event; the latest one is
+                   kept for rendering the digest (e.g. final ACC state)
+        """
+        window = self.window_for(category)
+        if window <= 0:
+            return True
+
+        now = time.monotonic()
+        key = (user_id, device_id, category)
+        with self._lock:
+            current = self._open.get(key)
+            if current is not None and now < current.expires_at:
+                current.suppressed += 1
+                current.last_event = event or {}
+                self._suppressed += 1
+                return False
+            self._open[key] = _Window(opened_at=now, expires_at=now + window, last_event=event or {})
+            self._sent_immediately += 1
+            return True
+
+    def _take_expired(self) -> List[Tuple[WindowKey, _Window]]:
+        """Pop expired windows; re-open the ones that had a burst."""
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            for key, window in list(self._open.items()):
+                if now < window.expires_at:
+                    continue
+                if window.suppressed:
+                    due.append((key, window))
+                    length = self.window_for(key[2])
+                    self._open[key] = _Window(opened_at=now, expires_at=now + length)
+                else:
+                    del self._open[key]
+        return due
+
+    # ------------------------------------------------------------------
+    # Digests
+    # ------------------------------------------------------------------
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "running": scheduler.is_active("alert_digest_flush"),
+            "windows_seconds": self.windows,
+            "open_windows": len(self._open),
+            "sent_immediately": self._sent_immediately,
+            "suppressed": self._suppressed,
+            "digests_sent": self._digests_sent,
+        }
+
+    def flush_digests(self) -> int:
+        """Send digests for expired windows (the "alert_digest_flush" job)."""
+        due = self._take_expired()
+        if not due:
+            return 0
+
+        from services.notification_service import NotificationService
+
+        db = SessionLocal()
+        sent = 0
+        try:
+            for (user_id, device_id, category), window in due:
+                try:
+                    sent += NotificationService.send_digest(
+                        db,
+                        user_id=user_id,
+                        device_id=device_id,
+                        category=category,
+                        count=window.suppressed,
+                        window_seconds=self.window_for(category),
+                        last_event=window.last_event,
+                    )
+                except Exception as e:
+                    db.rollback()
+                    logger.error(f"❌ Digest failed for user {user_id}, device {device_id}, {category}: {e}")
+        finally:
+            db.close()
+        self._digests_sent += len(due)
+        logger.info(f"🧺 Sent {len(due)} alert digests ({sent} pushes)")
+        return sent
+
+
+alert_aggregator = AlertAggregator()
@@ -1,13 +1,16 @@
 from fastapi import HTTPException, Depends, status
 from sqlalchemy.orm import Session
-from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
 from jose import jwt, JWTError
 from datetime import datetime, timedelta
 from fastapi.security import OAuth2PasswordBearer
-from database import SessionLocal
+from database import open_session, close_session
 from models.user_db import UserDB
 from models.user import UserCreate, UserLogin
 from models.fcm_token_db import UserNotificationSettingsDB
+from services.subscription_graph import subscription_graph
+from services.device_acl import device_acl
+from services.password_hasher import password_hasher, pwd_context
 import os
 import logging
 from dotenv import load_dotenv
@@ -21,9 +24,8 @@ SECRET_KEY = os.getenv("SECRET_KEY", "supersecretkey")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 
-# Password hashing (use pbkdf2_sha256 for broad compatibility on macOS)
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
-
+# Password hashing in the current thread (scripts, one-off tools). Request
+# paths use services.password_hasher, which runs it in a process pool.
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
 
@@ -41,7 +43,7 @@ def create_access_token(data: dict, expires_delta: int = None):
 def create_user(user_data: dict, db: Session = None):
     """Create a new user with invoice number (admin function)"""
     if db is None:
-        db = SessionLocal()
+        db = open_session()
         close_db = True
     else:
         close_db = False
@@ -53,7 +55,7 @@ def create_user(user_data: dict, db: Session = None):
         
         db_user = UserDB(
             invoice_no=user_data["invoice_no"],
-            password_hash=hash_password(user_data["password"]),
+            password_hash=password_hasher.hash_blocking(user_data["password"]),
             name=user_data["name"],
             email=user_data.get("email")
         )
@@ -63,10 +65,65 @@ def create_user(user_data: dict, db: Session = None):
         return {"msg": "User created successfully", "user_id": db_user.id}
     finally:
         if close_db:
-            db.close()
+            close_session(db)
+
+def _check_registration(db: Session, user: UserCreate) -> list:
+    """
+    Reject a registration whose invoice number, email or devices are taken.
+    Returns the de-duplicated device IDs to link.
+    """
+    from models.device_db import DeviceDB
+    
+    # Check if invoice number already exists
+    existing_user = db.query(UserDB).filter(UserDB.invoice_no == user.invoice_no).first()
+    if existing_user:
+        raise HTTPException(status_code=400, detail="Invoice number already exists")
+    
+    # Check if email already exists
+    if user.email:
+        existing_email = db.query(UserDB).filter(UserDB.email == user.email).first()
+        if existing_email:
+            raise HTTPException(status_code=400, detail="Email already exists")
+    
+    # Combine device_id and device_ids into a single list (backward compatible)
+    all_device_ids = []
+    if user.device_ids:
+        all_device_ids.extend([d.strip() for d in user.device_ids if d and d.strip()])
+    elif user.device_id:
+        # Backward compatibility: single device_id
+        all_device_ids.append(user.device_id.strip())
+    
+    # Remove duplicates while preserving order
+    all_device_ids = list(dict.fromkeys(all_device_ids))
+    
+    # Check ALL device IDs before creating user - reject if any is already assigned
+    for device_id in all_device_ids:
+        existing_device = db.query(DeviceDB).filter(DeviceDB.device_id == device_id).first()
+        if existing_device and existing_device.assigned_user_id is not None:
+            raise HTTPException(
+                status_code=400, 
+                detail=f"Device ID '{device_id}' is already registered to another user"
+            )
+    return all_device_ids
+
+def validate_registration(user: UserCreate):
+    """
+    Run the registration checks without creating anything, so /auth/register
+    can reject a duplicate before spending a hasher slot on the password.
+    register_user repeats them inside its own session.
+    """
+    db: Session = open_session()
+    try:
+        _check_registration(db, user)
+    finally:
+        close_session(db)
 
-def register_user(user: UserCreate):
-    """Register a new user with invoice number, device ID(s), name, email, and password"""
+def register_user(user: UserCreate, password_hash: str = None):
+    """
+    Register a new user with invoice number, device ID(s), name, email, and password.
+    The /auth/register endpoint validates first, hashes the password in the
+    hasher pool and passes password_hash in.
+    """
     from models.device_db import DeviceDB
     from models.device_cache_db import DeviceCacheDB
     from adapters import GPSAdapter
@@ -119,45 +176,16 @@ def register_user(user: UserCreate):
         except Exception as e:
             logger.warning(f"⚠️ Could not fetch data for device {device_id}: {e}")
             return False
-    db: Session = SessionLocal()
+    db: Session = open_session()
     
     try:
-        # Check if invoice number already exists
-        existing_user = db.query(UserDB).filter(UserDB.invoice_no == user.invoice_no).first()
-        if existing_user:
-            raise HTTPException(status_code=400, detail="Invoice number already exists")
-        
-        # Check if email already exists
-        if user.email:
-            existing_email = db.query(UserDB).filter(UserDB.email == user.email).first()
-            if existing_email:
-                raise HTTPException(status_code=400, detail="Email already exists")
-        
-        # Combine device_id and device_ids into a single list (backward compatible)
-        all_device_ids = []
-        if user.device_ids:
-            all_device_ids.extend([d.strip() for d in user.device_ids if d and d.strip()])
-        elif user.device_id:
-            # Backward compatibility: single device_id
-            all_device_ids.append(user.device_id.strip())
-        
-        # Remove duplicates while preserving order
-        all_device_ids = list(dict.fromkeys(all_device_ids))
-        
-        # Check ALL device IDs before creating user - reject if any is already assigned
-        for device_id in all_device_ids:
-            existing_device = db.query(DeviceDB).filter(DeviceDB.device_id == device_id).first()
-            if existing_device and existing_device.assigned_user_id is not None:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Device ID '{device_id}' is already registered to another user"
-                )
+        all_device_ids = _check_registration(db, user)
         
         # Create new user (store first device_id for backward compatibility)
         primary_device_id = all_device_ids[0] if all_device_ids else None
         db_user = UserDB(
             invoice_no=user.invoice_no,
-            password_hash=hash_password(user.password),
+            password_hash=password_hash or password_hasher.hash_blocking(user.password),
             name=user.name,
             email=user.email,
             device_id=primary_device_id,
@@ -214,6 +242,7 @@ def register_user(user: UserCreate):
                         )
                         db.add(new_setting)
                         db.commit()
+                        subscription_graph.invalidate_device(device_id)
                         logger.info(f"✅ Created notification settings for user {db_user.id}, device {device_id}")
                 except Exception as ns_error:
                     logger.warning(f"⚠️ Failed to create notification settings: {ns_error}")
@@ -225,6 +254,7 @@ def register_user(user: UserCreate):
                 db.rollback()
             
             devices_status.append(device_result)
+        device_acl.invalidate_user(db_user.id)
         
         # Create access token for immediate login
         token = create_access_token({
@@ -255,83 +285,93 @@ def register_user(user: UserCreate):
         return response
         
     finally:
-        db.close()
+        close_session(db)
 
-def login_user(user: UserLogin):
-    """
-    Unified login for all user types (user, worker, admin).
-    Accepts phone number OR invoice number as identifier.
-    Returns role in response for navigation.
-    """
+def _find_login_user(identifier: str):
     from sqlalchemy import or_
-    
-    db: Session = SessionLocal()
+
+    db: Session = open_session()
     try:
-        identifier = user.invoice_no  # This field now accepts phone or invoice_no
-        
         # Try to find user by invoice_no OR phone
-        db_user = db.query(UserDB).filter(
+        return db.query(UserDB).filter(
             or_(
                 UserDB.invoice_no == identifier,
                 UserDB.phone == identifier
             )
         ).first()
-        
-        if not db_user or not verify_password(user.password, db_user.password_hash):
-            raise HTTPException(status_code=401, detail="Invalid credentials")
-        
-        # Determine role (default to "user" if not set)
-        role = db_user.role or "user"
-        if db_user.is_admin:
-            role = "admin"
-        
-        token = create_access_token({
-            "sub": db_user.invoice_no,
-            "user_id": db_user.id,
+    finally:
+        close_session(db)
+
+async def login_user(user: UserLogin):
+    """
+    Unified login for all user types (user, worker, admin).
+    Accepts phone number OR invoice number as identifier.
+    Returns role in response for navigation.
+    """
+    identifier = user.invoice_no  # This field now accepts phone or invoice_no
+    db_user = await run_in_threadpool(_find_login_user, identifier)
+
+    if not db_user or not await password_hasher.verify(user.password, db_user.password_hash):
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    # Determine role (default to "user" if not set)
+    role = db_user.role or "user"
+    if db_user.is_admin:
+        role = "admin"
+
+    token = create_access_token({
+        "sub": db_user.invoice_no,
+        "user_id": db_user.id,
+        "name": db_user.name,
+        "is_admin": db_user.is_admin,
+        "role": role,
+    })
+    return {
+        "access_token": token, 
+        "token_type": "bearer",
+        "user": {
+            "id": db_user.id,
+            "invoice_no": db_user.invoice_no,
+            "phone": db_user.phone,
             "name": db_user.name,
+            "email": db_user.email,
             "is_admin": db_user.is_admin,
             "role": role,
-        })
-        return {
-            "access_token": token, 
-            "token_type": "bearer",
-            "user": {
-                "id": db_user.id,
-                "invoice_no": db_user.invoice_no,
-                "phone": db_user.phone,
-                "name": db_user.name,
-                "email": db_user.email,
-                "is_admin": db_user.is_admin,
-                "role": role,
-            }
         }
-    finally:
-        db.close()
+    }
 
-def change_password(invoice_no: str, current_password: str, new_password: str, db: Session = None):
-    """Change user password after verifying current password"""
-    if db is None:
-        db = SessionLocal()
-        close_db = True
-    else:
-        close_db = False
-    
+def _get_password_hash(invoice_no: str) -> str:
+    db: Session = open_session()
     try:
-        db_user = db.query(UserDB).filter(UserDB.invoice_no == invoice_no).first()
+        db_user = db.query(UserDB.password_hash).filter(UserDB.invoice_no == invoice_no).first()
         if not db_user:
             raise HTTPException(status_code=404, detail="User not found")
-        
-        # Verify current password
-        if not verify_password(current_password, db_user.password_hash):
-            raise HTTPException(status_code=401, detail="Current password is incorrect")
-        
-        # Update to new password
-        db_user.password_hash = hash_password(new_password)
+        return db_user.password_hash
+    finally:
+        close_session(db)
+
+def _set_password_hash(invoice_no: str, password_hash: str):
+    db: Session = open_session()
+    try:
+        db.query(UserDB).filter(UserDB.invoice_no == invoice_no).update(
+            {UserDB.password_hash: password_hash}, synchronize_session=False
+        )
         db.commit()
-        return {"message": "Password changed successfully"}
     finally:
-        if close_db:
-            db.close()
+        close_session(db)
+
+async def change_password(invoice_no: str, current_password: str, new_password: str):
+    """Change user password after verifying current password"""
+    current_hash = await run_in_threadpool(_get_password_hash, invoice_no)
+
+    # Verify current password
+    if not await password_hasher.verify(current_password, current_hash):
+        raise HTTPException(status_code=401, detail="Current password is incorrect")
+
+    # Update to new password
+    new_hash = await password_hasher.hash(new_password)
+    await run_in_threadpool(_set_password_hash, invoice_no, new_hash)
+    return {"message": "Password changed successfully"}
 
 # 🔒 Dependency for protected routes
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
@@ -370,7 +410,7 @@ def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
 def get_user_devices(user_id: int, is_admin: bool = False, db: Session = None) -> list:
     """Get devices assigned to a user. If admin, return all devices."""
     if db is None:
-        db = SessionLocal()
+        db = open_session()
         close_db = True
     else:
         close_db = False
@@ -388,7 +428,7 @@ def get_user_devices(user_id: int, is_admin: bool = False, db: Session = None) -
         return devices
     finally:
         if close_db:
-            db.close()
+            close_session(db)
 
 def delete_user_account(user_id: int, db: Session = None):
     """
@@ -396,7 +436,7 @@ def delete_user_account(user_id: int, db: Session = None):
     This permanently removes the user from the database.
     """
     if db is None:
-        db = SessionLocal()
+        db = open_session()
         close_db = True
     else:
         close_db = False
@@ -452,6 +492,8 @@ def delete_user_account(user_id: int, db: Session = None):
         # Delete user
         db.delete(db_user)
         db.commit()
+        subscription_graph.invalidate_user(user_id)
+        device_acl.invalidate_user(user_id)
         
         logger.info(f"Account deleted for user_id={user_id}")
         return {"message": "Account deleted successfully"}
@@ -463,7 +505,7 @@ def delete_user_account(user_id: int, db: Session = None):
         raise HTTPException(status_code=500, detail=f"Error deleting account: {str(e)}")
     finally:
         if close_db:
-            db.close()
+            close_session(db)
 
 def request_password_reset(email: str):
     """
@@ -483,7 +525,7 @@ def request_password_reset(email: str):
     # Ensure environment variables are loaded
     load_dotenv()
     
-    db: Session = SessionLocal()
+    db: Session = open_session()
     try:
         # Find user by email
         db_user = db.query(UserDB).filter(UserDB.email == email).first()
@@ -495,7 +537,7 @@ def request_password_reset(email: str):
         temp_password = ''.join(secrets.choice(string.ascii_letters + string.digits) for _ in range(12))
         
         # Update user's password
-        db_user.password_hash = hash_password(temp_password)
+        db_user.password_hash = password_hasher.hash_blocking(temp_password)
         db.commit()
         
         # Send email using Resend
@@ -543,4 +585,4 @@ def request_password_reset(email: str):
         
         return {"message": "If the email exists, a password reset link has been sent."}
     finally:
-        db.close()
+        close_session(db)
@@ -0,0 +1,109 @@
+"""
+Cache Generation - Shared invalidation stamp for per-process caches
+
+The device ACL and subscription graph live in each worker's memory, and
+an invalidation only reached the process that made the write. Other
+workers kept serving revoked access or pushing to removed tokens until
+their TTL ran out.
+
+Each cache now has a row in cache_generations:
+
+  - bump(): every local invalidation also increments the shared counter
+  - changed(): on lookup, the cache asks whether the counter moved since it
+    last looked, and drops everything if so. The row is read at most once
+    per CHECK_SECONDS per process, so a hit stays a memory lookup and a
+    write on any worker reaches all of them within CHECK_SECONDS.
+
+If the DB is unreachable, the cache keeps its last known generation and
+falls back to its own TTL.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy import update
+
+from database import SessionLocal
+from models.cache_generation_db import CacheGenerationDB
+from utils.db_upsert import upsert_rows
+
+logger = logging.getLogger(__name__)
+
+
+class SharedGeneration:
+    """Invalidation counter for one cache, shared through the database"""
+
+    CHECK_SECONDS = 2.0
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._seen: Optional[int] = None
+        self._checked_at = 0.0
+        self._checks = 0
+        self._bumps = 0
+        self._errors = 0
+
+    def bump(self):
+        """Tell every process that cached entries may be stale."""
+        db = SessionLocal()
+        try:
+            upsert_rows(db, CacheGenerationDB, [{"name": self.name, "generation": 0}],
+                        conflict_columns=["name"], update_columns=[])
+            db.execute(
+                update(CacheGenerationDB)
+                .where(CacheGenerationDB.name == self.name)
+                .values(generation=CacheGenerationDB.generation + 1)
+            )
+            db.commit()
+            self._bumps += 1
+        except Exception as e:
+            db.rollback()
+            self._errors += 1
+            logger.warning(f"Cache generation bump failed for {self.name}: {e}")
+        finally:
+            db.close()
+
+    def changed(self) -> bool:
+        """
+        True if another process (or this one) invalidated since the last
+        call that returned, i.e. the caller should drop its entries.
+        """
+        now = time.monotonic()
+        if now - self._checked_at < self.CHECK_SECONDS:
+            return False
+        with self._lock:
+            if now - self._checked_at < self.CHECK_SECONDS:
+                return False
+            self._checked_at = now
+            current = self._read()
+            if current is None:
+                return False
+            changed = self._seen is not None and current != self._seen
+            self._seen = current
+            return changed
+
+    def _read(self) -> Optional[int]:
+        db = SessionLocal()
+        try:
+            self._checks += 1
+            value = db.query(CacheGenerationDB.generation).filter(
+                CacheGenerationDB.name == self.name
+            ).scalar()
+            return value or 0
+        except Exception as e:
+            self._errors += 1
+            logger.debug(f"Cache generation read failed for {self.name}: {e}")
+            return None
+        finally:
+            db.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "generation": self._seen,
+            "checks": self._checks,
+            "bumps": self._bumps,
+            "errors": self._errors,
+        }
@@ -0,0 +1,140 @@
+"""
+Device ACL - Cached "which devices may this user access"
+
+Every device-scoped endpoint (gps, media, alarms, reports, tasks) checks
+access before doing work. The check used to load the user's full DeviceDB
+rows (every device for admins) in a fresh session per request. Now:
+
+  - Admins are allowed without a lookup
+  - Other users' device_ids are cached as a frozenset per user_id, so a
+    check is one set membership test
+
+Writers invalidate it:
+  - invalidate_user(): device added to / removed from / transferred
+    between accounts, registration, account deletion
+  - invalidate_device(): device deleted
+  - clear(): bulk reassignments
+
+Invalidations are also published through services/cache_generation, so
+a device transferred or removed on another worker or replica empties this
+process' ACL within SharedGeneration.CHECK_SECONDS; the previous owner
+loses access across the deployment, not just on the worker that made the
+change. Entries still expire after TTL_SECONDS in case the stamp can't be
+read. A denial served from an entry older than RECHECK_SECONDS reloads
+once first, so a device just added through another process isn't refused.
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict, FrozenSet, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from database import open_session, close_session
+from models.device_db import DeviceDB
+from services.cache_generation import SharedGeneration
+
+logger = logging.getLogger(__name__)
+
+
+class DeviceACL:
+    """Per-user device_id sets with explicit invalidation"""
+
+    TTL_SECONDS = 120
+    RECHECK_SECONDS = 5
+
+    def __init__(self):
+        self._users: Dict[int, Tuple[float, FrozenSet[str]]] = {}
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so a load that raced a write isn't cached
+        self._generation = 0
+        self._shared = SharedGeneration("device_acl")
+        self._hits = 0
+        self._misses = 0
+        logger.info("🔐 Device ACL initialized")
+
+    def device_ids(self, user_id: int, db: Optional[Session] = None) -> FrozenSet[str]:
+        """Device IDs assigned to a (non-admin) user."""
+        if self._shared.changed():
+            self._drop_all()
+        entry = self._users.get(user_id)
+        if entry is not None and time.monotonic() - entry[0] < self.TTL_SECONDS:
+            self._hits += 1
+            return entry[1]
+        return self._load(user_id, db)
+
+    def _load(self, user_id: int, db: Optional[Session] = None) -> FrozenSet[str]:
+        self._misses += 1
+        generation = self._generation
+        close_db = db is None
+        if close_db:
+            db = open_session()
+        try:
+            ids = frozenset(
+                row.device_id for row in
+                db.query(DeviceDB.device_id).filter(DeviceDB.assigned_user_id == user_id)
+            )
+        finally:
+            if close_db:
+                close_session(db)
+        with self._lock:
+            if generation == self._generation:
+                self._users[user_id] = (time.monotonic(), ids)
+        return ids
+
+    def can_access(self, current_user: dict, device_id: str) -> bool:
+        if current_user.get("is_admin", False):
+            return True
+        user_id = current_user["user_id"]
+        if device_id in self.device_ids(user_id):
+            return True
+        entry = self._users.get(user_id)
+        if entry is not None and time.monotonic() - entry[0] >= self.RECHECK_SECONDS:
+            return device_id in self._load(user_id)
+        return False
+
+    # ------------------------------------------------------------------
+    # Invalidation
+    # ------------------------------------------------------------------
+
+    def invalidate_user(self, *user_ids: Optional[int]):
+        with self._lock:
+            self._generation += 1
+            for user_id in user_ids:
+                if user_id is not None:
+                    self._users.pop(user_id, None)
+        self._shared.bump()
+
+    def invalidate_device(self, device_id: str):
+        with self._lock:
+            self._generation += 1
+            for user_id in [u for u, (_, ids) in self._users.items() if device_id in ids]:
+                del self._users[user_id]
+        self._shared.bump()
+
+    def clear(self):
+        self._drop_all()
+        self._shared.bump()
+
+    def _drop_all(self):
+        with self._lock:
+            self._generation += 1
+            self._users.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self._hits + self._misses
+        return {
+            "users_cached": len(self._users),
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate_percent": round(self._hits / total * 100, 1) if total else 0,
+            "shared_generation": self._shared.get_stats(),
+        }
+
+
+device_acl = DeviceACL()
+
+
+def verify_device_access(device_id: str, current_user: dict) -> bool:
+    """Verify that the current user has access to the specified device"""
+    return device_acl.can_access(current_user, device_id)
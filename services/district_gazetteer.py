@@ -0,0 +1,199 @@
+"""
+District Gazetteer - In-memory forward geocoding of district names
+
+Rekaz webhooks and manual orders carry a district name ("حي الملقا") and a
+city, and need a point on the map. Instead of a Nominatim round-trip per
+order, district centroids are indexed by normalized Arabic name:
+
+  - Centroids are derived from the district polygons in the offline
+    gazetteer (scripts/import_osm_gazetteer.py), with the owning city taken
+    from the city polygon that contains the centroid
+  - An optional curated file (DISTRICT_GAZETTEER_PATH) adds or overrides
+    entries and aliases:  {"districts": [{"name", "city", "lat", "lng", "aliases"}]}
+  - Names are matched exactly on their normalized form first, then fuzzily
+    (difflib) within the same city
+
+Lookups that miss return None so callers can fall back to the network.
+Network results can be fed back with remember() so the next order for the
+same district is answered locally.
+"""
+import difflib
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from services.offline_geocoder import get_offline_geocoder
+from utils.arabic import normalize_arabic, normalize_place_name
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DISTRICTS_PATH = "data/gazetteer/districts.json"
+
+FUZZY_CUTOFF = 0.8
+
+LatLng = Tuple[float, float]
+
+
+def _polygon_centroid(ring) -> Optional[LatLng]:
+    """Area-weighted centroid of a [(lng, lat), ...] ring, as (lat, lng)."""
+    area2 = cx = cy = 0.0
+    j = len(ring) - 1
+    for i in range(len(ring)):
+        x0, y0 = ring[j]
+        x1, y1 = ring[i]
+        cross = x0 * y1 - x1 * y0
+        area2 += cross
+        cx += (x0 + x1) * cross
+        cy += (y0 + y1) * cross
+        j = i
+    if area2 == 0:
+        if not ring:
+            return None
+        # Degenerate ring: fall back to the vertex mean
+        return (sum(p[1] for p in ring) / len(ring), sum(p[0] for p in ring) / len(ring))
+    return cy / (3 * area2), cx / (3 * area2)
+
+
+class DistrictGazetteer:
+    """Normalized-name index of district centroids, grouped by city"""
+
+    def __init__(self, fuzzy_cutoff: float = FUZZY_CUTOFF):
+        self.fuzzy_cutoff = fuzzy_cutoff
+        # city key -> district key -> (lat, lng)
+        self._by_city: Dict[str, Dict[str, LatLng]] = {}
+        # district key -> [(city key, (lat, lng))]
+        self._by_name: Dict[str, List[Tuple[str, LatLng]]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(len(d) for d in self._by_city.values())
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+
+    def add(self, name: str, city: Optional[str], latitude: float, longitude: float):
+        district_key = normalize_place_name(name)
+        if not district_key:
+            return
+        city_key = normalize_arabic(city or "")
+        point = (latitude, longitude)
+        with self._lock:
+            self._by_city.setdefault(city_key, {})[district_key] = point
+            entries = [e for e in self._by_name.get(district_key, []) if e[0] != city_key]
+            entries.append((city_key, point))
+            self._by_name[district_key] = entries
+
+    def load_offline_gazetteer(self, geocoder) -> int:
+        """Index the centroid of every district polygon in an OfflineGeocoder."""
+        count = 0
+        for name, polygons in geocoder.iter_areas("district"):
+            # Largest outer ring wins for multipolygons
+            outer = max((poly[0] for poly in polygons), key=len)
+            centroid = _polygon_centroid(outer)
+            if centroid is None:
+                continue
+            city = geocoder.city_at(*centroid)
+            self.add(name, city, *centroid)
+            count += 1
+        return count
+
+    def load_dict(self, data: Dict) -> int:
+        count = 0
+        for item in data.get("districts", []):
+            try:
+                lat, lng = float(item["lat"]), float(item["lng"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            city = item.get("city")
+            for name in [item.get("name")] + list(item.get("aliases") or []):
+                if name:
+                    self.add(name, city, lat, lng)
+                    count += 1
+        return count
+
+    def load_file(self, path: str) -> int:
+        with open(path, "r", encoding="utf-8") as f:
+            return self.load_dict(json.load(f))
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def remember(self, district: str, city: Optional[str], latitude: float, longitude: float):
+        """Keep a network-resolved district so later orders resolve locally."""
+        self.add(district, city, latitude, longitude)
+
+    def forward(self, district: str, city: Optional[str] = None) -> Optional[LatLng]:
+        """
+        (lat, lng) for a district name, or None if it isn't known.
+
+        With a city, only districts of that city are considered (a
+        "النسيم" exists in several cities), then districts imported without
+        a city. Without one, a name is only resolved when it is unambiguous.
+        """
+        district_key = normalize_place_name(district)
+        if not district_key:
+            return None
+        city_key = normalize_arabic(city or "")
+
+        if city_key:
+            point = self._match(self._by_city.get(city_key), district_key)
+            if point is None:
+                point = self._match(self._by_city.get(""), district_key)
+            return point
+
+        entries = self._by_name.get(district_key)
+        if entries is None:
+            match = difflib.get_close_matches(district_key, list(self._by_name), n=1, cutoff=self.fuzzy_cutoff)
+            entries = self._by_name[match[0]] if match else None
+        if entries and len(entries) == 1:
+            return entries[0][1]
+        return None
+
+    def _match(self, districts: Optional[Dict[str, LatLng]], district_key: str) -> Optional[LatLng]:
+        """Exact, then fuzzy, match of a district key within one city bucket."""
+        if not districts:
+            return None
+        point = districts.get(district_key)
+        if point is not None:
+            return point
+        match = difflib.get_close_matches(district_key, list(districts), n=1, cutoff=self.fuzzy_cutoff)
+        return districts[match[0]] if match else None
+
+    def city_at(self, latitude: float, longitude: float) -> Optional[str]:
+        """City name for a point from the offline gazetteer's city polygons."""
+        geocoder = get_offline_geocoder()
+        return geocoder.city_at(latitude, longitude) if geocoder else None
+
+
+_district_gazetteer: Optional[DistrictGazetteer] = None
+_district_lock = threading.Lock()
+
+
+def get_district_gazetteer() -> DistrictGazetteer:
+    """Process-wide district index, built on first use."""
+    global _district_gazetteer
+    if _district_gazetteer is not None:
+        return _district_gazetteer
+    with _district_lock:
+        if _district_gazetteer is None:
+            gazetteer = DistrictGazetteer()
+            derived = curated = 0
+            geocoder = get_offline_geocoder()
+            if geocoder is not None:
+                derived = gazetteer.load_offline_gazetteer(geocoder)
+            path = os.getenv("DISTRICT_GAZETTEER_PATH", DEFAULT_DISTRICTS_PATH)
+            if os.path.exists(path):
+                try:
+                    curated = gazetteer.load_file(path)
+                except Exception as e:
+                    logger.error(f"❌ Failed to load district gazetteer {path}: {e}")
+            logger.info(
+                f"🏘️ District gazetteer ready: {len(gazetteer)} districts "
+                f"({derived} from polygons, {curated} curated names)"
+            )
+            _district_gazetteer = gazetteer
+    return _district_gazetteer
@@ -0,0 +1,220 @@
+"""
+Endpoint Registry - Compiled view of config/manufacturer_api.yaml
+
+The YAML contract is parsed once per process into immutable EndpointSpec
+objects. Each spec carries everything a vendor call needs (path, method,
+timeouts, request defaults/required fields) plus precompiled getters for
+the response paths (e.g. "data.list", "data.gpsInfo"), so the hot path
+never walks the raw config dicts or re-reads the environment.
+
+Shared by ManufacturerAPIService (request side) and BaseAdapter
+(response side).
+"""
+import os
+import logging
+import threading
+from dataclasses import dataclass, field
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Optional, Dict, Any, Callable, Tuple, Mapping
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG_PATH = "config/manufacturer_api.yaml"
+DEFAULT_SUCCESS_CODES: Tuple[int, ...] = (200, 0)
+DEFAULT_TOKEN_PATHS: Tuple[str, ...] = ("data.token", "token", "data.accessToken", "accessToken")
+
+PathGetter = Callable[[Any], Any]
+
+
+@lru_cache(maxsize=256)
+def compile_path(path: str) -> PathGetter:
+    """
+    Compile a dot-notation path into a getter function.
+
+    Semantics match BaseAdapter.extract_nested_value: dict segments are
+    looked up by key, list segments by integer index, and any miss (or a
+    None along the way) yields None.
+    """
+    steps = tuple(
+        (part, int(part) if part.lstrip("-").isdigit() else None)
+        for part in path.split(".")
+    )
+
+    def getter(data: Any) -> Any:
+        value = data
+        for key, index in steps:
+            if isinstance(value, dict):
+                value = value.get(key)
+            elif isinstance(value, list):
+                if index is None:
+                    return None
+                try:
+                    value = value[index]
+                except IndexError:
+                    return None
+            else:
+                return None
+            if value is None:
+                return None
+        return value
+
+    getter.__name__ = f"get_{path.replace('.', '_')}"
+    return getter
+
+
+@dataclass(frozen=True)
+class EndpointSpec:
+    """Immutable, precompiled configuration for a single vendor endpoint"""
+
+    name: str
+    path: str
+    method: str
+    timeout: float
+    retries: int
+    retry_delay: float
+    required: Tuple[str, ...] = ()
+    defaults: Mapping[str, Any] = field(default_factory=lambda: MappingProxyType({}))
+    data_path: Optional[str] = None
+    total_path: Optional[str] = None
+    success_codes: Optional[Tuple[int, ...]] = None
+    token_paths: Tuple[str, ...] = DEFAULT_TOKEN_PATHS
+    raw: Mapping[str, Any] = field(default_factory=lambda: MappingProxyType({}), repr=False)
+    data_getter: Optional[PathGetter] = field(default=None, repr=False, compare=False)
+    token_getters: Tuple[PathGetter, ...] = field(default=(), repr=False, compare=False)
+
+    def build_request(self, data: Optional[Dict] = None) -> Dict[str, Any]:
+        """Apply defaults and validate required fields (replaces _build_request_data)"""
+        if self.defaults:
+            request_data = dict(self.defaults)
+            if data:
+                request_data.update(data)
+        else:
+            request_data = dict(data) if data else {}
+
+        if self.required:
+            missing = [f for f in self.required if f not in request_data]
+            if missing:
+                raise ValueError(f"Missing required fields for endpoint '{self.name}': {missing}")
+
+        return request_data
+
+    def extract_data(self, response: Any, default_path: Optional[str] = None) -> Any:
+        """Extract the payload from a vendor response using the configured data_path"""
+        if self.data_getter is not None:
+            return self.data_getter(response)
+        if default_path:
+            return compile_path(default_path)(response)
+        return response.get("data") if isinstance(response, dict) else None
+
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class EndpointRegistry:
+    """All endpoints of one profile, compiled from the YAML contract"""
+
+    def __init__(self, config: Dict[str, Any], profile: str):
+        if not config or "profiles" not in config:
+            raise ValueError("Manufacturer API config has no 'profiles' section")
+        if profile not in config["profiles"]:
+            raise ValueError(f"Profile '{profile}' not found in manufacturer API config")
+
+        profile_config = config["profiles"][profile] or {}
+        self.profile = profile
+        self.profile_config: Mapping[str, Any] = _freeze(profile_config)
+
+        self.base_url_env = profile_config.get("base_url_env", "MANUFACTURER_API_BASE_URL")
+        self.base_url = profile_config.get("base_url", "https://34.166.228.100:9367")
+        self.default_timeout = profile_config.get("default_timeout", 30)
+        self.default_retries = profile_config.get("default_retries", 3)
+        self.default_retry_delay = profile_config.get("default_retry_delay", 1)
+        self.rate_limit_per_minute = profile_config.get("rate_limit_per_minute", 0)
+
+        self._endpoints: Dict[str, EndpointSpec] = {
+            name: self._compile_endpoint(name, ep_config or {})
+            for name, ep_config in (profile_config.get("endpoints") or {}).items()
+        }
+
+    def _compile_endpoint(self, name: str, ep: Dict[str, Any]) -> EndpointSpec:
+        request_config = ep.get("request") or {}
+        response_config = ep.get("response") or {}
+        success_codes = response_config.get("success_codes")
+        data_path = response_config.get("data_path")
+        token_paths = tuple(response_config.get("token_paths") or DEFAULT_TOKEN_PATHS)
+
+        return EndpointSpec(
+            name=name,
+            path=ep["path"],
+            method=str(ep.get("method", "POST")).upper(),
+            timeout=ep.get("timeout", self.default_timeout),
+            retries=ep.get("retries", self.default_retries),
+            retry_delay=ep.get("retry_delay", self.default_retry_delay),
+            required=tuple(request_config.get("required") or ()),
+            defaults=MappingProxyType(dict(request_config.get("defaults") or {})),
+            data_path=data_path,
+            total_path=response_config.get("total_path"),
+            success_codes=tuple(success_codes) if success_codes is not None else None,
+            token_paths=token_paths,
+            raw=_freeze(ep),
+            data_getter=compile_path(data_path) if data_path else None,
+            token_getters=tuple(compile_path(p) for p in token_paths),
+        )
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._endpoints
+
+    def __len__(self) -> int:
+        return len(self._endpoints)
+
+    def get(self, name: str) -> Optional[EndpointSpec]:
+        return self._endpoints.get(name)
+
+    def require(self, name: str) -> EndpointSpec:
+        spec = self._endpoints.get(name)
+        if spec is None:
+            raise ValueError(f"Endpoint '{name}' not found in config for profile '{self.profile}'")
+        return spec
+
+    @classmethod
+    def from_file(cls, config_path: str, profile: str) -> "EndpointRegistry":
+        try:
+            with open(config_path, 'r') as f:
+                config = yaml.safe_load(f)
+        except FileNotFoundError:
+            logger.error(f"❌ Manufacturer API config file not found at {config_path}")
+            raise
+        except yaml.YAMLError as e:
+            logger.error(f"❌ Error parsing YAML config file {config_path}: {e}")
+            raise
+        return cls(config, profile)
+
+
+_registry: Optional[EndpointRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_endpoint_registry() -> EndpointRegistry:
+    """
+    Return the process-wide registry, compiling it on first use.
+
+    Config path and profile come from MANUFACTURER_API_CONFIG and
+    MANUFACTURER_API_PROFILE and are resolved exactly once.
+    """
+    global _registry
+    if _registry is not None:
+        return _registry
+    with _registry_lock:
+        if _registry is None:
+            config_path = os.getenv("MANUFACTURER_API_CONFIG", DEFAULT_CONFIG_PATH)
+            profile = os.getenv("MANUFACTURER_API_PROFILE", "default")
+            _registry = EndpointRegistry.from_file(config_path, profile)
+            logger.info(f"🔧 Endpoint registry compiled: {len(_registry)} endpoints (profile: {profile})")
+    return _registry
@@ -3,14 +3,34 @@ Geocoding Service - Convert GPS coordinates to human-readable Arabic addresses
 
 Uses Google Maps Geocoding API for accurate Saudi/Arabic addresses.
 Falls back to OpenStreetMap Nominatim if Google is unavailable.
-Aggressive caching with coordinate rounding for high hit rates.
+Aggressive caching with coordinate rounding for high hit rates:
+  L1 — in-process LRU (per worker)
+  L2 — geocode_cache table (shared by all workers, survives deploys);
+       writes are buffered and flushed in batches.
+Both tiers also answer spatial-neighbourhood lookups: a cached address
+within GEOCODE_NEIGHBOUR_RADIUS_M is reused even across cell boundaries,
+as long as it is younger than GEOCODE_MAX_AGE_DAYS.
+
+An offline gazetteer (services/offline_geocoder.py) can be used as the
+primary provider or as a fallback when the network providers fail
+(GEOCODE_OFFLINE_MODE=primary|fallback|off).
 """
 import requests
 import logging
+import math
 import os
 import threading
+import time
 from collections import OrderedDict
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional, Dict, List, Tuple
+
+from database import SessionLocal
+from models.geocode_cache_db import GeocodeCacheDB
+from utils.db_upsert import upsert_rows
+from utils.geo import SpatialGrid, bounding_box, haversine_m
+from services.offline_geocoder import get_offline_geocoder, is_offline_geocoder_loaded
 
 logger = logging.getLogger(__name__)
 
@@ -19,42 +39,332 @@ class GeocodingService:
     GOOGLE_GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
     NOMINATIM_URL = "https://nominatim.openstreetmap.org/reverse"
 
+    # cell_key -> (address, lat, lng, stored_at epoch seconds)
     _cache: OrderedDict = OrderedDict()
     _cache_max_size = 10000
     _lock = threading.Lock()
 
+    # Spatial-neighbourhood lookup over L1 (guarded by _lock)
+    _spatial = SpatialGrid(cell_deg=0.001)
+    _neighbour_radius_m = float(os.getenv("GEOCODE_NEIGHBOUR_RADIUS_M", "75"))
+    _max_age_seconds = float(os.getenv("GEOCODE_MAX_AGE_DAYS", "90")) * 86400
+
+    # Persistent L2 tier (geocode_cache table)
+    _persistent_enabled = os.getenv("GEOCODE_PERSISTENT_CACHE", "true").lower() != "false"
+    _pending_writes: Dict[str, Tuple[str, float, float]] = {}
+    _write_batch_size = 50
+    _flush_interval = 5.0
+    _flush_timer: Optional[threading.Timer] = None
+    _stats: Dict[str, int] = {
+        "l1_hits": 0, "l1_neighbour_hits": 0, "l1_misses": 0,
+        "l2_hits": 0, "l2_neighbour_hits": 0, "l2_misses": 0, "l2_errors": 0,
+        "l2_writes": 0, "l2_write_errors": 0,
+        "provider_calls": 0, "provider_failures": 0,
+        "offline_hits": 0, "offline_misses": 0,
+    }
+
+    # Offline gazetteer provider: "primary", "fallback" or "off"
+    _offline_mode = os.getenv("GEOCODE_OFFLINE_MODE", "fallback").lower()
+    # How long a fallback answer is served before the provider is asked again
+    _offline_fallback_ttl_seconds = float(os.getenv("GEOCODE_OFFLINE_FALLBACK_TTL_S", "300"))
+
     # Nominatim rate limiting (fallback only)
     _last_nominatim_time = 0.0
     _nominatim_interval = 1.1
+    _nominatim_max_wait = 0.8
+
+    # Provider HTTP timeouts; one uncached cell costs at most
+    # Google timeout + Nominatim wait + Nominatim timeout
+    _google_timeout = 3
+    _nominatim_timeout = 2
+    WORST_CASE_LOOKUP_SECONDS = _google_timeout + _nominatim_max_wait + _nominatim_timeout
 
     @classmethod
     def _get_google_key(cls) -> Optional[str]:
         return os.getenv("GOOGLE_MAPS_API_KEY")
 
+    @staticmethod
+    def _cell_key(latitude: float, longitude: float) -> str:
+        return f"{round(latitude, 3)},{round(longitude, 3)}"
+
+    @classmethod
+    def _count(cls, stat: str):
+        with cls._lock:
+            cls._stats[stat] += 1
+
     @classmethod
     def reverse_geocode(cls, latitude: float, longitude: float) -> Optional[str]:
         """Convert coordinates to a human-readable Arabic address."""
-        cache_key = f"{round(latitude, 3)},{round(longitude, 3)}"
+        cache_key = cls._cell_key(latitude, longitude)
+        now = time.time()
 
         with cls._lock:
-            if cache_key in cls._cache:
+            entry = cls._cache.get(cache_key)
+            if entry is not None and now - entry[3] <= cls._max_age_seconds:
                 cls._cache.move_to_end(cache_key)
-                return cls._cache[cache_key]
+                cls._stats["l1_hits"] += 1
+                return entry[0]
+
+            neighbour = cls._l1_neighbour(latitude, longitude, now)
+            if neighbour is not None:
+                cls._cache.move_to_end(neighbour)
+                cls._stats["l1_neighbour_hits"] += 1
+                return cls._cache[neighbour][0]
+            cls._stats["l1_misses"] += 1
+
+        found = cls._l2_get(cache_key, latitude, longitude)
+        if found:
+            address, lat, lng, stored_at = found
+            cls._add_to_cache(cache_key, address, lat, lng, stored_at)
+            return address
+
+        if cls._offline_mode == "primary":
+            address = cls._offline_geocode(latitude, longitude)
+            if address:
+                cls._add_to_cache(cache_key, address, latitude, longitude)
+                return address
+
+        address = cls._provider_geocode(latitude, longitude)
+        if address:
+            cls._add_to_cache(cache_key, address, latitude, longitude)
+            cls._enqueue_l2_write(cache_key, address, latitude, longitude)
+            return address
+
+        if cls._offline_mode == "fallback":
+            # Not persisted to L2, and stamped so it ages out of L1 after
+            # _offline_fallback_ttl_seconds, so a later network answer replaces it
+            address = cls._offline_geocode(latitude, longitude)
+            if address:
+                stored_at = time.time() - cls._max_age_seconds + cls._offline_fallback_ttl_seconds
+                cls._add_to_cache(cache_key, address, latitude, longitude, stored_at)
+                return address
+
+        return None
+
+    @classmethod
+    def _offline_geocode(cls, latitude: float, longitude: float) -> Optional[str]:
+        """Resolve from the local gazetteer (no network)."""
+        geocoder = get_offline_geocoder()
+        if geocoder is None:
+            return None
+        try:
+            address = geocoder.reverse(latitude, longitude)
+        except Exception as e:
+            logger.error(f"Offline geocoding error: {e}")
+            address = None
+        cls._count("offline_hits" if address else "offline_misses")
+        return address
+
+    @classmethod
+    def _l1_neighbour(cls, latitude: float, longitude: float, now: float) -> Optional[str]:
+        """Nearest fresh L1 key within the neighbour radius (caller holds _lock)."""
+        if cls._neighbour_radius_m <= 0:
+            return None
+        match = cls._spatial.nearest(
+            latitude, longitude, cls._neighbour_radius_m,
+            accept=lambda key: now - cls._cache[key][3] <= cls._max_age_seconds,
+        )
+        return match[0] if match else None
+
+    @classmethod
+    def _provider_geocode(cls, latitude: float, longitude: float) -> Optional[str]:
+        """Resolve through the network providers (Google, then Nominatim)."""
+        cls._count("provider_calls")
 
         google_key = cls._get_google_key()
         if google_key:
             address = cls._google_geocode(latitude, longitude, google_key)
             if address:
-                cls._add_to_cache(cache_key, address)
                 return address
 
         address = cls._nominatim_geocode(latitude, longitude)
         if address:
-            cls._add_to_cache(cache_key, address)
             return address
 
+        cls._count("provider_failures")
         return None
 
+    # ------------------------------------------------------------------
+    # L2: persistent cache
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def _l2_get(
+        cls, cache_key: str, latitude: float, longitude: float
+    ) -> Optional[Tuple[str, float, float, float]]:
+        """
+        Exact-cell or nearest-neighbour lookup in the persistent cache.
+
+        Returns:
+            (address, lat, lng, stored_at) or None
+        """
+        if not cls._persistent_enabled:
+            return None
+
+        with cls._lock:
+            pending = cls._pending_writes.get(cache_key)
+        if pending:
+            return pending[0], pending[1], pending[2], time.time()
+
+        cutoff = datetime.utcnow() - timedelta(seconds=cls._max_age_seconds)
+        columns = (
+            GeocodeCacheDB.cell_key, GeocodeCacheDB.address,
+            GeocodeCacheDB.latitude, GeocodeCacheDB.longitude,
+            GeocodeCacheDB.updated_at,
+        )
+
+        db = SessionLocal()
+        try:
+            # Exact cell first (primary key lookup)
+            best = db.query(*columns).filter(
+                GeocodeCacheDB.cell_key == cache_key,
+                GeocodeCacheDB.updated_at >= cutoff,
+            ).first()
+            exact = best is not None
+            if best is None and cls._neighbour_radius_m > 0:
+                # Nearest fresh row in the bounding box; longitude is scaled
+                # so the squared-degree distance ranks like ground distance
+                min_lat, max_lat, min_lng, max_lng = bounding_box(
+                    latitude, longitude, cls._neighbour_radius_m
+                )
+                lng_scale = math.cos(math.radians(latitude))
+                d_lat = GeocodeCacheDB.latitude - latitude
+                d_lng = (GeocodeCacheDB.longitude - longitude) * lng_scale
+                best = db.query(*columns).filter(
+                    GeocodeCacheDB.latitude.between(min_lat, max_lat),
+                    GeocodeCacheDB.longitude.between(min_lng, max_lng),
+                    GeocodeCacheDB.updated_at >= cutoff,
+                ).order_by(d_lat * d_lat + d_lng * d_lng).limit(1).first()
+                if best is not None and haversine_m(
+                    latitude, longitude, best.latitude, best.longitude
+                ) > cls._neighbour_radius_m:
+                    best = None
+        except Exception as e:
+            logger.debug(f"Geocode L2 lookup failed for {cache_key}: {e}")
+            cls._count("l2_errors")
+            return None
+        finally:
+            db.close()
+
+        if best is None:
+            cls._count("l2_misses")
+            return None
+
+        cls._count("l2_hits" if exact else "l2_neighbour_hits")
+        age = (datetime.utcnow() - best.updated_at).total_seconds() if best.updated_at else 0
+        return (
+            best.address,
+            best.latitude if best.latitude is not None else latitude,
+            best.longitude if best.longitude is not None else longitude,
+            time.time() - age,
+        )
+
+    @classmethod
+    def _enqueue_l2_write(cls, cache_key: str, address: str, latitude: float, longitude: float):
+        if not cls._persistent_enabled:
+            return
+
+        with cls._lock:
+            cls._pending_writes[cache_key] = (address, latitude, longitude)
+            flush_now = len(cls._pending_writes) >= cls._write_batch_size
+            if not flush_now and cls._flush_timer is None:
+                cls._flush_timer = threading.Timer(cls._flush_interval, cls.flush_pending)
+                cls._flush_timer.daemon = True
+                cls._flush_timer.start()
+
+        if flush_now:
+            cls.flush_pending()
+
+    @classmethod
+    def flush_pending(cls) -> int:
+        """Write buffered addresses to the persistent cache in one statement."""
+        with cls._lock:
+            batch = cls._pending_writes
+            cls._pending_writes = {}
+            if cls._flush_timer is not None:
+                cls._flush_timer.cancel()
+                cls._flush_timer = None
+
+        if not batch:
+            return 0
+
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            upsert_rows(
+                db,
+                GeocodeCacheDB,
+                [
+                    {
+                        "cell_key": key,
+                        "address": address,
+                        "latitude": lat,
+                        "longitude": lng,
+                        "created_at": now,
+                        "updated_at": now,
+                    }
+                    for key, (address, lat, lng) in batch.items()
+                ],
+                conflict_columns=["cell_key"],
+                update_columns=["address", "latitude", "longitude", "updated_at"],
+            )
+            db.commit()
+            with cls._lock:
+                cls._stats["l2_writes"] += len(batch)
+            return len(batch)
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"Geocode L2 flush of {len(batch)} entries failed: {e}")
+            with cls._lock:
+                cls._stats["l2_write_errors"] += len(batch)
+            return 0
+        finally:
+            db.close()
+
+    @classmethod
+    def get_cache_stats(cls) -> Dict[str, object]:
+        """Hit/miss counters per cache tier."""
+        with cls._lock:
+            stats = dict(cls._stats)
+            l1_size = len(cls._cache)
+            pending = len(cls._pending_writes)
+
+        lookups = stats["l1_hits"] + stats["l1_misses"]
+        hits = (stats["l1_hits"] + stats["l1_neighbour_hits"] +
+                stats["l2_hits"] + stats["l2_neighbour_hits"])
+        return {
+            "l1": {
+                "size": l1_size,
+                "max_size": cls._cache_max_size,
+                "hits": stats["l1_hits"],
+                "neighbour_hits": stats["l1_neighbour_hits"],
+                "misses": stats["l1_misses"],
+            },
+            "l2": {
+                "enabled": cls._persistent_enabled,
+                "hits": stats["l2_hits"],
+                "neighbour_hits": stats["l2_neighbour_hits"],
+                "misses": stats["l2_misses"],
+                "errors": stats["l2_errors"],
+                "writes": stats["l2_writes"],
+                "write_errors": stats["l2_write_errors"],
+                "pending_writes": pending,
+            },
+            "provider": {
+                "calls": stats["provider_calls"],
+                "failures": stats["provider_failures"],
+            },
+            "offline": {
+                "mode": cls._offline_mode,
+                "loaded": is_offline_geocoder_loaded(),
+                "hits": stats["offline_hits"],
+                "misses": stats["offline_misses"],
+            },
+            "hit_rate_percent": round(hits / lookups * 100, 1) if lookups else 0,
+            "neighbour_radius_m": cls._neighbour_radius_m,
+            "max_age_days": round(cls._max_age_seconds / 86400, 1),
+        }
+
     @classmethod
     def _google_geocode(cls, lat: float, lng: float, api_key: str) -> Optional[str]:
         try:
@@ -66,7 +376,7 @@ class GeocodingService:
                     "language": "ar",
                     "result_type": "street_address|route|neighborhood|sublocality|locality",
                 },
-                timeout=3,
+                timeout=cls._google_timeout,
             )
             if resp.status_code != 200:
                 logger.warning(f"Google Geocoding HTTP {resp.status_code}")
@@ -125,14 +435,12 @@ class GeocodingService:
     @classmethod
     def _nominatim_geocode(cls, lat: float, lng: float) -> Optional[str]:
         """Fallback: OpenStreetMap Nominatim (rate-limited to 1 req/sec)."""
-        import time
-
         with cls._lock:
             now = time.monotonic()
             elapsed = now - cls._last_nominatim_time
             if elapsed < cls._nominatim_interval:
                 wait = cls._nominatim_interval - elapsed
-                if wait > 0.8:
+                if wait > cls._nominatim_max_wait:
                     return None
                 time.sleep(wait)
             cls._last_nominatim_time = time.monotonic()
@@ -149,7 +457,7 @@ class GeocodingService:
                     "zoom": 16,
                 },
                 headers={"User-Agent": "DashcamRD-RoadApp/1.0 (fahad@dashcamrd.com)"},
-                timeout=2,
+                timeout=cls._nominatim_timeout,
             )
             if resp.status_code == 200:
                 data = resp.json()
@@ -173,14 +481,65 @@ class GeocodingService:
         return "، ".join(parts[:3]) if parts else None
 
     @classmethod
-    def _add_to_cache(cls, key: str, value: str):
+    def _add_to_cache(
+        cls, key: str, value: str, latitude: float, longitude: float,
+        stored_at: Optional[float] = None,
+    ):
+        entry = (value, latitude, longitude, stored_at or time.time())
         with cls._lock:
             if key in cls._cache:
                 cls._cache.move_to_end(key)
-            else:
-                if len(cls._cache) >= cls._cache_max_size:
-                    cls._cache.popitem(last=False)
-                cls._cache[key] = value
+            elif len(cls._cache) >= cls._cache_max_size:
+                evicted, _ = cls._cache.popitem(last=False)
+                cls._spatial.remove(evicted)
+            cls._cache[key] = entry
+            cls._spatial.insert(key, latitude, longitude)
+
+    @classmethod
+    def batch_reverse_geocode(
+        cls, points: List[Tuple[float, float]], max_workers: int = 4,
+        deadline: Optional[float] = None,
+    ) -> List[Optional[str]]:
+        """
+        Reverse-geocode many points, resolving each distinct cell once.
+
+        Cells are resolved with bounded parallelism (max_workers threads);
+        results are returned in the same order as `points`. Cells not yet
+        started by `deadline` (time.monotonic()) are skipped and come back
+        as None, so the caller's time budget bounds the whole batch.
+        """
+        def resolve(lat: float, lng: float) -> Optional[str]:
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            return cls.reverse_geocode(lat, lng)
+
+        cells: Dict[str, Tuple[float, float]] = {}
+        keys = []
+        for lat, lng in points:
+            key = cls._cell_key(lat, lng)
+            keys.append(key)
+            cells.setdefault(key, (lat, lng))
+
+        resolved: Dict[str, Optional[str]] = {}
+        if len(cells) == 1 or max_workers <= 1:
+            for key, (lat, lng) in cells.items():
+                resolved[key] = resolve(lat, lng)
+        else:
+            with ThreadPoolExecutor(
+                max_workers=min(max_workers, len(cells)), thread_name_prefix="geocode-batch"
+            ) as pool:
+                futures = {
+                    key: pool.submit(resolve, lat, lng)
+                    for key, (lat, lng) in cells.items()
+                }
+                for key, future in futures.items():
+                    try:
+                        resolved[key] = future.result()
+                    except Exception as e:
+                        logger.error(f"Batch geocode failed for {key}: {e}")
+                        resolved[key] = None
+
+        return [resolved.get(key) for key in keys]
 
     @classmethod
     def get_location_name(cls, latitude: Optional[float], longitude: Optional[float]) -> str:
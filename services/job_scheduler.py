@@ -0,0 +1,540 @@
+"""
+Job Scheduler - One place for every periodic background job
+
+Services used to each run their own asyncio loop with wait_for timeouts,
+private thread pools and ad-hoc status dicts. Jobs are now registered here
+(main.py's lifespan) and share one scheduling loop:
+
+    scheduler.register("vms_sync", vms_sync.run_cycle, interval=60,
+                       timeout=45, jitter=5, leader="vms_sync")
+
+Per job:
+  - interval (seconds) or a 5-field UTC cron expression ("*/15 * * * *")
+  - jitter: random 0..jitter seconds added to every run, so replicas and
+    neighbouring jobs don't fire in lockstep
+  - timeout: async jobs are cancelled; blocking jobs can't be interrupted,
+    so the timeout is recorded and the job stays "running" (no overlap)
+    until its thread actually returns
+  - overlap prevention: a run that comes due while the previous one is
+    still in flight is skipped and counted
+  - executor: blocking callables run on the job's own thread pool
+  - leader: lease name in leader_election; the job only runs in the
+    process holding that lease
+  - metrics: runs/failures/timeouts/skips, last duration and error, and a
+    duration histogram
+
+Admin endpoints (routers/admin.py) list, pause, resume and trigger jobs.
+Those actions are stored in the job_controls table, and every process
+applies them on its next control poll (CONTROL_POLL_SECONDS). A pause or
+trigger therefore reaches the process that holds the job's lease, not just
+the worker that served the request. After each run, the running process
+records its node id, timing and error there too, so any worker can show
+where and how a job last ran. Run counters and histograms stay per process.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from database import SessionLocal
+from models.job_control_db import JobControlDB
+from services.leader_election import leader_election
+from utils.db_upsert import upsert_rows
+
+logger = logging.getLogger(__name__)
+
+_control_thread_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-control")
+
+# Upper bounds (seconds) of the run-duration histogram buckets
+DURATION_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class CronSchedule:
+    """
+    Minimal 5-field cron (minute hour day-of-month month day-of-week), UTC.
+    Fields accept "*", "n", "a-b", "*/s", "a-b/s" and comma lists;
+    day-of-week is 0-6 with 0 = Sunday.
+    """
+
+    _RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 6))
+
+    def __init__(self, expression: str):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            self._parse(part, lo, hi) for part, (lo, hi) in zip(parts, self._RANGES)
+        )
+        self._any_day = parts[2] == "*"
+        self._any_weekday = parts[4] == "*"
+
+    @staticmethod
+    def _parse(field_expr: str, lo: int, hi: int) -> Set[int]:
+        values: Set[int] = set()
+        for item in field_expr.split(","):
+            step = 1
+            if "/" in item:
+                item, step_str = item.split("/", 1)
+                step = int(step_str)
+            if item == "*":
+                start, end = lo, hi
+            elif "-" in item:
+                start, end = (int(x) for x in item.split("-", 1))
+            else:
+                start = end = int(item)
+            if start < lo or end > hi or start > end or step < 1:
+                raise ValueError(f"Cron field {field_expr!r} out of range {lo}-{hi}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, dt: datetime) -> bool:
+        weekday = (dt.weekday() + 1) % 7  # Python: Monday=0 → cron: Sunday=0
+        if self._any_day or self._any_weekday:
+            return dt.day in self.days and weekday in self.weekdays
+        # Standard cron: restricted day-of-month OR restricted day-of-week
+        return dt.day in self.days or weekday in self.weekdays
+
+    def next_after(self, after: datetime) -> datetime:
+        dt = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=366 * 4)
+        while dt < limit:
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+                continue
+            if not self._day_matches(dt):
+                dt = dt.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if dt.hour not in self.hours:
+                dt = dt.replace(minute=0) + timedelta(hours=1)
+                continue
+            if dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+                continue
+            return dt
+        raise ValueError(f"Cron expression never fires: {self.expression!r}")
+
+
+@dataclass
+class Job:
+    name: str
+    func: Callable[[], Any]
+    interval: Optional[float] = None
+    cron: Optional[CronSchedule] = None
+    jitter: float = 0.0
+    timeout: Optional[float] = None
+    leader: Optional[str] = None
+    description: str = ""
+    is_async: bool = False
+    executor: Optional[ThreadPoolExecutor] = None
+
+    paused: bool = False
+    trigger_seen: Optional[datetime] = None  # last job_controls trigger applied here
+    running: bool = False
+    next_run: float = 0.0  # monotonic
+    runs: int = 0
+    failures: int = 0
+    timeouts: int = 0
+    skipped_overlap: int = 0
+    last_started_at: Optional[datetime] = None
+    last_finished_at: Optional[datetime] = None
+    last_duration: Optional[float] = None
+    last_error: Optional[str] = None
+    last_error_at: Optional[datetime] = None
+    duration_sum: float = 0.0
+    duration_max: float = 0.0
+    histogram: List[int] = field(default_factory=lambda: [0] * (len(DURATION_BUCKETS) + 1))
+
+    def schedule_next(self, now: float):
+        if self.cron is not None:
+            wall = datetime.utcnow()
+            delay = (self.cron.next_after(wall) - wall).total_seconds()
+        else:
+            delay = self.interval
+        if self.jitter:
+            delay += random.uniform(0, self.jitter)
+        self.next_run = now + delay
+
+    def record(self, duration: float):
+        self.duration_sum += duration
+        self.duration_max = max(self.duration_max, duration)
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if duration <= bound:
+                self.histogram[i] += 1
+                break
+        else:
+            self.histogram[-1] += 1
+
+
+class JobScheduler:
+
+    IDLE_SLEEP_SECONDS = 60
+    CONTROL_POLL_SECONDS = 5
+
+    def __init__(self):
+        self._jobs: Dict[str, Job] = {}
+        self.running = False
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._in_flight: Set[asyncio.Task] = set()
+        # Latest job_controls rows, for status; triggers already present at
+        # the first poll are not replayed after a restart
+        self._controls: Dict[str, Dict[str, Any]] = {}
+        self._controls_loaded = False
+        self._last_control_poll = 0.0
+        self._control_error: Optional[str] = None
+        logger.info("🗓️ Job scheduler initialized")
+
+    def register(
+        self,
+        name: str,
+        func: Callable[[], Any],
+        interval: Optional[float] = None,
+        cron: Optional[str] = None,
+        jitter: float = 0.0,
+        timeout: Optional[float] = None,
+        max_workers: int = 1,
+        leader: Optional[str] = None,
+        run_immediately: bool = True,
+        description: str = "",
+    ) -> Job:
+        """
+        Register a periodic job. `func` is a coroutine function (awaited on
+        the event loop) or a plain callable (run on the job's thread pool).
+        Exactly one of `interval` / `cron` is required.
+        """
+        if (interval is None) == (cron is None):
+            raise ValueError(f"Job {name}: give exactly one of interval or cron")
+        is_async = asyncio.iscoroutinefunction(func)
+        job = Job(
+            name=name,
+            func=func,
+            interval=interval,
+            cron=CronSchedule(cron) if cron else None,
+            jitter=jitter,
+            timeout=timeout,
+            leader=leader,
+            description=description,
+            is_async=is_async,
+            executor=None if is_async else ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix=f"job-{name}"
+            ),
+        )
+        now = time.monotonic()
+        if run_immediately:
+            job.next_run = now + (random.uniform(0, jitter) if jitter else 0)
+        else:
+            job.schedule_next(now)
+        if leader:
+            leader_election.register(leader)
+        self._jobs[name] = job
+        self._wake()
+        return job
+
+    # ------------------------------------------------------------------
+    # Control
+    # ------------------------------------------------------------------
+
+    def get(self, name: str) -> Optional[Job]:
+        return self._jobs.get(name)
+
+    # pause/resume/trigger write job_controls and block on the DB: call
+    # them from a thread (sync endpoints), not from the event loop
+
+    def pause(self, name: str) -> bool:
+        """Pause a job in every process. Raises if the control row can't be written."""
+        job = self._jobs.get(name)
+        if job is None:
+            return False
+        self._write_control(name, paused=True)
+        job.paused = True
+        logger.info(f"⏸️ Job {name} paused")
+        return True
+
+    def resume(self, name: str) -> bool:
+        """Resume a job in every process. Raises if the control row can't be written."""
+        job = self._jobs.get(name)
+        if job is None:
+            return False
+        self._write_control(name, paused=False)
+        job.paused = False
+        self._wake()
+        logger.info(f"▶️ Job {name} resumed")
+        return True
+
+    def trigger(self, name: str) -> bool:
+        """
+        Run a job on the next loop iteration, here and in every other process
+        once they poll (still subject to overlap and leadership, so a
+        leader-elected job runs once, on its leader).
+        """
+        job = self._jobs.get(name)
+        if job is None:
+            return False
+        try:
+            # Whole seconds: MySQL DATETIME would round, and the value read
+            # back must match to not replay the trigger here
+            job.trigger_seen = self._write_control(
+                name, trigger_requested_at=datetime.utcnow().replace(microsecond=0)
+            )
+        except Exception as e:
+            # Best effort: still run it here
+            logger.error(f"❌ Failed to share trigger for job {name}: {e}")
+        job.next_run = time.monotonic()
+        self._wake()
+        return True
+
+    def _write_control(self, name: str, **values) -> Optional[datetime]:
+        now = datetime.utcnow()
+        row = {"name": name, **values, "updated_by": leader_election.node_id, "updated_at": now}
+        db = SessionLocal()
+        try:
+            upsert_rows(db, JobControlDB, [row], conflict_columns=["name"],
+                        update_columns=[c for c in row if c != "name"])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        return values.get("trigger_requested_at")
+
+    def is_active(self, name: str) -> bool:
+        """Registered, scheduler running, not paused and (if leader-elected) leading here."""
+        job = self._jobs.get(name)
+        return bool(
+            job and self.running and not job.paused
+            and (job.leader is None or leader_election.is_leader(job.leader))
+        )
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self):
+        if self._task is not None and not self._task.done():
+            logger.warning("⚠️ Job scheduler is already running")
+            return
+        self.running = True
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.create_task(self._run_loop())
+        logger.info(f"✅ Job scheduler started with {len(self._jobs)} jobs")
+
+    def stop(self):
+        self.running = False
+        if self._task is not None:
+            self._task.cancel()
+        for task in list(self._in_flight):
+            task.cancel()
+        for job in self._jobs.values():
+            if job.executor is not None:
+                job.executor.shutdown(wait=False)
+        logger.info("🛑 Job scheduler stopped")
+
+    def _wake(self):
+        # Called from admin request threads as well as the loop itself
+        if self._loop is not None and self._wakeup is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._wakeup.set)
+            except RuntimeError:
+                pass  # loop closed during shutdown
+
+    async def _run_loop(self):
+        self._wakeup = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        while self.running:
+            if time.monotonic() - self._last_control_poll >= self.CONTROL_POLL_SECONDS:
+                self._last_control_poll = time.monotonic()
+                try:
+                    rows = await loop.run_in_executor(_control_thread_pool, self._read_controls_blocking)
+                    self._apply_controls(rows)
+                    self._control_error = None
+                except Exception as e:
+                    self._control_error = str(e)
+                    logger.warning(f"⚠️ Job control poll failed: {e}")
+
+            now = time.monotonic()
+            for job in list(self._jobs.values()):
+                if job.paused or now < job.next_run:
+                    continue
+                if job.leader and not leader_election.is_leader(job.leader) and job.cron is None:
+                    # Check again soon so a new leader doesn't wait a full interval
+                    job.next_run = now + leader_election.RENEW_INTERVAL_SECONDS
+                    continue
+                job.schedule_next(now)
+                if job.leader and not leader_election.is_leader(job.leader):
+                    continue
+                if job.running:
+                    job.skipped_overlap += 1
+                    logger.warning(f"⚠️ Job {job.name} still running, skipping this run")
+                    continue
+                task = asyncio.create_task(self._execute(job))
+                self._in_flight.add(task)
+                task.add_done_callback(self._in_flight.discard)
+
+            active = [j.next_run for j in self._jobs.values() if not j.paused]
+            sleep_for = min(active) - time.monotonic() if active else self.IDLE_SLEEP_SECONDS
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(), timeout=min(max(0.0, sleep_for), self.CONTROL_POLL_SECONDS)
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    def _read_controls_blocking(self) -> List[Dict[str, Any]]:
+        db = SessionLocal()
+        try:
+            return [
+                {c.name: getattr(row, c.name) for c in JobControlDB.__table__.columns}
+                for row in db.query(JobControlDB).filter(JobControlDB.name.in_(list(self._jobs)))
+            ]
+        finally:
+            db.close()
+
+    def _apply_controls(self, rows: List[Dict[str, Any]]):
+        now = time.monotonic()
+        for row in rows:
+            job = self._jobs.get(row["name"])
+            if job is None:
+                continue
+            self._controls[job.name] = row
+            if job.paused != bool(row["paused"]):
+                job.paused = bool(row["paused"])
+                logger.info(f"{'⏸️' if job.paused else '▶️'} Job {job.name} "
+                            f"{'paused' if job.paused else 'resumed'} by {row['updated_by']}")
+            requested = row["trigger_requested_at"]
+            if requested is not None and requested != job.trigger_seen:
+                if self._controls_loaded:
+                    job.next_run = now
+                job.trigger_seen = requested
+        self._controls_loaded = True
+
+    def _record_run_blocking(self, name: str, values: Dict[str, Any]):
+        db = SessionLocal()
+        try:
+            upsert_rows(db, JobControlDB, [{"name": name, **values}],
+                        conflict_columns=["name"], update_columns=list(values))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"⚠️ Failed to record last run of job {name}: {e}")
+        finally:
+            db.close()
+
+    async def _execute(self, job: Job):
+        job.running = True
+        job.runs += 1
+        job.last_started_at = datetime.utcnow()
+        started = time.monotonic()
+        future = None
+        try:
+            if job.is_async:
+                await asyncio.wait_for(job.func(), timeout=job.timeout)
+            else:
+                loop = asyncio.get_running_loop()
+                future = loop.run_in_executor(job.executor, job.func)
+                # shield: a timeout stops waiting but the thread keeps the job busy
+                await asyncio.wait_for(asyncio.shield(future), timeout=job.timeout)
+            job.last_error = None
+        except asyncio.TimeoutError:
+            job.timeouts += 1
+            job.failures += 1
+            job.last_error = f"Timed out after {job.timeout}s"
+            job.last_error_at = datetime.utcnow()
+            logger.error(f"❌ Job {job.name} exceeded {job.timeout}s timeout")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            job.failures += 1
+            job.last_error = str(e)
+            job.last_error_at = datetime.utcnow()
+            logger.error(f"❌ Job {job.name} failed: {e}", exc_info=True)
+        finally:
+            duration = time.monotonic() - started
+            job.last_duration = duration
+            job.last_finished_at = datetime.utcnow()
+            job.record(duration)
+            _control_thread_pool.submit(self._record_run_blocking, job.name, {
+                "last_run_node": leader_election.node_id,
+                "last_run_started_at": job.last_started_at,
+                "last_run_finished_at": job.last_finished_at,
+                "last_run_duration_s": round(duration, 3),
+                "last_run_error": job.last_error[:500] if job.last_error else None,
+            })
+            if future is not None and not future.done():
+                future.add_done_callback(lambda _f: setattr(job, "running", False))
+            else:
+                job.running = False
+
+    # ------------------------------------------------------------------
+    # Status
+    # ------------------------------------------------------------------
+
+    def get_job_status(self, name: str) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(name)
+        if job is None:
+            return None
+        completed = sum(job.histogram)
+        next_in = job.next_run - time.monotonic()
+        control = self._controls.get(name, {})
+        return {
+            "name": job.name,
+            "description": job.description,
+            "schedule": job.cron.expression if job.cron else f"every {job.interval:g}s",
+            "jitter_seconds": job.jitter,
+            "timeout_seconds": job.timeout,
+            "leader_lease": job.leader,
+            "leader": leader_election.get_job_status(job.leader)["leader"] if job.leader else None,
+            "leads_here": job.leader is None or leader_election.is_leader(job.leader),
+            "active": self.is_active(name),
+            "paused": job.paused,
+            "running": job.running,
+            "next_run_in_seconds": round(max(0.0, next_in), 1) if not job.paused else None,
+            "runs": job.runs,
+            "failures": job.failures,
+            "timeouts": job.timeouts,
+            "skipped_overlap": job.skipped_overlap,
+            "last_started_at": job.last_started_at.isoformat() if job.last_started_at else None,
+            "last_finished_at": job.last_finished_at.isoformat() if job.last_finished_at else None,
+            "last_duration_s": round(job.last_duration, 3) if job.last_duration is not None else None,
+            "avg_duration_s": round(job.duration_sum / completed, 3) if completed else None,
+            "max_duration_s": round(job.duration_max, 3),
+            "duration_histogram": {
+                **{f"le_{bound:g}s": count for bound, count in zip(DURATION_BUCKETS, job.histogram)},
+                "gt_max": job.histogram[-1],
+            },
+            "last_error": job.last_error,
+            "last_error_at": job.last_error_at.isoformat() if job.last_error_at else None,
+            # Shared (job_controls): the latest run in any process
+            "control_updated_by": control.get("updated_by"),
+            "control_updated_at": _iso(control.get("updated_at")),
+            "last_run": {
+                "node": control.get("last_run_node"),
+                "started_at": _iso(control.get("last_run_started_at")),
+                "finished_at": _iso(control.get("last_run_finished_at")),
+                "duration_s": control.get("last_run_duration_s"),
+                "error": control.get("last_run_error"),
+            } if control.get("last_run_node") else None,
+        }
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "node_id": leader_election.node_id,
+            "running": self.running,
+            "control_error": self._control_error,
+            "jobs": [self.get_job_status(name) for name in self._jobs],
+        }
+
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+scheduler = JobScheduler()
@@ -0,0 +1,271 @@
+"""
+Leader Election - One runner per background job across processes
+
+Every uvicorn worker / replica runs main.py's lifespan. Jobs that poll the
+vendor or sweep the database (VMS sync, auto-configuration, address
+backfill) must only run once per deployment, otherwise each process spends
+the shared 60 req/min vendor budget on its own.
+
+Each job has a lease row in service_leases. Periodic jobs are tied to a
+lease through job_scheduler (register(..., leader="name")); long-running
+workers pass on_acquire/on_release callbacks to register() instead.
+Every RENEW_INTERVAL_SECONDS each process runs one guarded UPDATE per job:
+
+    SET holder = me, expires_at = now + LEASE_SECONDS
+    WHERE name = :job AND (holder = me OR holder IS NULL OR expires_at < now)
+
+One row updated → this process leads and runs the job; otherwise it
+follows (and steps down if it was leading). A crashed leader's lease expires after LEASE_SECONDS and the next renew round elsewhere takes
+over; a clean shutdown releases its leases immediately. A leader that
+can't reach the DB steps down before its lease runs out.
+
+Lease times use the application clock, so node clocks are assumed to be
+NTP-synced (skew well below LEASE_SECONDS).
+
+LEADER_ELECTION=false runs every registered job in this process without
+touching the table (single-process deployments, local development).
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from sqlalchemy import case, or_, update
+
+from database import SessionLocal
+from models.service_lease_db import ServiceLeaseDB
+from utils.db_upsert import upsert_rows
+
+logger = logging.getLogger(__name__)
+
+_lease_thread_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="leader-lease")
+
+
+@dataclass
+class _Job:
+    name: str
+    on_acquire: Optional[Callable[[], Any]] = None
+    on_release: Optional[Callable[[], Any]] = None
+    is_leader: bool = False
+    leader_since: Optional[datetime] = None
+    last_renewed: float = 0.0
+    holder: Optional[str] = None
+
+
+class LeaderElection:
+
+    RENEW_INTERVAL_SECONDS = 5
+
+    def __init__(self):
+        self.node_id = os.getenv("NODE_ID") or f"{socket.gethostname()}:{os.getpid()}"
+        self.enabled = os.getenv("LEADER_ELECTION", "true").lower() in ("1", "true", "yes")
+        self.lease_seconds = int(os.getenv("LEADER_LEASE_SECONDS", "15"))
+        self._jobs: Dict[str, _Job] = {}
+        self.running = False
+        self._task: Optional[asyncio.Task] = None
+        self._last_error: Optional[str] = None
+        logger.info(f"👑 Leader election initialized (node {self.node_id}, enabled={self.enabled})")
+
+    def register(
+        self,
+        name: str,
+        on_acquire: Optional[Callable[[], Any]] = None,
+        on_release: Optional[Callable[[], Any]] = None,
+    ):
+        """
+        Compete for the `name` lease. on_acquire runs when this process
+        becomes its holder, on_release when it loses it. Without callbacks
+        callers just poll is_leader() (scheduler jobs); registering a name
+        again without callbacks keeps the existing ones.
+        """
+        existing = self._jobs.get(name)
+        if existing is not None and on_acquire is None and on_release is None:
+            return
+        job = _Job(name=name, on_acquire=on_acquire, on_release=on_release)
+        self._jobs[name] = job
+        if self.running and not self.enabled:
+            self._become_leader(job)
+
+    def is_leader(self, name: str) -> bool:
+        job = self._jobs.get(name)
+        return bool(job and job.is_leader)
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self):
+        if self._task is not None and not self._task.done():
+            logger.warning("⚠️ Leader election is already running")
+            return
+        self.running = True
+        if not self.enabled:
+            for job in self._jobs.values():
+                self._become_leader(job)
+            return
+        self._task = asyncio.create_task(self._run_worker())
+        logger.info("✅ Leader election started")
+
+    def stop(self):
+        """Stop every job this process leads and hand its leases back."""
+        self.running = False
+        if self._task is not None:
+            self._task.cancel()
+        held = [job for job in self._jobs.values() if job.is_leader]
+        for job in held:
+            self._step_down(job)
+        if self.enabled and held:
+            try:
+                self._release_blocking([job.name for job in held])
+            except Exception as e:
+                logger.error(f"❌ Failed to release leases on shutdown: {e}")
+        logger.info("🛑 Leader election stopped")
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "node_id": self.node_id,
+            "enabled": self.enabled,
+            "lease_seconds": self.lease_seconds,
+            "renew_interval_seconds": self.RENEW_INTERVAL_SECONDS,
+            "last_error": self._last_error,
+            "jobs": {name: self.get_job_status(name) for name in self._jobs},
+        }
+
+    def get_job_status(self, name: str) -> Dict[str, Any]:
+        job = self._jobs.get(name)
+        if job is None:
+            return {"leader": None, "is_leader": False}
+        return {
+            "leader": self.node_id if job.is_leader else job.holder,
+            "is_leader": job.is_leader,
+            "leader_since": job.leader_since.isoformat() if job.leader_since else None,
+        }
+
+    # ------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------
+
+    async def _run_worker(self):
+        loop = asyncio.get_running_loop()
+        while self.running:
+            for job in list(self._jobs.values()):
+                try:
+                    held, holder = await loop.run_in_executor(
+                        _lease_thread_pool, self._renew_blocking, job.name
+                    )
+                    self._last_error = None
+                except Exception as e:
+                    self._last_error = str(e)
+                    logger.error(f"❌ Lease renewal failed for {job.name}: {e}")
+                    # Can't prove we still hold it: step down before it lapses elsewhere
+                    if job.is_leader and time.monotonic() - job.last_renewed > (
+                        self.lease_seconds - self.RENEW_INTERVAL_SECONDS
+                    ):
+                        self._step_down(job)
+                    continue
+
+                job.holder = holder
+                if held:
+                    job.last_renewed = time.monotonic()
+                    if not job.is_leader:
+                        self._become_leader(job)
+                elif job.is_leader:
+                    self._step_down(job)
+            await asyncio.sleep(self.RENEW_INTERVAL_SECONDS)
+
+    def _become_leader(self, job: _Job):
+        job.is_leader = True
+        job.leader_since = datetime.utcnow()
+        job.last_renewed = time.monotonic()
+        logger.info(f"👑 {self.node_id} now leads {job.name}")
+        if job.on_acquire is None:
+            return
+        try:
+            job.on_acquire()
+        except Exception as e:
+            logger.error(f"❌ Failed to start {job.name}: {e}", exc_info=True)
+
+    def _step_down(self, job: _Job):
+        job.is_leader = False
+        job.leader_since = None
+        logger.warning(f"👑 {self.node_id} no longer leads {job.name}")
+        if job.on_release is None:
+            return
+        try:
+            job.on_release()
+        except Exception as e:
+            logger.error(f"❌ Failed to stop {job.name}: {e}", exc_info=True)
+
+    # ------------------------------------------------------------------
+    # Lease table
+    # ------------------------------------------------------------------
+
+    def _renew_blocking(self, name: str) -> Tuple[bool, Optional[str]]:
+        """Acquire or extend the lease. Returns (held by this node, current holder)."""
+        db = SessionLocal()
+        try:
+            held = self._claim(db, name)
+            if not held:
+                # First run for this job: create the row, then claim it normally
+                upsert_rows(
+                    db, ServiceLeaseDB, [{"name": name, "holder": None}],
+                    conflict_columns=["name"], update_columns=[],
+                )
+                held = self._claim(db, name)
+            db.commit()
+            if held:
+                return True, self.node_id
+            row = db.query(ServiceLeaseDB.holder).filter(ServiceLeaseDB.name == name).first()
+            return False, row.holder if row else None
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _claim(self, db, name: str) -> bool:
+        now = datetime.utcnow()
+        leases = ServiceLeaseDB.__table__
+        result = db.execute(
+            update(leases)
+            .where(
+                leases.c.name == name,
+                or_(
+                    leases.c.holder == self.node_id,
+                    leases.c.holder.is_(None),
+                    leases.c.expires_at < now,
+                ),
+            )
+            # MySQL applies SET assignments left to right: acquired_at must
+            # read the previous holder, so it goes before holder
+            .ordered_values(
+                (leases.c.acquired_at, case(
+                    (leases.c.holder == self.node_id, leases.c.acquired_at), else_=now
+                )),
+                (leases.c.holder, self.node_id),
+                (leases.c.heartbeat_at, now),
+                (leases.c.expires_at, now + timedelta(seconds=self.lease_seconds)),
+            )
+        )
+        return result.rowcount == 1
+
+    def _release_blocking(self, names):
+        db = SessionLocal()
+        try:
+            db.query(ServiceLeaseDB).filter(
+                ServiceLeaseDB.name.in_(names),
+                ServiceLeaseDB.holder == self.node_id,
+            ).update({ServiceLeaseDB.holder: None, ServiceLeaseDB.expires_at: datetime.utcnow()},
+                     synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+
+leader_election = LeaderElection()
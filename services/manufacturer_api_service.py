@@ -4,7 +4,6 @@ Manufacturer API Service - Handles all communication with the MDVR platform API
 import requests
 import os
 import hashlib
-import yaml
 import uuid
 import time
 import urllib3
@@ -14,6 +13,9 @@ import logging
 from collections import deque
 from dotenv import load_dotenv
 
+from services.endpoint_registry import EndpointSpec, DEFAULT_SUCCESS_CODES, get_endpoint_registry
+from services.monitoring_service import monitoring
+
 # Suppress SSL warnings for self-signed certificates on self-hosted server
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -25,16 +27,12 @@ class ManufacturerAPIService:
     """Service for interacting with the manufacturer's MDVR API"""
     
     def __init__(self):
-        # Load YAML configuration
-        self.config = self._load_config()
-        self.profile = os.getenv("MANUFACTURER_API_PROFILE", "default")
+        # Compiled endpoint registry (YAML parsed once per process)
+        self.registry = get_endpoint_registry()
+        self.profile = self.registry.profile
         
         # Get base URL from config or env
-        profile_config = self.config["profiles"][self.profile]
-        self.base_url = os.getenv(
-            profile_config.get("base_url_env", "MANUFACTURER_API_BASE_URL"),
-            profile_config.get("base_url", "https://34.166.228.100:9367")
-        )
+        self.base_url = os.getenv(self.registry.base_url_env, self.registry.base_url)
         
         self.username = os.getenv("MANUFACTURER_API_USERNAME")
         self.password = os.getenv("MANUFACTURER_API_PASSWORD")
@@ -44,67 +42,31 @@ class ManufacturerAPIService:
         self.token_expires_at = None
         
         # Rate limiting - track request timestamps
-        rate_limit = profile_config.get("rate_limit_per_minute", 0)
+        rate_limit = self.registry.rate_limit_per_minute
         self.rate_limit_enabled = rate_limit > 0
         self.rate_limit_window = 60  # seconds
         self.rate_limit_max = rate_limit
         self.request_timestamps: deque = deque(maxlen=rate_limit if rate_limit > 0 else 1000)
         
         # Global defaults from config
-        self.default_timeout = profile_config.get("default_timeout", 30)
-        self.default_retries = profile_config.get("default_retries", 3)
-        self.default_retry_delay = profile_config.get("default_retry_delay", 1)
+        self.default_timeout = self.registry.default_timeout
+        self.default_retries = self.registry.default_retries
+        self.default_retry_delay = self.registry.default_retry_delay
         
         logger.info(f"🔧 Manufacturer API Config (Profile: {self.profile}):")
         logger.info(f"   Base URL: {self.base_url}")
         logger.info(f"   Username: {self.username}")
         logger.info(f"   Password: {'***' if self.password else 'NOT_SET'}")
         logger.info(f"   Token: Will be fetched automatically on first use")
-        logger.info(f"   Endpoints loaded: {len(profile_config.get('endpoints', {}))}")
+        logger.info(f"   Endpoints loaded: {len(self.registry)}")
     
-    def _load_config(self) -> Dict[str, Any]:
-        """Load API configuration from YAML file"""
-        config_path = os.getenv("MANUFACTURER_API_CONFIG", "config/manufacturer_api.yaml")
-        try:
-            with open(config_path, 'r') as f:
-                return yaml.safe_load(f)
-        except FileNotFoundError:
-            logger.error(f"❌ Manufacturer API config file not found at {config_path}")
-            raise
-        except yaml.YAMLError as e:
-            logger.error(f"❌ Error parsing YAML config file {config_path}: {e}")
-            raise
-    
-    def _get_endpoint_config(self, endpoint_name: str) -> Dict[str, Any]:
-        """Get configuration for a specific endpoint"""
-        profile_config = self.config["profiles"][self.profile]
-        endpoint_config = profile_config.get("endpoints", {}).get(endpoint_name)
-        if not endpoint_config:
-            raise ValueError(f"Endpoint '{endpoint_name}' not found in config for profile '{self.profile}'")
-        return endpoint_config
+    def _get_endpoint_config(self, endpoint_name: str) -> EndpointSpec:
+        """Get compiled configuration for a specific endpoint"""
+        return self.registry.require(endpoint_name)
     
     def _build_request_data(self, endpoint_name: str, data: Optional[Dict] = None) -> Dict[str, Any]:
         """Build request data by applying defaults and validating required fields"""
-        endpoint_config = self._get_endpoint_config(endpoint_name)
-        request_config = endpoint_config.get("request", {})
-        
-        # Start with provided data or empty dict
-        request_data = data.copy() if data else {}
-        
-        # Apply defaults
-        defaults = request_config.get("defaults", {})
-        for key, value in defaults.items():
-            if key not in request_data:
-                request_data[key] = value
-        
-        # Validate required fields (if any are specified)
-        required = request_config.get("required", [])
-        if required:
-            missing = [field for field in required if field not in request_data]
-            if missing:
-                raise ValueError(f"Missing required fields for endpoint '{endpoint_name}': {missing}")
-        
-        return request_data
+        return self.registry.require(endpoint_name).build_request(data)
         
     def _get_headers(self) -> Dict[str, str]:
         """Get headers with authentication token"""
@@ -128,21 +90,37 @@ class ManufacturerAPIService:
         return datetime.now() >= self.token_expires_at
     
     def _refresh_token(self) -> bool:
-        """Refresh authentication token using configured login endpoint"""
+        """Refresh authentication token and record the login call telemetry"""
+        telemetry = {"attempts": 0, "timeouts": 0, "response_bytes": 0}
+        start = time.time()
+        success = self._request_token(telemetry)
+        if telemetry["attempts"]:
+            monitoring.record_vendor_call(
+                "login",
+                (time.time() - start) * 1000,
+                success=success,
+                response_bytes=telemetry["response_bytes"],
+                attempts=telemetry["attempts"],
+                timeouts=telemetry["timeouts"],
+            )
+        return success
+    
+    def _request_token(self, telemetry: Dict[str, Any]) -> bool:
+        """Log in using the configured login endpoint and store the token"""
         try:
             if not self.username or not self.password:
                 logger.error("❌ Manufacturer API credentials not configured")
                 return False
             
             # Get login endpoint config
-            login_config = self._get_endpoint_config("login")
-            endpoint_path = login_config["path"]
+            login_spec = self._get_endpoint_config("login")
+            endpoint_path = login_spec.path
             
             # Hash password with MD5 as required by manufacturer API
             password_hash = hashlib.md5(self.password.encode()).hexdigest()
             
             # Build login data with defaults from config
-            login_data = self._build_request_data("login", {
+            login_data = login_spec.build_request({
                 "username": self.username,
                 "password": password_hash
             })
@@ -150,16 +128,20 @@ class ManufacturerAPIService:
             logger.info(f"🔄 Attempting to login to manufacturer API with username: {self.username}")
             
             # Get timeout from config or use default
-            timeout = self.default_timeout
-            if login_config.get("timeout"):
-                timeout = login_config.get("timeout")
+            timeout = login_spec.timeout or self.default_timeout
             
-            response = requests.post(
-                f"{self.base_url}{endpoint_path}",
-                json=login_data,
-                timeout=timeout,
-                verify=False  # Self-signed certificate on self-hosted server
-            )
+            telemetry["attempts"] += 1
+            try:
+                response = requests.post(
+                    f"{self.base_url}{endpoint_path}",
+                    json=login_data,
+                    timeout=timeout,
+                    verify=False  # Self-signed certificate on self-hosted server
+                )
+            except requests.exceptions.Timeout:
+                telemetry["timeouts"] += 1
+                raise
+            telemetry["response_bytes"] += len(response.content or b"")
             
             logger.info(f"📡 Login response status: {response.status_code}")
             logger.info(f"📡 Login response: {response.text[:200]}...")
@@ -168,27 +150,17 @@ class ManufacturerAPIService:
                 result = response.json()
                 
                 # Check success codes from config
-                success_codes = login_config.get("response", {}).get("success_codes", [200, 0])
+                success_codes = login_spec.success_codes or DEFAULT_SUCCESS_CODES
                 code = result.get("code")
                 
                 if code in success_codes or result.get("message") == "success":
-                    # Try token paths from config
-                    token_paths = login_config.get("response", {}).get("token_paths", [
-                        "data.token", "token", "data.accessToken", "accessToken"
-                    ])
-                    
+                    # Try token paths from config (precompiled getters)
                     token = None
-                    for path in token_paths:
-                        parts = path.split(".")
-                        value = result
-                        try:
-                            for part in parts:
-                                value = value[part]
-                            if value:
-                                token = value
-                                break
-                        except (KeyError, TypeError):
-                            continue
+                    for get_token in login_spec.token_getters:
+                        value = get_token(result)
+                        if value:
+                            token = value
+                            break
                     
                     if token:
                         self.token = token
@@ -218,7 +190,7 @@ class ManufacturerAPIService:
             return self._refresh_token()
         return True
     
-    def _check_rate_limit(self) -> bool:
+    def _check_rate_limit(self, telemetry: Optional[Dict[str, Any]] = None) -> bool:
         """Check if we're within rate limit, wait if necessary"""
         if not self.rate_limit_enabled:
             return True
@@ -236,6 +208,8 @@ class ManufacturerAPIService:
             if wait_time > 0:
                 logger.warning(f"⏳ Rate limit reached ({self.rate_limit_max}/min), waiting {wait_time:.1f}s...")
                 time.sleep(wait_time)
+                if telemetry is not None:
+                    telemetry["rate_limit_wait_ms"] += wait_time * 1000
                 # Clean up again after waiting
                 now = time.time()
                 while self.request_timestamps and (now - self.request_timestamps[0]) > self.rate_limit_window:
@@ -245,6 +219,20 @@ class ManufacturerAPIService:
         self.request_timestamps.append(time.time())
         return True
     
+    def get_rate_budget(self) -> Dict[str, Any]:
+        """Live view of the vendor rate-limit window (for monitoring)"""
+        if not self.rate_limit_enabled:
+            return {"enabled": False}
+        now = time.time()
+        used = sum(1 for ts in list(self.request_timestamps) if now - ts <= self.rate_limit_window)
+        return {
+            "enabled": True,
+            "limit_per_minute": self.rate_limit_max,
+            "used_last_minute": used,
+            "remaining": max(self.rate_limit_max - used, 0),
+            "utilization_percent": round(used / self.rate_limit_max * 100, 1),
+        }
+    
     def _make_request(
         self, 
         endpoint_name: str, 
@@ -252,24 +240,61 @@ class ManufacturerAPIService:
         method: Optional[str] = None,
         retry_count: int = 0
     ) -> Dict[str, Any]:
-        """Make authenticated request to manufacturer API using configured endpoint details"""
+        """Make authenticated request to manufacturer API and record call telemetry"""
+        telemetry = {
+            "attempts": 0,
+            "timeouts": 0,
+            "token_refreshes": 0,
+            "rate_limit_wait_ms": 0.0,
+            "response_bytes": 0,
+        }
+        start = time.time()
+        result = self._send_request(endpoint_name, data, method, retry_count, telemetry)
+        duration_ms = (time.time() - start) * 1000
+        
+        spec = self.registry.get(endpoint_name)
+        success_codes = (spec.success_codes if spec else None) or DEFAULT_SUCCESS_CODES
+        success = isinstance(result, dict) and (
+            result.get("code") in success_codes or result.get("message") == "success"
+        )
+        monitoring.record_vendor_call(
+            endpoint_name,
+            duration_ms,
+            success=success,
+            response_bytes=telemetry["response_bytes"],
+            attempts=telemetry["attempts"],
+            timeouts=telemetry["timeouts"],
+            token_refreshes=telemetry["token_refreshes"],
+            rate_limit_wait_ms=telemetry["rate_limit_wait_ms"],
+        )
+        return result
+    
+    def _send_request(
+        self,
+        endpoint_name: str,
+        data: Optional[Dict],
+        method: Optional[str],
+        retry_count: int,
+        telemetry: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Send request using configured endpoint details, retrying with backoff"""
         try:
             # Get endpoint configuration
-            endpoint_config = self._get_endpoint_config(endpoint_name)
-            endpoint_path = endpoint_config["path"]
-            http_method = method or endpoint_config.get("method", "POST")
+            spec = self._get_endpoint_config(endpoint_name)
+            endpoint_path = spec.path
+            http_method = method or spec.method
             
             # Get endpoint-specific settings
-            timeout = endpoint_config.get("timeout", self.default_timeout)
-            max_retries = endpoint_config.get("retries", self.default_retries)
-            retry_delay = endpoint_config.get("retry_delay", self.default_retry_delay)
+            timeout = spec.timeout
+            max_retries = spec.retries
+            retry_delay = spec.retry_delay
             
             # Check rate limit before making request
-            if not self._check_rate_limit():
+            if not self._check_rate_limit(telemetry):
                 return {"code": -1, "message": "Rate limit exceeded"}
             
             # Build request data with validation and defaults
-            request_data = self._build_request_data(endpoint_name, data)
+            request_data = spec.build_request(data)
             
             # Skip auth for login endpoint
             if endpoint_name == "login":
@@ -295,19 +320,21 @@ class ManufacturerAPIService:
                 logger.info(f"📡 [{correlation_id}] Headers: {dict(headers) if 'headers' in locals() else 'N/A'}")
             
             try:
+                telemetry["attempts"] += 1
                 if http_method.upper() == "GET":
                     response = requests.get(url, params=request_data, headers=headers, timeout=timeout, verify=False)
                 else:
                     response = requests.post(url, json=request_data, headers=headers, timeout=timeout, verify=False)
             except requests.exceptions.Timeout as e:
                 logger.warning(f"⏱️  [{correlation_id}] Request timeout after {timeout}s")
+                telemetry["timeouts"] += 1
                 
                 # Retry with exponential backoff
                 if retry_count < max_retries:
                     delay = retry_delay * (2 ** retry_count)  # Exponential backoff
                     logger.info(f"🔄 [{correlation_id}] Retrying in {delay}s...")
                     time.sleep(delay)
-                    return self._make_request(endpoint_name, data, method, retry_count + 1)
+                    return self._send_request(endpoint_name, data, method, retry_count + 1, telemetry)
                 else:
                     return {"code": -1, "message": f"Request timeout after {max_retries + 1} attempts"}
             
@@ -319,7 +346,7 @@ class ManufacturerAPIService:
                     delay = retry_delay * (2 ** retry_count)
                     logger.info(f"🔄 [{correlation_id}] Retrying connection in {delay}s...")
                     time.sleep(delay)
-                    return self._make_request(endpoint_name, data, method, retry_count + 1)
+                    return self._send_request(endpoint_name, data, method, retry_count + 1, telemetry)
                 else:
                     return {"code": -1, "message": f"Connection failed after {max_retries + 1} attempts: {str(e)}"}
             
@@ -331,10 +358,11 @@ class ManufacturerAPIService:
                     delay = retry_delay * (2 ** retry_count)
                     logger.info(f"🔄 [{correlation_id}] Retrying in {delay}s...")
                     time.sleep(delay)
-                    return self._make_request(endpoint_name, data, method, retry_count + 1)
+                    return self._send_request(endpoint_name, data, method, retry_count + 1, telemetry)
                 else:
                     return {"code": -1, "message": f"Request failed after {max_retries + 1} attempts: {str(e)}"}
             
+            telemetry["response_bytes"] += len(response.content or b"")
             logger.info(f"📡 [{correlation_id}] Response status: {response.status_code}")
             logger.info(f"📡 [{correlation_id}] Response text: {response.text[:200]}...")
             
@@ -351,10 +379,13 @@ class ManufacturerAPIService:
                         if self._ensure_valid_token():
                             # Retry the request with new token
                             headers = self._get_headers()
+                            telemetry["attempts"] += 1
+                            telemetry["token_refreshes"] += 1
                             if http_method.upper() == "GET":
                                 response = requests.get(url, params=request_data, headers=headers, timeout=30, verify=False)
                             else:
                                 response = requests.post(url, json=request_data, headers=headers, timeout=30, verify=False)
+                            telemetry["response_bytes"] += len(response.content or b"")
                             if response.status_code == 200:
                                 return response.json()
                     
@@ -612,4 +643,5 @@ class ManufacturerAPIService:
 
 # Singleton instance
 manufacturer_api = ManufacturerAPIService()
+monitoring.set_rate_budget_provider(manufacturer_api.get_rate_budget)
 
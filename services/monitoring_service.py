@@ -6,12 +6,30 @@ import time
 import psutil
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Callable
 from collections import deque
 from threading import Lock
 
 logger = logging.getLogger(__name__)
 
+# Upper bounds (ms / bytes) for vendor call histograms; last bucket is open-ended
+VENDOR_LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+VENDOR_BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+def _bucket_index(buckets, value) -> int:
+    for i, bound in enumerate(buckets):
+        if value <= bound:
+            return i
+    return len(buckets)
+
+
+def _bucket_labels(buckets, unit: str) -> list:
+    labels = [f"<={b}{unit}" for b in buckets]
+    labels.append(f">{buckets[-1]}{unit}")
+    return labels
+
+
 class MonitoringService:
     """Collects and tracks all system metrics"""
 
@@ -28,6 +46,8 @@ class MonitoringService:
         self._last_forwarding_time: Optional[float] = None
         self._vms_response_times: deque = deque(maxlen=100)
         self._db_response_times: deque = deque(maxlen=100)
+        self._vendor_stats: Dict[str, Dict] = {}
+        self._rate_budget_provider: Optional[Callable[[], Dict[str, Any]]] = None
 
     @property
     def uptime_seconds(self) -> float:
@@ -77,6 +97,58 @@ class MonitoringService:
         with self._lock:
             self._vms_response_times.append(duration_ms)
 
+    def record_vendor_call(
+        self,
+        endpoint: str,
+        duration_ms: float,
+        success: bool,
+        response_bytes: int = 0,
+        attempts: int = 1,
+        timeouts: int = 0,
+        token_refreshes: int = 0,
+        rate_limit_wait_ms: float = 0.0,
+    ):
+        """Record one logical manufacturer API call (all retries included)."""
+        now = time.time()
+        with self._lock:
+            self._vms_response_times.append(duration_ms)
+            if endpoint not in self._vendor_stats:
+                self._vendor_stats[endpoint] = {
+                    "calls": 0, "errors": 0, "attempts": 0, "retries": 0,
+                    "timeouts": 0, "token_refreshes": 0,
+                    "rate_limit_waits": 0, "rate_limit_wait_ms": 0.0,
+                    "total_ms": 0.0, "max_ms": 0.0, "total_bytes": 0,
+                    "times": deque(maxlen=100),
+                    "bytes": deque(maxlen=100),
+                    "latency_hist": [0] * (len(VENDOR_LATENCY_BUCKETS_MS) + 1),
+                    "bytes_hist": [0] * (len(VENDOR_BYTES_BUCKETS) + 1),
+                    "attempt_times": deque(maxlen=1000),
+                }
+            stats = self._vendor_stats[endpoint]
+            stats["calls"] += 1
+            if not success:
+                stats["errors"] += 1
+            stats["attempts"] += attempts
+            stats["retries"] += max(attempts - 1 - token_refreshes, 0)
+            stats["timeouts"] += timeouts
+            stats["token_refreshes"] += token_refreshes
+            if rate_limit_wait_ms > 0:
+                stats["rate_limit_waits"] += 1
+                stats["rate_limit_wait_ms"] += rate_limit_wait_ms
+            stats["total_ms"] += duration_ms
+            stats["max_ms"] = max(stats["max_ms"], duration_ms)
+            stats["total_bytes"] += response_bytes
+            stats["times"].append(duration_ms)
+            stats["bytes"].append(response_bytes)
+            stats["latency_hist"][_bucket_index(VENDOR_LATENCY_BUCKETS_MS, duration_ms)] += 1
+            stats["bytes_hist"][_bucket_index(VENDOR_BYTES_BUCKETS, response_bytes)] += 1
+            for _ in range(attempts):
+                stats["attempt_times"].append(now)
+
+    def set_rate_budget_provider(self, provider: Callable[[], Dict[str, Any]]):
+        """Register a callable returning the live vendor rate-limit budget."""
+        self._rate_budget_provider = provider
+
     def record_db_response(self, duration_ms: float):
         with self._lock:
             self._db_response_times.append(duration_ms)
@@ -202,5 +274,63 @@ class MonitoringService:
             "samples": len(times),
         }
 
+    def get_rate_budget(self) -> Dict[str, Any]:
+        provider = self._rate_budget_provider
+        if provider is None:
+            return {"enabled": False}
+        try:
+            return provider()
+        except Exception as e:
+            logger.warning(f"Rate budget provider failed: {e}")
+            return {"enabled": False, "error": str(e)[:100]}
+
+    def get_vendor_metrics(self) -> Dict[str, Any]:
+        """Per-endpoint manufacturer API telemetry plus the live rate budget."""
+        now = time.time()
+        endpoints = []
+        totals = {"calls": 0, "errors": 0, "retries": 0, "timeouts": 0,
+                  "token_refreshes": 0, "rate_limit_waits": 0, "total_bytes": 0}
+        with self._lock:
+            for ep, stats in sorted(self._vendor_stats.items(), key=lambda x: x[1]["calls"], reverse=True):
+                ep_times = list(stats["times"])
+                ep_bytes = list(stats["bytes"])
+                last_minute = sum(1 for t in stats["attempt_times"] if now - t <= 60)
+                for key in totals:
+                    totals[key] += stats[key]
+                endpoints.append({
+                    "endpoint": ep,
+                    "calls": stats["calls"],
+                    "errors": stats["errors"],
+                    "retries": stats["retries"],
+                    "timeouts": stats["timeouts"],
+                    "token_refreshes": stats["token_refreshes"],
+                    "rate_limit_waits": stats["rate_limit_waits"],
+                    "rate_limit_wait_ms": round(stats["rate_limit_wait_ms"], 1),
+                    "budget_used_last_minute": last_minute,
+                    "latency": {
+                        "avg_ms": round(stats["total_ms"] / stats["calls"], 1) if stats["calls"] else 0,
+                        "p50_ms": round(self._percentile(ep_times, 50), 1),
+                        "p95_ms": round(self._percentile(ep_times, 95), 1),
+                        "max_ms": round(stats["max_ms"], 1),
+                        "histogram": dict(zip(
+                            _bucket_labels(VENDOR_LATENCY_BUCKETS_MS, "ms"), stats["latency_hist"]
+                        )),
+                    },
+                    "response_bytes": {
+                        "avg": round(stats["total_bytes"] / stats["calls"]) if stats["calls"] else 0,
+                        "p95": round(self._percentile(ep_bytes, 95)),
+                        "total": stats["total_bytes"],
+                        "histogram": dict(zip(
+                            _bucket_labels(VENDOR_BYTES_BUCKETS, "B"), stats["bytes_hist"]
+                        )),
+                    },
+                })
+
+        return {
+            "rate_budget": self.get_rate_budget(),
+            "totals": totals,
+            "endpoints": endpoints,
+        }
+
 
 monitoring = MonitoringService()
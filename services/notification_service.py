@@ -3,11 +3,18 @@ Push Notification Service
 
 Handles sending push notifications via Firebase Cloud Messaging (FCM).
 Supports ACC status change notifications with multi-language support.
+
+Delivery goes through a pluggable transport (FCM_TRANSPORT): "firebase"
+in production, "local" for load tests without Firebase credentials.
 """
 
 import os
 import json
 import logging
+import random
+from abc import ABC, abstractmethod
+import threading
+import time
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 
@@ -15,11 +22,15 @@ import firebase_admin
 from firebase_admin import credentials, messaging
 from sqlalchemy.orm import Session
 
-from models.fcm_token_db import FCMTokenDB, UserNotificationSettingsDB, NotificationPreference
-from models.device_db import DeviceDB
+from models.fcm_token_db import FCMTokenDB, NotificationPreference
+from services.subscription_graph import subscription_graph
+from services.alert_aggregator import alert_aggregator
 
 logger = logging.getLogger(__name__)
 
+# FCM accepts at most 500 tokens per multicast request
+MULTICAST_BATCH_SIZE = 500
+
 # Initialize Firebase Admin SDK
 _firebase_initialized = False
 
@@ -65,6 +76,204 @@ def initialize_firebase():
         return False
 
 
+# =============================================================================
+# Transports
+# =============================================================================
+#
+# NotificationService talks to a transport instead of firebase_admin directly.
+# Per-token results are tri-state everywhere:
+#   True  = delivered
+#   False = token permanently invalid (unregistered / sender mismatch)
+#   None  = temporary failure (network, quota, server) — keep the token
+
+
+class FCMTransport(ABC):
+    """Delivery backend interface"""
+
+    name = "base"
+
+    def available(self) -> bool:
+        return True
+
+    def send(self, token: str, title: str, body: str, data: Dict[str, str]) -> Optional[bool]:
+        return self.send_multicast([token], title, body, data)[0]
+
+    @abstractmethod
+    def send_multicast(
+        self, tokens: List[str], title: str, body: str, data: Dict[str, str]
+    ) -> List[Optional[bool]]:
+        """Send to at most MULTICAST_BATCH_SIZE tokens in one request."""
+
+
+class FirebaseTransport(FCMTransport):
+    """Firebase Cloud Messaging via firebase_admin"""
+
+    name = "firebase"
+
+    def available(self) -> bool:
+        return initialize_firebase()
+
+    @staticmethod
+    def _platform_config() -> Dict[str, Any]:
+        return {
+            "apns": messaging.APNSConfig(
+                payload=messaging.APNSPayload(
+                    aps=messaging.Aps(
+                        sound="default",
+                    )
+                )
+            ),
+            "android": messaging.AndroidConfig(
+                priority="high",
+                notification=messaging.AndroidNotification(
+                    sound="default",
+                    priority="high",
+                )
+            ),
+        }
+
+    @staticmethod
+    def _classify(token: str, error: Exception) -> Optional[bool]:
+        if isinstance(error, messaging.UnregisteredError):
+            logger.warning(f"⚠️ Token unregistered (permanently invalid): {token[:20]}...")
+            return False  # Token is dead — safe to deactivate
+        if isinstance(error, messaging.SenderIdMismatchError):
+            logger.warning(f"⚠️ Token sender ID mismatch (permanently invalid): {token[:20]}...")
+            return False  # Token belongs to different project — safe to deactivate
+        logger.error(f"❌ Failed to send notification (temporary error): {error}")
+        return None  # Don't deactivate — could be a temporary server/network issue
+
+    def send(self, token: str, title: str, body: str, data: Dict[str, str]) -> Optional[bool]:
+        try:
+            message = messaging.Message(
+                notification=messaging.Notification(
+                    title=title,
+                    body=body,
+                ),
+                data=data,
+                token=token,
+                **self._platform_config()
+            )
+            response = messaging.send(message)
+            logger.info(f"✅ Notification sent: {response}")
+            return True
+        except Exception as e:
+            return self._classify(token, e)
+
+    def send_multicast(
+        self, tokens: List[str], title: str, body: str, data: Dict[str, str]
+    ) -> List[Optional[bool]]:
+        try:
+            message = messaging.MulticastMessage(
+                notification=messaging.Notification(
+                    title=title,
+                    body=body,
+                ),
+                data=data,
+                tokens=tokens,
+                **self._platform_config()
+            )
+            response = messaging.send_each_for_multicast(message)
+        except Exception as e:
+            logger.error(f"❌ Failed to send multicast (temporary error): {e}")
+            return [None] * len(tokens)
+        return [
+            True if item.success else self._classify(token, item.exception)
+            for token, item in zip(tokens, response.responses)
+        ]
+
+
+class LocalFCMTransport(FCMTransport):
+    """
+    In-process stand-in for FCM, for load tests and local development.
+    
+    Simulates per-request latency and the two failure classes the pipeline
+    reacts to: unregistered tokens (permanent) and quota errors (temporary).
+    Tokens starting with "invalid" are always unregistered.
+    """
+
+    name = "local"
+
+    def __init__(
+        self,
+        latency_ms: float = 50.0,
+        jitter_ms: float = 20.0,
+        unregistered_rate: float = 0.0,
+        quota_error_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.unregistered_rate = unregistered_rate
+        self.quota_error_rate = quota_error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "delivered": 0, "unregistered": 0, "quota_errors": 0}
+
+    @classmethod
+    def from_env(cls) -> "LocalFCMTransport":
+        return cls(
+            latency_ms=float(os.getenv("FCM_LOCAL_LATENCY_MS", "50")),
+            jitter_ms=float(os.getenv("FCM_LOCAL_JITTER_MS", "20")),
+            unregistered_rate=float(os.getenv("FCM_LOCAL_UNREGISTERED_RATE", "0")),
+            quota_error_rate=float(os.getenv("FCM_LOCAL_QUOTA_ERROR_RATE", "0")),
+        )
+
+    def send_multicast(
+        self, tokens: List[str], title: str, body: str, data: Dict[str, str]
+    ) -> List[Optional[bool]]:
+        with self._lock:
+            delay = max(0.0, self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms))
+            draws = [(self._random.random(), self._random.random()) for _ in tokens]
+        time.sleep(delay / 1000.0)
+
+        results: List[Optional[bool]] = []
+        counts = {"delivered": 0, "unregistered": 0, "quota_errors": 0}
+        for token, (u, q) in zip(tokens, draws):
+            if token.startswith("invalid") or u < self.unregistered_rate:
+                results.append(False)
+                counts["unregistered"] += 1
+            elif q < self.quota_error_rate:
+                results.append(None)
+                counts["quota_errors"] += 1
+            else:
+                results.append(True)
+                counts["delivered"] += 1
+        with self._lock:
+            self.stats["requests"] += 1
+            for key, value in counts.items():
+                self.stats[key] += value
+        return results
+
+
+_TRANSPORTS = {
+    FirebaseTransport.name: FirebaseTransport,
+    LocalFCMTransport.name: LocalFCMTransport.from_env,
+}
+_transport: Optional[FCMTransport] = None
+
+
+def get_transport() -> FCMTransport:
+    """Active transport, chosen by FCM_TRANSPORT (firebase | local). Defaults to firebase."""
+    global _transport
+    if _transport is None:
+        name = os.getenv("FCM_TRANSPORT", FirebaseTransport.name).lower()
+        factory = _TRANSPORTS.get(name)
+        if factory is None:
+            logger.warning(f"⚠️ Unknown FCM_TRANSPORT '{name}', using firebase")
+            factory = FirebaseTransport
+        _transport = factory()
+        if _transport.name != FirebaseTransport.name:
+            logger.warning(f"⚠️ Push notifications use the '{_transport.name}' transport — nothing reaches phones")
+    return _transport
+
+
+def set_transport(transport: Optional[FCMTransport]):
+    """Swap the transport (benchmarks/load tests). None resets to FCM_TRANSPORT."""
+    global _transport
+    _transport = transport
+
+
 class NotificationService:
     """Service for sending push notifications."""
     
@@ -75,12 +284,22 @@ class NotificationService:
             "acc_on_body": 'Your car "{device_name}" is ON now!',
             "acc_off_title": "Vehicle Stopped 🚗",
             "acc_off_body": 'Your car "{device_name}" is OFF now!',
+            "acc_digest_suffix": "(+{count} more changes in the last {minutes} min)",
+            "digest_title": '"{device_name}" alerts',
+            "digest_body": "{count} more {label} in the last {minutes} min",
+            "label_SPEED": "speed alerts",
+            "label_default": "alerts",
         },
         "ar": {
             "acc_on_title": "السيارة شغالة 🚗",
             "acc_on_body": 'سيارتك "{device_name}" شغاله الآن!',
             "acc_off_title": "السيارة مطفية 🚗",
             "acc_off_body": 'سيارتك "{device_name}" مطفية الآن!',
+            "acc_digest_suffix": "(+{count} تغييرات أخرى خلال آخر {minutes} دقيقة)",
+            "digest_title": 'تنبيهات "{device_name}"',
+            "digest_body": "{count} {label} أخرى خلال آخر {minutes} دقيقة",
+            "label_SPEED": "تنبيهات سرعة",
+            "label_default": "تنبيهات",
         }
     }
     
@@ -135,47 +354,12 @@ class NotificationService:
             False if token is permanently invalid (should be deactivated)
             None if temporary error (token should NOT be deactivated)
         """
-        if not initialize_firebase():
+        transport = get_transport()
+        if not transport.available():
             logger.warning("⚠️ Firebase not initialized, skipping notification")
             return None  # Don't deactivate tokens on server config issues
         
-        try:
-            message = messaging.Message(
-                notification=messaging.Notification(
-                    title=title,
-                    body=body,
-                ),
-                data=data or {},
-                token=token,
-                apns=messaging.APNSConfig(
-                    payload=messaging.APNSPayload(
-                        aps=messaging.Aps(
-                            sound="default",
-                        )
-                    )
-                ),
-                android=messaging.AndroidConfig(
-                    priority="high",
-                    notification=messaging.AndroidNotification(
-                        sound="default",
-                        priority="high",
-                    )
-                )
-            )
-            
-            response = messaging.send(message)
-            logger.info(f"✅ Notification sent: {response}")
-            return True
-            
-        except messaging.UnregisteredError:
-            logger.warning(f"⚠️ Token unregistered (permanently invalid): {token[:20]}...")
-            return False  # Token is dead — safe to deactivate
-        except messaging.SenderIdMismatchError:
-            logger.warning(f"⚠️ Token sender ID mismatch (permanently invalid): {token[:20]}...")
-            return False  # Token belongs to different project — safe to deactivate
-        except Exception as e:
-            logger.error(f"❌ Failed to send notification (temporary error): {e}")
-            return None  # Don't deactivate — could be a temporary server/network issue
+        return transport.send(token, title, body, data or {})
     
     @staticmethod
     def send_acc_notification(
@@ -187,6 +371,11 @@ class NotificationService:
         """
         Send ACC status change notification to all users subscribed to this device.
         
+        Recipients come from the cached subscription graph (no queries once
+        the device is warm), grouped by language, and sent as one multicast
+        per language. Token bookkeeping (last_used_at / deactivation) is
+        applied in bulk.
+        
         Args:
             db: Database session
             device_id: The dashcam device ID
@@ -201,77 +390,206 @@ class NotificationService:
             logger.debug(f"📝 ACC status unchanged for {device_id}, skipping notification")
             return 0
         
-        # Get device name from DeviceDB
-        device = db.query(DeviceDB).filter(DeviceDB.device_id == device_id).first()
-        device_name = device.name if device else device_id
+        # Preferences that opt out of this transition
+        if acc_on:
+            excluded = (NotificationPreference.NONE.value, NotificationPreference.OFF_ONLY.value)
+        else:
+            excluded = (NotificationPreference.NONE.value, NotificationPreference.ON_ONLY.value)
+        
+        graph = subscription_graph.get(db, device_id)
         
-        # Find all users with notification settings for this device
-        settings = db.query(UserNotificationSettingsDB).filter(
-            UserNotificationSettingsDB.device_id == device_id
-        ).all()
+        # Group tokens by message language: token -> (token id, user id)
+        by_language: Dict[str, Dict[str, tuple]] = {}
+        for sub in graph.subscribers:
+            if sub.acc_notification in excluded or not sub.tokens:
+                continue
+            # Flapping ACC collapses into a digest after the first push
+            if not alert_aggregator.admit(sub.user_id, device_id, "ACC", {"acc_on": acc_on}):
+                continue
+            language = sub.language if sub.language in NotificationService.MESSAGES else "en"
+            group = by_language.setdefault(language, {})
+            for token_id, fcm_token in sub.tokens:
+                group[fcm_token] = (token_id, sub.user_id)
         
-        if not settings:
-            logger.debug(f"📝 No notification settings for device {device_id}")
+        if not by_language:
+            logger.debug(f"📝 No subscribed users with active FCM tokens for device {device_id}")
             return 0
         
-        sent_count = 0
+        data = {
+            "type": "acc_change",
+            "device_id": device_id,
+            "acc_status": "on" if acc_on else "off",
+            "timestamp": datetime.utcnow().isoformat()
+        }
         
-        for setting in settings:
-            # Check if user wants this type of notification
-            pref = setting.acc_notification
-            
-            if pref == NotificationPreference.NONE.value:
-                continue
-            elif pref == NotificationPreference.ON_ONLY.value and not acc_on:
-                continue
-            elif pref == NotificationPreference.OFF_ONLY.value and acc_on:
-                continue
-            # BOTH: send for both ON and OFF
-            
-            # Get user's FCM tokens
-            tokens = db.query(FCMTokenDB).filter(
-                FCMTokenDB.user_id == setting.user_id,
-                FCMTokenDB.is_active == True
-            ).all()
-            
-            if not tokens:
-                logger.debug(f"📝 No active FCM tokens for user {setting.user_id}")
-                continue
-            
-            # Get message in user's preferred language
-            msg = NotificationService.get_message(
-                language=setting.language or "en",
-                acc_on=acc_on,
-                device_name=device_name
+        sent_ids, invalid = NotificationService.send_grouped({
+            language: (
+                NotificationService.get_message(language, acc_on, graph.device_name),
+                token_map,
+                data,
             )
+            for language, token_map in by_language.items()
+        })
+        
+        sent_count = NotificationService.apply_token_results(db, sent_ids, invalid)
+        logger.info(
+            f"📱 Sent {sent_count} ACC notifications for device {device_id} "
+            f"(ACC={'ON' if acc_on else 'OFF'}, {len(by_language)} language groups)"
+        )
+        return sent_count
+    
+    @staticmethod
+    def get_digest_message(
+        language: str,
+        category: str,
+        count: int,
+        window_seconds: int,
+        device_name: str,
+        last_event: Dict[str, Any]
+    ) -> Dict[str, str]:
+        """Title/body for a burst digest ("7 more alerts in the last 5 min")."""
+        if language not in NotificationService.MESSAGES:
+            language = "en"
+        msgs = NotificationService.MESSAGES[language]
+        minutes = max(1, round(window_seconds / 60))
+        
+        if category == "ACC" and "acc_on" in last_event:
+            # Lead with the latest state, then how many flips were folded in
+            msg = NotificationService.get_message(language, last_event["acc_on"], device_name)
+            suffix = msgs["acc_digest_suffix"].format(count=count, minutes=minutes)
+            return {"title": msg["title"], "body": f"{msg['body']} {suffix}"}
+        
+        label = msgs.get(f"label_{category}", msgs["label_default"])
+        return {
+            "title": msgs["digest_title"].format(device_name=device_name),
+            "body": msgs["digest_body"].format(count=count, label=label, minutes=minutes),
+        }
+    
+    @staticmethod
+    def send_digest(
+        db: Session,
+        user_id: int,
+        device_id: str,
+        category: str,
+        count: int,
+        window_seconds: int,
+        last_event: Optional[Dict[str, Any]] = None
+    ) -> int:
+        """
+        Send one digest push for events the alert aggregator held back.
+        
+        Returns:
+            Number of notifications sent successfully
+        """
+        graph = subscription_graph.get(db, device_id)
+        sub = next((s for s in graph.subscribers if s.user_id == user_id), None)
+        if sub is None or not sub.tokens:
+            return 0
+        if category == "ACC" and sub.acc_notification == NotificationPreference.NONE.value:
+            return 0
+        
+        msg = NotificationService.get_digest_message(
+            sub.language, category, count, window_seconds, graph.device_name, last_event or {}
+        )
+        data = {
+            "type": "digest",
+            "category": category,
+            "device_id": device_id,
+            "count": str(count),
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        sent_ids, invalid = NotificationService.send_grouped({
+            user_id: (msg, {fcm_token: (token_id, user_id) for token_id, fcm_token in sub.tokens}, data)
+        })
+        return NotificationService.apply_token_results(db, sent_ids, invalid)
+    
+    @staticmethod
+    def send_grouped(groups: Dict[Any, tuple]) -> tuple:
+        """
+        Send one multicast per group.
+        
+        Args:
+            groups: key -> ({"title", "body"}, {fcm token: (token id, user id)}, data payload)
             
-            # Send to all user's devices
-            for token_record in tokens:
-                result = NotificationService.send_notification(
-                    token=token_record.fcm_token,
-                    title=msg["title"],
-                    body=msg["body"],
-                    data={
-                        "type": "acc_change",
-                        "device_id": device_id,
-                        "acc_status": "on" if acc_on else "off",
-                        "timestamp": datetime.utcnow().isoformat()
-                    }
-                )
-                
+        Returns:
+            (sent token ids, [(invalid token id, user id)])
+        """
+        sent_ids: List[int] = []
+        invalid: List[tuple] = []
+        for msg, token_map, data in groups.values():
+            tokens = list(token_map)
+            results = NotificationService.send_multicast_results(
+                tokens=tokens,
+                title=msg["title"],
+                body=msg["body"],
+                data=data
+            )
+            for token, result in zip(tokens, results):
                 if result is True:
-                    # Success — update last_used_at
-                    token_record.last_used_at = datetime.utcnow()
-                    sent_count += 1
+                    sent_ids.append(token_map[token][0])
                 elif result is False:
                     # Token permanently invalid — deactivate it
-                    token_record.is_active = False
-                    logger.info(f"🗑️ Deactivated invalid token for user {setting.user_id}")
+                    invalid.append(token_map[token])
                 # result is None → temporary error, leave token active
+        return sent_ids, invalid
+    
+    @staticmethod
+    def apply_token_results(db: Session, sent_ids: List[int], invalid: List[tuple]) -> int:
+        """
+        Bulk-apply send results: stamp last_used_at on delivered tokens and
+        deactivate permanently invalid ones (dropping their users from the
+        subscription graph). Commits the session.
         
+        Returns:
+            Number of delivered notifications
+        """
+        now = datetime.utcnow()
+        if sent_ids:
+            db.query(FCMTokenDB).filter(FCMTokenDB.id.in_(sent_ids)).update(
+                {FCMTokenDB.last_used_at: now}, synchronize_session=False
+            )
+        if invalid:
+            invalid_ids = [token_id for token_id, _ in invalid]
+            db.query(FCMTokenDB).filter(FCMTokenDB.id.in_(invalid_ids)).update(
+                {FCMTokenDB.is_active: False, FCMTokenDB.updated_at: now}, synchronize_session=False
+            )
+            logger.info(f"🗑️ Deactivated {len(invalid_ids)} invalid tokens")
         db.commit()
-        logger.info(f"📱 Sent {sent_count} ACC notifications for device {device_id} (ACC={'ON' if acc_on else 'OFF'})")
-        return sent_count
+        
+        for user_id in {user_id for _, user_id in invalid}:
+            subscription_graph.invalidate_user(user_id)
+        return len(sent_ids)
+    
+    @staticmethod
+    def send_multicast_results(
+        tokens: List[str],
+        title: str,
+        body: str,
+        data: Optional[Dict[str, str]] = None
+    ) -> List[Optional[bool]]:
+        """
+        Send one notification to many tokens, chunked to the FCM multicast limit.
+        
+        Returns:
+            One result per token, in order, with the same meaning as
+            send_notification: True sent, False permanently invalid,
+            None temporary error
+        """
+        if not tokens:
+            return []
+        transport = get_transport()
+        if not transport.available():
+            logger.warning("⚠️ Firebase not initialized, skipping notification")
+            return [None] * len(tokens)  # Don't deactivate tokens on server config issues
+        
+        results: List[Optional[bool]] = []
+        for i in range(0, len(tokens), MULTICAST_BATCH_SIZE):
+            chunk = tokens[i:i + MULTICAST_BATCH_SIZE]
+            chunk_results = transport.send_multicast(chunk, title, body, data or {})
+            results.extend(chunk_results)
+            sent = sum(1 for r in chunk_results if r is True)
+            logger.info(f"✅ Multicast: {sent} success, {len(chunk) - sent} failed")
+        return results
     
     @staticmethod
     def send_multicast_notification(
@@ -292,41 +610,5 @@ class NotificationService:
         Returns:
             Number of successful sends
         """
-        if not initialize_firebase():
-            return 0
-        
-        if not tokens:
-            return 0
-        
-        try:
-            message = messaging.MulticastMessage(
-                notification=messaging.Notification(
-                    title=title,
-                    body=body,
-                ),
-                data=data or {},
-                tokens=tokens,
-                apns=messaging.APNSConfig(
-                    payload=messaging.APNSPayload(
-                        aps=messaging.Aps(
-                            sound="default",
-                        )
-                    )
-                ),
-                android=messaging.AndroidConfig(
-                    priority="high",
-                    notification=messaging.AndroidNotification(
-                        sound="default",
-                        priority="high",
-                    )
-                )
-            )
-            
-            response = messaging.send_each_for_multicast(message)
-            logger.info(f"✅ Multicast: {response.success_count} success, {response.failure_count} failed")
-            return response.success_count
-            
-        except Exception as e:
-            logger.error(f"❌ Failed to send multicast: {e}")
-            return 0
-
+        results = NotificationService.send_multicast_results(tokens, title, body, data)
+        return sum(1 for r in results if r is True)
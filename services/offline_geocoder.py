@@ -0,0 +1,244 @@
+"""
+Offline Reverse Geocoder - In-process lookups over a locally imported gazetteer
+
+The gazetteer is built once from an OpenStreetMap extract with
+scripts/import_osm_gazetteer.py and contains:
+  - areas: city and district polygons (point-in-polygon)
+  - roads: named road polylines (nearest segment within a distance cap)
+
+Both are bucketed into uniform lat/lng grids so a lookup only tests the
+shapes whose bounding boxes overlap the query cell. No network access.
+
+Used by GeocodingService as a primary or fallback provider
+(GEOCODE_OFFLINE_MODE=primary|fallback|off).
+"""
+import gzip
+import json
+import logging
+import math
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from utils.geo import METERS_PER_DEG_LAT
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GAZETTEER_PATH = "data/gazetteer/ksa.json.gz"
+
+AREA_CELL_DEG = 0.05     # ~5.5 km buckets for city/district polygons
+ROAD_CELL_DEG = 0.005    # ~550 m buckets for road segments
+
+Ring = List[Tuple[float, float]]  # [(lng, lat), ...]
+
+
+def _point_in_ring(lng: float, lat: float, ring: Ring) -> bool:
+    """Ray-casting point-in-polygon test for a single ring."""
+    inside = False
+    j = len(ring) - 1
+    for i in range(len(ring)):
+        xi, yi = ring[i]
+        xj, yj = ring[j]
+        if (yi > lat) != (yj > lat):
+            x_cross = (xj - xi) * (lat - yi) / (yj - yi) + xi
+            if lng < x_cross:
+                inside = not inside
+        j = i
+    return inside
+
+
+def _ring_area(ring: Ring) -> float:
+    """Planar shoelace area in squared degrees (only used for ranking)."""
+    area = 0.0
+    j = len(ring) - 1
+    for i in range(len(ring)):
+        area += (ring[j][0] + ring[i][0]) * (ring[j][1] - ring[i][1])
+        j = i
+    return abs(area) / 2.0
+
+
+class _Area:
+    __slots__ = ("kind", "name", "polygons", "bbox", "area")
+
+    def __init__(self, kind: str, name: str, polygons: List[List[Ring]]):
+        self.kind = kind
+        self.name = name
+        self.polygons = polygons
+        xs = [p[0] for poly in polygons for p in poly[0]]
+        ys = [p[1] for poly in polygons for p in poly[0]]
+        self.bbox = (min(xs), min(ys), max(xs), max(ys))
+        self.area = sum(_ring_area(poly[0]) for poly in polygons)
+
+    def contains(self, lng: float, lat: float) -> bool:
+        min_x, min_y, max_x, max_y = self.bbox
+        if not (min_x <= lng <= max_x and min_y <= lat <= max_y):
+            return False
+        for outer, *holes in self.polygons:
+            if _point_in_ring(lng, lat, outer) and not any(
+                _point_in_ring(lng, lat, hole) for hole in holes
+            ):
+                return True
+        return False
+
+
+class OfflineGeocoder:
+    """Grid-indexed gazetteer for in-process reverse geocoding"""
+
+    def __init__(self, road_max_distance_m: float = 100.0):
+        self.road_max_distance_m = road_max_distance_m
+        self._areas: List[_Area] = []
+        self._area_grid: Dict[Tuple[int, int], List[int]] = {}
+        self._road_names: List[str] = []
+        # (road index, lng1, lat1, lng2, lat2)
+        self._segments: List[Tuple[int, float, float, float, float]] = []
+        self._road_grid: Dict[Tuple[int, int], List[int]] = {}
+        self.loaded = False
+
+    # ------------------------------------------------------------------
+    # Loading / indexing
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _cell(lng: float, lat: float, size: float) -> Tuple[int, int]:
+        return math.floor(lat / size), math.floor(lng / size)
+
+    def _register(self, grid, idx: int, bbox, size: float):
+        min_x, min_y, max_x, max_y = bbox
+        lo_r, lo_c = self._cell(min_x, min_y, size)
+        hi_r, hi_c = self._cell(max_x, max_y, size)
+        for r in range(lo_r, hi_r + 1):
+            for c in range(lo_c, hi_c + 1):
+                grid.setdefault((r, c), []).append(idx)
+
+    def load_dict(self, gazetteer: Dict):
+        for item in gazetteer.get("areas", []):
+            polygons = [[[tuple(pt) for pt in ring] for ring in poly] for poly in item["polygons"]]
+            polygons = [poly for poly in polygons if poly and len(poly[0]) >= 3]
+            if not polygons:
+                continue
+            area = _Area(item["kind"], item["name"], polygons)
+            self._areas.append(area)
+            self._register(self._area_grid, len(self._areas) - 1, area.bbox, AREA_CELL_DEG)
+
+        for item in gazetteer.get("roads", []):
+            road_idx = len(self._road_names)
+            self._road_names.append(item["name"])
+            for line in item["lines"]:
+                for (x1, y1), (x2, y2) in zip(line, line[1:]):
+                    self._segments.append((road_idx, x1, y1, x2, y2))
+                    bbox = (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+                    self._register(self._road_grid, len(self._segments) - 1, bbox, ROAD_CELL_DEG)
+
+        self.loaded = bool(self._areas or self._segments)
+        logger.info(
+            f"🗺️ Offline gazetteer loaded: {len(self._areas)} areas, "
+            f"{len(self._road_names)} roads, {len(self._segments)} segments"
+        )
+
+    def load_file(self, path: str):
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            self.load_dict(json.load(f))
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def _smallest_area(self, lng: float, lat: float, kind: str) -> Optional[str]:
+        best: Optional[_Area] = None
+        for idx in self._area_grid.get(self._cell(lng, lat, AREA_CELL_DEG), ()):
+            area = self._areas[idx]
+            if area.kind != kind or (best is not None and area.area >= best.area):
+                continue
+            if area.contains(lng, lat):
+                best = area
+        return best.name if best else None
+
+    def _nearest_road(self, lng: float, lat: float) -> Optional[str]:
+        # Local equirectangular projection to meters around the query point
+        kx = METERS_PER_DEG_LAT * math.cos(math.radians(lat))
+        ky = METERS_PER_DEG_LAT
+        reach = math.ceil(self.road_max_distance_m / (ROAD_CELL_DEG * kx)) if kx else 1
+        row, col = self._cell(lng, lat, ROAD_CELL_DEG)
+
+        best_road = None
+        best_d2 = self.road_max_distance_m ** 2
+        seen = set()
+        for r in range(row - reach, row + reach + 1):
+            for c in range(col - reach, col + reach + 1):
+                for seg_idx in self._road_grid.get((r, c), ()):
+                    if seg_idx in seen:
+                        continue
+                    seen.add(seg_idx)
+                    road_idx, x1, y1, x2, y2 = self._segments[seg_idx]
+                    ax, ay = (x1 - lng) * kx, (y1 - lat) * ky
+                    bx, by = (x2 - lng) * kx, (y2 - lat) * ky
+                    dx, dy = bx - ax, by - ay
+                    seg_len2 = dx * dx + dy * dy
+                    t = 0.0 if seg_len2 == 0 else max(0.0, min(1.0, -(ax * dx + ay * dy) / seg_len2))
+                    px, py = ax + t * dx, ay + t * dy
+                    d2 = px * px + py * py
+                    if d2 < best_d2:
+                        best_d2 = d2
+                        best_road = road_idx
+        return self._road_names[best_road] if best_road is not None else None
+
+    def city_at(self, latitude: float, longitude: float) -> Optional[str]:
+        """Name of the smallest city polygon containing the point."""
+        if not self.loaded:
+            return None
+        return self._smallest_area(longitude, latitude, "city")
+
+    def iter_areas(self, kind: str):
+        """Yield (name, polygons) for every area of the given kind."""
+        for area in self._areas:
+            if area.kind == kind:
+                yield area.name, area.polygons
+
+    def reverse(self, latitude: float, longitude: float) -> Optional[str]:
+        """Address in the same "city، district، road" shape as the network providers."""
+        if not self.loaded:
+            return None
+        city = self._smallest_area(longitude, latitude, "city")
+        district = self._smallest_area(longitude, latitude, "district")
+        road = self._nearest_road(longitude, latitude)
+
+        parts = []
+        for part in (city, district, road):
+            if part and part not in parts:
+                parts.append(part)
+        return "، ".join(parts) if parts else None
+
+
+_offline_geocoder: Optional[OfflineGeocoder] = None
+_offline_lock = threading.Lock()
+_offline_load_failed = False
+
+
+def get_offline_geocoder() -> Optional[OfflineGeocoder]:
+    """Process-wide offline geocoder, loaded lazily from OFFLINE_GAZETTEER_PATH."""
+    global _offline_geocoder, _offline_load_failed
+    if _offline_geocoder is not None or _offline_load_failed:
+        return _offline_geocoder
+    with _offline_lock:
+        if _offline_geocoder is None and not _offline_load_failed:
+            path = os.getenv("OFFLINE_GAZETTEER_PATH", DEFAULT_GAZETTEER_PATH)
+            if not os.path.exists(path):
+                logger.info(f"Offline gazetteer not found at {path}, offline geocoding disabled")
+                _offline_load_failed = True
+                return None
+            try:
+                geocoder = OfflineGeocoder(
+                    road_max_distance_m=float(os.getenv("GEOCODE_OFFLINE_ROAD_MAX_M", "100"))
+                )
+                geocoder.load_file(path)
+                _offline_geocoder = geocoder
+            except Exception as e:
+                logger.error(f"❌ Failed to load offline gazetteer {path}: {e}")
+                _offline_load_failed = True
+    return _offline_geocoder
+
+
+def is_offline_geocoder_loaded() -> bool:
+    """True once the gazetteer is in memory; never triggers the load."""
+    return _offline_geocoder is not None
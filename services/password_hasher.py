@@ -0,0 +1,184 @@
+"""
+Password Hasher - pbkdf2_sha256 off the request threads
+
+Each hash or verify is ~30k pbkdf2 rounds of CPU. Run inline in a sync
+endpoint, a morning login burst takes every thread of the shared executor,
+and /gps/latest and every other sync endpoint queue behind it. Instead:
+
+  - Hashing runs in a dedicated ProcessPoolExecutor of WORKERS processes,
+    so login CPU is capped at WORKERS cores and never holds an API thread
+  - Async endpoints await hash() / verify(); sync admin paths call
+    hash_blocking(), which waits on the pool without doing the work itself
+  - At most MAX_PENDING operations may be queued or running; beyond that
+    callers get 503 + Retry-After instead of an ever-growing queue
+
+Env: PASSWORD_HASH_WORKERS (default min(2, cpu count)),
+PASSWORD_HASH_MAX_PENDING (default 64).
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+logger = logging.getLogger(__name__)
+
+# Password hashing (use pbkdf2_sha256 for broad compatibility on macOS)
+pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+
+
+# Run inside the pool processes (must stay importable module-level functions)
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+class PasswordHasher:
+
+    RETRY_AFTER_SECONDS = 2
+
+    def __init__(self):
+        self.workers = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(2, os.cpu_count() or 1))))
+        self.max_pending = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+        self._total_ms = 0.0
+        self._max_ms = 0.0
+        logger.info(f"🔑 Password hasher initialized ({self.workers} processes, max {self.max_pending} pending)")
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Spawn the pool up front so the first login doesn't pay for it."""
+        pool = self._get_pool()
+        for _ in range(self.workers):
+            pool.submit(_hash, "warmup")
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+            logger.info("🛑 Password hasher stopped")
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking a process that already runs threads isn't safe
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._pool
+
+    def _reset_pool(self, broken: ProcessPoolExecutor):
+        with self._lock:
+            if self._pool is broken:
+                self._pool = None
+        broken.shutdown(wait=False, cancel_futures=True)
+        logger.error("❌ Password hash pool died, starting a new one")
+
+    # ------------------------------------------------------------------
+    # Admission
+    # ------------------------------------------------------------------
+
+    def _admit(self):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail="Too many sign-in requests, please retry shortly",
+                    headers={"Retry-After": str(self.RETRY_AFTER_SECONDS)},
+                )
+            self._pending += 1
+
+    def _done(self, started: float):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._pending -= 1
+            self._completed += 1
+            self._total_ms += elapsed_ms
+            self._max_ms = max(self._max_ms, elapsed_ms)
+
+    # ------------------------------------------------------------------
+    # Entry points
+    # ------------------------------------------------------------------
+
+    async def hash(self, password: str) -> str:
+        return await self._run_async(_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run_async(_verify, plain_password, hashed_password)
+
+    def hash_blocking(self, password: str) -> str:
+        return self._run_blocking(_hash, password)
+
+    def verify_blocking(self, plain_password: str, hashed_password: str) -> bool:
+        return self._run_blocking(_verify, plain_password, hashed_password)
+
+    async def _run_async(self, func: Callable, *args) -> Any:
+        self._admit()
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            # One retry on a fresh pool if a worker process was killed
+            for attempt in range(2):
+                pool = self._get_pool()
+                try:
+                    return await loop.run_in_executor(pool, func, *args)
+                except BrokenProcessPool:
+                    self._reset_pool(pool)
+                    if attempt:
+                        raise
+        finally:
+            self._done(started)
+
+    def _run_blocking(self, func: Callable, *args) -> Any:
+        self._admit()
+        started = time.perf_counter()
+        try:
+            for attempt in range(2):
+                pool = self._get_pool()
+                try:
+                    return pool.submit(func, *args).result()
+                except BrokenProcessPool:
+                    self._reset_pool(pool)
+                    if attempt:
+                        raise
+        finally:
+            self._done(started)
+
+    # ------------------------------------------------------------------
+    # Status
+    # ------------------------------------------------------------------
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "completed": self._completed,
+            "rejected": self._rejected,
+            "avg_ms": round(self._total_ms / self._completed, 1) if self._completed else 0,
+            "max_ms": round(self._max_ms, 1),
+        }
+
+
+password_hasher = PasswordHasher()
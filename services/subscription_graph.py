@@ -0,0 +1,183 @@
+"""
+Subscription Graph - Cached "who gets notified for this device"
+
+ACC changes and overspeed checks arrive on every forwarded GPS/ACC packet
+and used to rebuild their recipient list from UserNotificationSettingsDB,
+FCMTokenDB and DeviceDB each time. The graph caches, per device:
+
+    device_id -> DeviceSubscriptions(device_name, [Subscriber(user_id,
+                 acc_notification, language, speed_limit, tokens)])
+
+A device is loaded on first use (two queries) and then served from memory.
+Writers invalidate it:
+  - invalidate_user(): token register/unregister/deactivation, language
+    changes, user deletion
+  - invalidate_device(): settings changes for a device, device rename/sync
+  - clear(): bulk migrations
+
+Invalidations are also published through services/cache_generation, so
+a token unregistered or a setting changed on another worker empties this
+process' graph within SharedGeneration.CHECK_SECONDS. Entries still expire
+after TTL_SECONDS in case the stamp can't be read.
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from models.device_db import DeviceDB
+from models.fcm_token_db import FCMTokenDB, UserNotificationSettingsDB
+from services.cache_generation import SharedGeneration
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Subscriber:
+    user_id: int
+    acc_notification: str
+    language: str
+    speed_limit: Optional[int]
+    tokens: Tuple[Tuple[int, str], ...]  # (token id, fcm token), active only
+
+
+@dataclass(frozen=True)
+class DeviceSubscriptions:
+    device_id: str
+    device_name: str
+    subscribers: Tuple[Subscriber, ...]
+    loaded_at: float
+
+    @property
+    def speed_limit_subscribers(self) -> Tuple[Subscriber, ...]:
+        return tuple(s for s in self.subscribers if s.speed_limit and s.speed_limit > 0)
+
+
+class SubscriptionGraph:
+    """Per-device recipient cache with explicit invalidation"""
+
+    TTL_SECONDS = 300
+
+    def __init__(self):
+        self._devices: Dict[str, DeviceSubscriptions] = {}
+        self._user_devices: Dict[int, Set[str]] = {}
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so a load that raced a write isn't cached
+        self._generation = 0
+        self._shared = SharedGeneration("subscription_graph")
+        self._hits = 0
+        self._misses = 0
+        logger.info("🕸️ Subscription graph initialized")
+
+    def get(self, db: Session, device_id: str) -> DeviceSubscriptions:
+        if self._shared.changed():
+            self._drop_all()
+        entry = self._devices.get(device_id)
+        if entry is not None and time.monotonic() - entry.loaded_at < self.TTL_SECONDS:
+            self._hits += 1
+            return entry
+        self._misses += 1
+        generation = self._generation
+        entry = self._load(db, device_id)
+        with self._lock:
+            if generation != self._generation:
+                return entry
+            self._devices[device_id] = entry
+            for sub in entry.subscribers:
+                self._user_devices.setdefault(sub.user_id, set()).add(device_id)
+        return entry
+
+    def _load(self, db: Session, device_id: str) -> DeviceSubscriptions:
+        # Settings outer-joined to active tokens: users without tokens still
+        # appear (speed alerts create alarm rows for them)
+        rows = db.query(
+            UserNotificationSettingsDB.user_id,
+            UserNotificationSettingsDB.acc_notification,
+            UserNotificationSettingsDB.language,
+            UserNotificationSettingsDB.speed_limit,
+            FCMTokenDB.id,
+            FCMTokenDB.fcm_token,
+        ).outerjoin(
+            FCMTokenDB,
+            (FCMTokenDB.user_id == UserNotificationSettingsDB.user_id) & (FCMTokenDB.is_active == True)
+        ).filter(
+            UserNotificationSettingsDB.device_id == device_id
+        ).order_by(
+            UserNotificationSettingsDB.id
+        ).all()
+
+        by_user: Dict[int, dict] = {}
+        for user_id, pref, language, speed_limit, token_id, fcm_token in rows:
+            # First settings row per user wins (rows aren't unique per user/device)
+            sub = by_user.setdefault(user_id, {
+                "acc_notification": pref,
+                "language": language or "en",
+                "speed_limit": speed_limit,
+                "tokens": {},
+            })
+            if token_id is not None:
+                sub["tokens"][token_id] = fcm_token
+
+        device = db.query(DeviceDB.name).filter(DeviceDB.device_id == device_id).first()
+        device_name = device.name if device and device.name else device_id
+
+        subscribers = tuple(
+            Subscriber(
+                user_id=user_id,
+                acc_notification=sub["acc_notification"],
+                language=sub["language"],
+                speed_limit=sub["speed_limit"],
+                tokens=tuple(sub["tokens"].items()),
+            )
+            for user_id, sub in by_user.items()
+        )
+        return DeviceSubscriptions(
+            device_id=device_id,
+            device_name=device_name,
+            subscribers=subscribers,
+            loaded_at=time.monotonic(),
+        )
+
+    # ------------------------------------------------------------------
+    # Invalidation
+    # ------------------------------------------------------------------
+
+    def invalidate_device(self, device_id: str):
+        with self._lock:
+            self._generation += 1
+            self._devices.pop(device_id, None)
+        self._shared.bump()
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            self._generation += 1
+            for device_id in self._user_devices.pop(user_id, ()):
+                self._devices.pop(device_id, None)
+        self._shared.bump()
+
+    def clear(self):
+        self._drop_all()
+        self._shared.bump()
+
+    def _drop_all(self):
+        with self._lock:
+            self._generation += 1
+            self._devices.clear()
+            self._user_devices.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self._hits + self._misses
+        return {
+            "devices_cached": len(self._devices),
+            "users_indexed": len(self._user_devices),
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate_percent": round(self._hits / total * 100, 1) if total else 0,
+            "shared_generation": self._shared.get_stats(),
+        }
+
+
+subscription_graph = SubscriptionGraph()
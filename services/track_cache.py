@@ -0,0 +1,263 @@
+"""
+Track Cache - Parsed /gps/history playbacks keyed by (device, date, window)
+
+A finished day's track never changes, yet every playback re-ran
+query_detailed_track (up to 60 s against the vendor) and re-parsed every
+point. Playbacks are now cached in two tiers:
+
+  L1 — in-process LRU of parsed TrackPlaybackDto objects, bounded by their
+       estimated memory (POINT_MEMORY_BYTES per point, TRACK_CACHE_MEMORY_MB).
+       A hit costs a dict lookup; callers must not mutate what they get.
+  L2 — track_cache table of zlib-compressed columnar MessagePack blobs
+       (utils/track_encoding, ~4 B/point), shared by all workers and kept
+       across deploys; only immutable windows are written here. The
+       "track_cache_prune" job deletes the least recently read rows
+       beyond TRACK_CACHE_DB_MB.
+
+A window is immutable once its date is before today (device time, UTC+3)
+and it ended more than IMMUTABLE_GRACE ago, so late uploads from a device
+that reconnects after midnight still land. Anything newer, and any window
+with no points, is cached in L1 only, for TODAY_TTL_SECONDS.
+"""
+
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import func
+
+from adapters.base_adapter import BaseAdapter
+from database import SessionLocal, open_session, close_session
+from models.dto import TrackPlaybackDto, TrackPointDto
+from models.track_cache_db import TrackCacheDB
+from utils import track_encoding
+from utils.db_upsert import upsert_rows
+
+logger = logging.getLogger(__name__)
+
+
+class TrackCache:
+
+    TODAY_TTL_SECONDS = 60
+    IMMUTABLE_GRACE = timedelta(hours=2)
+    # Don't rewrite last_accessed_at on every read of a hot row
+    TOUCH_INTERVAL = timedelta(hours=1)
+    PRUNE_INTERVAL_SECONDS = 3600
+    PRUNE_TARGET_RATIO = 0.9
+    # Measured size of one parsed TrackPointDto (object, dict, floats)
+    POINT_MEMORY_BYTES = 1100
+
+    def __init__(self):
+        self.memory_budget = int(float(os.getenv("TRACK_CACHE_MEMORY_MB", "128")) * 1024 * 1024)
+        self.db_budget = int(float(os.getenv("TRACK_CACHE_DB_MB", "1024")) * 1024 * 1024)
+        self.persistent = os.getenv("TRACK_CACHE_PERSISTENT", "true").lower() != "false"
+        # cache_key -> (playback, estimated bytes, expires_at monotonic or None for immutable)
+        self._entries: "OrderedDict[str, Tuple[TrackPlaybackDto, int, Optional[float]]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats: Dict[str, int] = {
+            "l1_hits": 0, "l2_hits": 0, "misses": 0, "stores": 0, "l2_writes": 0,
+            "l1_evictions": 0, "l2_pruned": 0, "l2_errors": 0,
+        }
+        logger.info(f"🗺️ Track cache initialized (L1 {self.memory_budget // (1024 * 1024)} MB, "
+                    f"L2 {'on' if self.persistent else 'off'})")
+
+    @staticmethod
+    def make_key(device_id: str, track_date: str, start_time: Optional[str], end_time: Optional[str]) -> str:
+        return f"{device_id}|{track_date}|{start_time or '00:00:00'}-{end_time or '23:59:59'}"
+
+    def is_immutable(self, track_date: str, end_time: Optional[str]) -> bool:
+        now = datetime.now(BaseAdapter.DEVICE_TZ)
+        day = date.fromisoformat(track_date)
+        if day >= now.date():
+            return False
+        window_end = datetime.combine(
+            day, datetime.strptime(end_time or "23:59:59", "%H:%M:%S").time(), tzinfo=BaseAdapter.DEVICE_TZ
+        )
+        return now - window_end > self.IMMUTABLE_GRACE
+
+    # ------------------------------------------------------------------
+    # Lookup / store
+    # ------------------------------------------------------------------
+
+    def get(self, cache_key: str) -> Optional[TrackPlaybackDto]:
+        """Cached playback for the window, or None. Treat the result as read-only."""
+        playback = self._l1_get(cache_key)
+        if playback is not None:
+            self._count("l1_hits")
+            return playback
+        if self.persistent:
+            blob = self._l2_get(cache_key)
+            if blob is not None:
+                self._count("l2_hits")
+                playback = self._decode(blob)
+                self._l1_put(cache_key, playback, None)
+                return playback
+        self._count("misses")
+        return None
+
+    def put(self, cache_key: str, device_id: str, track_date: str, immutable: bool, playback: TrackPlaybackDto):
+        self._count("stores")
+        # An empty window may still fill from a late blind-area upload
+        immutable = immutable and bool(playback.points)
+        self._l1_put(cache_key, playback, None if immutable else time.monotonic() + self.TODAY_TTL_SECONDS)
+        if immutable and self.persistent:
+            blob = zlib.compress(track_encoding.encode_msgpack_track(playback), 6)
+            self._l2_put(cache_key, device_id, track_date, blob, len(playback.points))
+
+    @staticmethod
+    def _decode(blob: bytes) -> TrackPlaybackDto:
+        body = track_encoding.decode_msgpack_track(zlib.decompress(blob))
+        return TrackPlaybackDto.model_construct(
+            device_id=body["device_id"],
+            start_time_ms=body["start_time_ms"],
+            end_time_ms=body["end_time_ms"],
+            points=[TrackPointDto(**p) for p in body["points"]],
+        )
+
+    def _count(self, stat: str, n: int = 1):
+        with self._lock:
+            self._stats[stat] += n
+
+    # ------------------------------------------------------------------
+    # L1: in-process LRU by estimated size
+    # ------------------------------------------------------------------
+
+    def _l1_get(self, cache_key: str) -> Optional[TrackPlaybackDto]:
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                return None
+            playback, size, expires_at = entry
+            if expires_at is not None and time.monotonic() >= expires_at:
+                del self._entries[cache_key]
+                self._bytes -= size
+                return None
+            self._entries.move_to_end(cache_key)
+            return playback
+
+    def _l1_put(self, cache_key: str, playback: TrackPlaybackDto, expires_at: Optional[float]):
+        size = (len(playback.points) + 1) * self.POINT_MEMORY_BYTES
+        if size > self.memory_budget:
+            return
+        with self._lock:
+            old = self._entries.pop(cache_key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[cache_key] = (playback, size, expires_at)
+            self._bytes += size
+            while self._bytes > self.memory_budget:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._stats["l1_evictions"] += 1
+
+    # ------------------------------------------------------------------
+    # L2: track_cache table
+    # ------------------------------------------------------------------
+
+    def _l2_get(self, cache_key: str) -> Optional[bytes]:
+        db = open_session()
+        try:
+            row = db.query(TrackCacheDB.blob, TrackCacheDB.last_accessed_at).filter(
+                TrackCacheDB.cache_key == cache_key
+            ).first()
+            if row is None:
+                return None
+            now = datetime.utcnow()
+            if row.last_accessed_at is None or now - row.last_accessed_at > self.TOUCH_INTERVAL:
+                db.query(TrackCacheDB).filter(TrackCacheDB.cache_key == cache_key).update(
+                    {TrackCacheDB.last_accessed_at: now}, synchronize_session=False
+                )
+                db.commit()
+            return row.blob
+        except Exception as e:
+            db.rollback()
+            self._count("l2_errors")
+            logger.warning(f"Track cache L2 lookup failed for {cache_key}: {e}")
+            return None
+        finally:
+            close_session(db)
+
+    def _l2_put(self, cache_key: str, device_id: str, track_date: str, blob: bytes, point_count: int):
+        db = open_session()
+        try:
+            now = datetime.utcnow()
+            # Another worker may have stored the same window meanwhile: keep theirs
+            upsert_rows(db, TrackCacheDB, [{
+                "cache_key": cache_key,
+                "device_id": device_id,
+                "track_date": track_date,
+                "blob": blob,
+                "size_bytes": len(blob),
+                "point_count": point_count,
+                "created_at": now,
+                "last_accessed_at": now,
+            }], conflict_columns=["cache_key"], update_columns=[])
+            db.commit()
+            self._count("l2_writes")
+        except Exception as e:
+            db.rollback()
+            self._count("l2_errors")
+            logger.warning(f"Track cache L2 write failed for {cache_key}: {e}")
+        finally:
+            close_session(db)
+
+    def prune(self) -> Dict[str, int]:
+        """
+        Delete least recently read rows until the table is back under
+        PRUNE_TARGET_RATIO of its budget. Scheduled as "track_cache_prune".
+        """
+        db = SessionLocal()
+        try:
+            total = db.query(func.coalesce(func.sum(TrackCacheDB.size_bytes), 0)).scalar() or 0
+            if total <= self.db_budget:
+                return {"total_bytes": int(total), "deleted": 0}
+            excess = total - int(self.db_budget * self.PRUNE_TARGET_RATIO)
+            victims, freed = [], 0
+            for row in db.query(TrackCacheDB.cache_key, TrackCacheDB.size_bytes).order_by(
+                TrackCacheDB.last_accessed_at.asc()
+            ).yield_per(1000):
+                victims.append(row.cache_key)
+                freed += row.size_bytes
+                if freed >= excess:
+                    break
+            for start in range(0, len(victims), 500):
+                db.query(TrackCacheDB).filter(
+                    TrackCacheDB.cache_key.in_(victims[start:start + 500])
+                ).delete(synchronize_session=False)
+            db.commit()
+            self._count("l2_pruned", len(victims))
+            logger.info(f"🗺️ Track cache pruned {len(victims)} rows ({freed // 1024} KB)")
+            return {"total_bytes": int(total - freed), "deleted": len(victims)}
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    # ------------------------------------------------------------------
+    # Status
+    # ------------------------------------------------------------------
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            entries, size = len(self._entries), self._bytes
+        lookups = stats["l1_hits"] + stats["l2_hits"] + stats["misses"]
+        return {
+            **stats,
+            "hit_rate_percent": round((stats["l1_hits"] + stats["l2_hits"]) / lookups * 100, 1) if lookups else 0,
+            "l1_entries": entries,
+            "l1_estimated_bytes": size,
+            "l1_budget_bytes": self.memory_budget,
+            "l2_budget_bytes": self.db_budget,
+            "persistent": self.persistent,
+        }
+
+
+track_cache = TrackCache()
@@ -3,26 +3,48 @@ VMS Background Sync Service
 
 Periodically polls the manufacturer VMS API in bulk to keep device_cache
 fresh with ACC status, online state, and GPS coordinates. This is a
-workaround for broken VMS data-forwarding and can be disabled by setting
-SYNC_INTERVAL_SECONDS = 0 or calling vms_sync.stop().
+workaround for broken VMS data-forwarding. run_cycle() is scheduled as the
+"vms_sync" job (services/job_scheduler.py) and can be paused from the admin
+jobs endpoints.
 
 Budget: ~9 API calls per 60 s cycle (1 device_states + 8 GPS batches of 50),
 well within the 60 req/min rate limit.
+
+Modes (VMS_SYNC_MODE):
+- incremental (default): only devices whose device_cache.updated_at is
+  older than VMS_SYNC_STALE_SECONDS are polled — forwarding webhooks keep
+  the rest fresh. Candidates are ranked by staleness plus a boost for
+  devices a user viewed recently, and the number of device_states calls
+  per cycle is capped by the remaining vendor rate budget. Vendor calls
+  scale with forwarding gaps, not fleet size.
+- full: every assigned device in one device_states call per cycle.
+
+GPS gap filling (VMS_GPS_GAP_FILL, on by default): get_latest_gps_v2 is
+polled only for devices without a fix in VMS_GPS_GAP_SECONDS, and a vendor
+position is applied only if its timestamp is newer than
+device_cache.gps_time, so it never overwrites a fresher forwarded fix.
 """
 
 import asyncio
 import logging
+import os
+import threading
+import time
 from concurrent.futures import ThreadPoolExecutor
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from typing import Optional, List, Dict, Any
 
+from sqlalchemy import bindparam, func, insert, or_, update
 from sqlalchemy.orm import Session
 
 from database import SessionLocal
 from models.device_db import DeviceDB
 from models.device_cache_db import DeviceCacheDB, AlarmDB
+from services.device_auto_config_service import device_auto_config
+from services.job_scheduler import scheduler
 from services.manufacturer_api_service import manufacturer_api
 from services.notification_service import NotificationService
+from utils.db_upsert import upsert_rows
 
 logger = logging.getLogger(__name__)
 
@@ -32,11 +54,28 @@ _sync_thread_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="vms-sy
 class VMSSyncService:
 
     SYNC_INTERVAL_SECONDS = 60
+    SYNC_CYCLE_TIMEOUT = 45
     GPS_BATCH_SIZE = 50
 
+    # Incremental mode
+    STATES_BATCH_SIZE = 100           # deviceIds per device_states call
+    MAX_STATE_CALLS_PER_CYCLE = 5
+    MAX_GPS_CALLS_PER_CYCLE = 4
+    RATE_BUDGET_RESERVE = 15          # calls/min left for user-facing requests
+    VIEW_BOOST_WINDOW_SECONDS = 600   # a view counts for 10 min, decaying
+    VIEW_BOOST = 2.0                  # in units of "one threshold of staleness"
+
     def __init__(self):
-        self.running = False
-        self._task: Optional[asyncio.Task] = None
+        self.mode = os.getenv("VMS_SYNC_MODE", "incremental").lower()
+        self.stale_seconds = int(os.getenv("VMS_SYNC_STALE_SECONDS", "120"))
+        self.gps_gap_fill = os.getenv("VMS_GPS_GAP_FILL", "true").lower() in ("1", "true", "yes")
+        self.gps_gap_seconds = int(os.getenv("VMS_GPS_GAP_SECONDS", "300"))
+        self._gps_gap_candidates = 0
+        self._gps_rescued_total = 0
+        self._viewed: Dict[str, float] = {}
+        self._viewed_lock = threading.Lock()
+        self._stale_candidates = 0
+        self._poll_capacity: Optional[int] = None
         self._last_sync_at: Optional[datetime] = None
         self._last_sync_duration: Optional[float] = None
         self._last_error: Optional[str] = None
@@ -46,26 +85,22 @@ class VMSSyncService:
         logger.info("🔄 VMS Sync Service initialized")
 
     # ------------------------------------------------------------------
-    # Lifecycle
+    # Status
     # ------------------------------------------------------------------
 
-    def start(self):
-        if self._task is not None and not self._task.done():
-            logger.warning("⚠️ VMS Sync Service is already running")
-            return
-        self.running = True
-        self._task = asyncio.create_task(self._run_worker())
-        logger.info("✅ VMS Sync Service started")
-
-    def stop(self):
-        self.running = False
-        if self._task is not None:
-            self._task.cancel()
-            logger.info("🛑 VMS Sync Service stopped")
-
     def get_status(self) -> Dict[str, Any]:
         return {
-            "running": self.running,
+            "running": scheduler.is_active("vms_sync"),
+            "mode": self.mode,
+            "stale_seconds": self.stale_seconds,
+            "stale_candidates": self._stale_candidates,
+            "poll_capacity": self._poll_capacity,
+            "recently_viewed": len(self._viewed),
+            "gps_gap_fill": self.gps_gap_fill,
+            "gps_gap_seconds": self.gps_gap_seconds,
+            "gps_gap_candidates": self._gps_gap_candidates,
+            "gps_rescued_last_cycle": self._gps_updated,
+            "gps_rescued_total": self._gps_rescued_total,
             "last_sync_at": self._last_sync_at.isoformat() if self._last_sync_at else None,
             "last_sync_duration_s": round(self._last_sync_duration, 2) if self._last_sync_duration else None,
             "devices_synced": self._devices_synced,
@@ -74,35 +109,18 @@ class VMSSyncService:
             "last_error": self._last_error,
         }
 
-    # ------------------------------------------------------------------
-    # Worker loop
-    # ------------------------------------------------------------------
-
-    SYNC_CYCLE_TIMEOUT = 45
-
-    async def _run_worker(self):
-        logger.info(
-            f"🔄 VMS sync worker started, polling every {self.SYNC_INTERVAL_SECONDS}s"
-        )
-        while self.running:
-            try:
-                await asyncio.wait_for(
-                    self._sync_cycle(), timeout=self.SYNC_CYCLE_TIMEOUT
-                )
-            except asyncio.TimeoutError:
-                self._last_error = "Sync cycle timed out"
-                logger.error(
-                    f"❌ VMS sync cycle exceeded {self.SYNC_CYCLE_TIMEOUT}s timeout, skipping"
-                )
-            except Exception as e:
-                self._last_error = str(e)
-                logger.error(f"❌ VMS sync cycle error: {e}", exc_info=True)
-            await asyncio.sleep(self.SYNC_INTERVAL_SECONDS)
-
     # ------------------------------------------------------------------
     # Single sync cycle
     # ------------------------------------------------------------------
 
+    async def run_cycle(self):
+        """One sync pass; scheduled as the "vms_sync" job (see main.py)."""
+        try:
+            await self._sync_cycle()
+        except Exception as e:
+            self._last_error = str(e)
+            raise
+
     async def _sync_cycle(self):
         start = asyncio.get_event_loop().time()
 
@@ -119,20 +137,25 @@ class VMSSyncService:
 
         db: Session = SessionLocal()
         try:
-            device_ids = self._get_assigned_device_ids(db)
-            if not device_ids:
-                logger.debug("VMS sync: no assigned devices, skipping")
-                return
-
+            if self.mode == "full":
+                device_ids = self._get_assigned_device_ids(db)
+                batches = [device_ids]
+            else:
+                device_ids = self._select_stale_device_ids(db)
+                batches = [
+                    device_ids[i:i + self.STATES_BATCH_SIZE]
+                    for i in range(0, len(device_ids), self.STATES_BATCH_SIZE)
+                ]
             self._devices_synced = len(device_ids)
 
-            status_count = await self._sync_device_states(db, device_ids)
+            status_count = 0
+            for batch in batches if device_ids else []:
+                status_count += await self._sync_device_states(db, batch)
             db.flush()
-            # GPS sync disabled — forwarding webhooks provide real-time GPS.
-            # API polling overwrites fresh positions with stale data.
-            # To re-enable: uncomment the line below.
-            # gps_count = await self._sync_gps(db, device_ids)
-            gps_count = 0
+
+            # Forwarding webhooks are the GPS source of truth; the VMS only
+            # fills gaps, and only with fixes newer than what we hold.
+            gps_count = await self._fill_gps_gaps(db) if self.gps_gap_fill else 0
 
             db.commit()
 
@@ -145,7 +168,7 @@ class VMSSyncService:
             self._last_sync_duration = elapsed
             logger.info(
                 f"✅ VMS sync done: {len(device_ids)} devices, "
-                f"{status_count} statuses, {gps_count} GPS updates "
+                f"{status_count} statuses, {gps_count} GPS rescued "
                 f"in {elapsed:.1f}s"
             )
         except Exception:
@@ -167,6 +190,68 @@ class VMSSyncService:
         )
         return [r[0] for r in rows]
 
+    # ------------------------------------------------------------------
+    # Incremental selection
+    # ------------------------------------------------------------------
+
+    def note_viewed(self, device_ids):
+        """Record that a user just looked at these devices (boosts their poll priority)."""
+        now = time.monotonic()
+        with self._viewed_lock:
+            for did in device_ids:
+                self._viewed[did] = now
+
+    def _call_budget(self, max_calls: int) -> int:
+        """Vendor calls this cycle may spend, leaving RATE_BUDGET_RESERVE for users."""
+        budget = manufacturer_api.get_rate_budget()
+        if budget.get("enabled"):
+            return min(max_calls, max(budget["remaining"] - self.RATE_BUDGET_RESERVE, 0))
+        return max_calls
+
+    def _poll_budget(self) -> int:
+        """Max devices to poll this cycle, from the vendor rate budget."""
+        return self._call_budget(self.MAX_STATE_CALLS_PER_CYCLE) * self.STATES_BATCH_SIZE
+
+    def _select_stale_device_ids(self, db: Session) -> List[str]:
+        utcnow = datetime.utcnow()
+        cutoff = utcnow - timedelta(seconds=self.stale_seconds)
+        rows = (
+            db.query(DeviceDB.device_id, DeviceCacheDB.updated_at)
+            .outerjoin(DeviceCacheDB, DeviceCacheDB.device_id == DeviceDB.device_id)
+            .filter(DeviceDB.assigned_user_id.isnot(None))
+            .filter((DeviceCacheDB.updated_at.is_(None)) | (DeviceCacheDB.updated_at < cutoff))
+            .all()
+        )
+        self._stale_candidates = len(rows)
+
+        now = time.monotonic()
+        with self._viewed_lock:
+            for did, seen in list(self._viewed.items()):
+                if now - seen > self.VIEW_BOOST_WINDOW_SECONDS:
+                    del self._viewed[did]
+            viewed = dict(self._viewed)
+
+        def priority(row) -> float:
+            did, updated_at = row
+            if updated_at is None:
+                score = float("inf")  # never seen — poll first
+            else:
+                score = (utcnow - updated_at).total_seconds() / self.stale_seconds
+            seen = viewed.get(did)
+            if seen is not None:
+                score += self.VIEW_BOOST * (1 - (now - seen) / self.VIEW_BOOST_WINDOW_SECONDS)
+            return score
+
+        capacity = self._poll_budget()
+        self._poll_capacity = capacity
+        ranked = sorted(rows, key=priority, reverse=True)
+        if len(ranked) > capacity:
+            logger.info(
+                f"🔄 VMS sync: {len(ranked)} stale devices, polling top {capacity} "
+                f"(rate budget)"
+            )
+        return [did for did, _ in ranked[:capacity]]
+
     # ------------------------------------------------------------------
     # Device states (ACC + online)
     # ------------------------------------------------------------------
@@ -193,49 +278,75 @@ class VMSSyncService:
             return 0
 
         device_list = (result.get("data") or {}).get("list") or []
-        updated = 0
-        acc_changes: List[Dict[str, Any]] = []
 
+        # Last entry wins if the VMS repeats a device (one upsert row per key)
+        reported: Dict[str, Dict[str, Any]] = {}
         for item in device_list:
             did = item.get("deviceId")
-            if not did:
-                continue
+            if did:
+                reported[did] = item
+        if not reported:
+            return 0
 
+        ids = list(reported)
+        # Two queries for the whole fleet instead of two per device
+        caches = {
+            row.device_id: row
+            for row in db.query(
+                DeviceCacheDB.device_id,
+                DeviceCacheDB.acc_status,
+                DeviceCacheDB.last_online_time,
+                DeviceCacheDB.latitude,
+                DeviceCacheDB.longitude,
+                DeviceCacheDB.speed,
+            ).filter(DeviceCacheDB.device_id.in_(ids))
+        }
+        devices = {
+            row.device_id: row
+            for row in db.query(
+                DeviceDB.device_id, DeviceDB.parking_mode, DeviceDB.name
+            ).filter(DeviceDB.device_id.in_(ids))
+        }
+
+        now = datetime.utcnow()
+        online_rows: List[Dict[str, Any]] = []
+        offline_rows: List[Dict[str, Any]] = []
+        acc_changes: List[Dict[str, Any]] = []
+
+        for did, item in reported.items():
             acc_raw = item.get("accState", 0)
             acc_on = acc_raw == 1 or acc_raw is True
 
             state_raw = item.get("state", 0)
             is_online = state_raw == 1
 
-            cache = db.query(DeviceCacheDB).filter(
-                DeviceCacheDB.device_id == did
-            ).first()
+            cache = caches.get(did)
+            dev_row = devices.get(did)
+            parking_enabled = bool(dev_row.parking_mode) if dev_row else False
 
-            now = datetime.utcnow()
-            previous_acc = None
-            if cache is None:
-                cache = DeviceCacheDB(device_id=did)
-                db.add(cache)
-            else:
-                previous_acc = cache.acc_status
-
-            dev_row = db.query(DeviceDB).filter(DeviceDB.device_id == did).first()
-            parking_enabled = dev_row.parking_mode if dev_row else False
-
-            cache.acc_status = acc_on
             if not acc_on and parking_enabled:
-                cache.is_online = True
+                is_online = True
+
+            row = {
+                "device_id": did,
+                "acc_status": acc_on,
+                "is_online": is_online,
+                "parking_mode": parking_enabled,
+                "updated_at": now,
+            }
+            # Offline devices leave last_online_time alone, so a newer stamp
+            # written by the forwarding webhook since the read above survives
+            if is_online:
+                row["last_online_time"] = now
+                online_rows.append(row)
             else:
-                cache.is_online = is_online
-            cache.parking_mode = parking_enabled
-            if cache.is_online:
-                cache.last_online_time = now
-            cache.updated_at = now
-            updated += 1
+                offline_rows.append(row)
 
+            previous_acc = cache.acc_status if cache else None
             if previous_acc is not None and previous_acc != acc_on:
                 acc_changes.append({
                     "device_id": did,
+                    "device_name": (dev_row.name if dev_row else None) or did,
                     "acc_on": acc_on,
                     "previous": previous_acc,
                     "lat": cache.latitude,
@@ -243,44 +354,49 @@ class VMSSyncService:
                     "speed": (cache.speed / 10.0) if cache.speed else None,
                 })
 
+        # Every row of one upsert carries the same columns
+        upsert_rows(db, DeviceCacheDB, online_rows, conflict_columns=["device_id"])
+        upsert_rows(db, DeviceCacheDB, offline_rows, conflict_columns=["device_id"])
+
         if acc_changes:
             self._process_acc_notifications(db, acc_changes)
 
-        return updated
+        return len(online_rows) + len(offline_rows)
 
     def _process_acc_notifications(
         self, db: Session, changes: List[Dict[str, Any]]
     ) -> None:
-        """Create alarm records and send push notifications for ACC changes."""
+        """Create alarm records in one insert, then send push notifications for ACC changes."""
         import json as _json
 
+        now = datetime.utcnow()
+        db.execute(insert(AlarmDB), [
+            {
+                "device_id": ch["device_id"],
+                "alarm_type": 999002 if ch["acc_on"] else 999003,
+                "alarm_type_name": "ACC ON - Engine Started" if ch["acc_on"] else "ACC OFF - Engine Stopped",
+                "alarm_level": 1,
+                "latitude": ch.get("lat"),
+                "longitude": ch.get("lng"),
+                "speed": ch.get("speed"),
+                "alarm_time": now,
+                "alarm_data": _json.dumps({
+                    "type": "acc_change",
+                    "acc_status": "on" if ch["acc_on"] else "off",
+                    "device_name": ch["device_name"],
+                    "source": "vms_sync",
+                }),
+            }
+            for ch in changes
+        ])
+        logger.info(f"📋 [sync] Recorded {len(changes)} ACC change alarms")
+
         for ch in changes:
             did = ch["device_id"]
             acc_on = ch["acc_on"]
+            if acc_on:
+                device_auto_config.notify_acc_on(did)
             try:
-                device = db.query(DeviceDB).filter(DeviceDB.device_id == did).first()
-                device_name = device.name if device else did
-
-                alarm_type_id = 999002 if acc_on else 999003
-                alarm_name = "ACC ON - Engine Started" if acc_on else "ACC OFF - Engine Stopped"
-                new_alarm = AlarmDB(
-                    device_id=did,
-                    alarm_type=alarm_type_id,
-                    alarm_type_name=alarm_name,
-                    alarm_level=1,
-                    latitude=ch.get("lat"),
-                    longitude=ch.get("lng"),
-                    speed=ch.get("speed"),
-                    alarm_time=datetime.utcnow(),
-                    alarm_data=_json.dumps({
-                        "type": "acc_change",
-                        "acc_status": "on" if acc_on else "off",
-                        "device_name": device_name,
-                        "source": "vms_sync",
-                    }),
-                )
-                db.add(new_alarm)
-
                 sent = NotificationService.send_acc_notification(
                     db=db,
                     device_id=did,
@@ -298,16 +414,50 @@ class VMSSyncService:
     # GPS (batched)
     # ------------------------------------------------------------------
 
-    async def _sync_gps(self, db: Session, device_ids: List[str]) -> int:
-        updated = 0
+    async def _fill_gps_gaps(self, db: Session) -> int:
+        """
+        Poll latest GPS only for assigned devices without a fix in
+        gps_gap_seconds, most recently viewed first, then oldest fix first.
+
+        Returns:
+            Number of devices rescued (vendor fix newer than the cached one)
+        """
+        # gps_time is stored in server-local time (forwarding uses fromtimestamp)
+        cutoff = datetime.now() - timedelta(seconds=self.gps_gap_seconds)
+        rows = (
+            db.query(DeviceDB.device_id, DeviceCacheDB.gps_time)
+            .outerjoin(DeviceCacheDB, DeviceCacheDB.device_id == DeviceDB.device_id)
+            .filter(DeviceDB.assigned_user_id.isnot(None))
+            .filter((DeviceCacheDB.gps_time.is_(None)) | (DeviceCacheDB.gps_time < cutoff))
+            .all()
+        )
+        self._gps_gap_candidates = len(rows)
+        if not rows:
+            return 0
+
+        with self._viewed_lock:
+            viewed = dict(self._viewed)
+        rows.sort(key=lambda r: (r[0] not in viewed, r[1] or datetime.min))
+
+        capacity = self._call_budget(self.MAX_GPS_CALLS_PER_CYCLE) * self.GPS_BATCH_SIZE
+        known_times = {did: gps_time for did, gps_time in rows[:capacity]}
+        device_ids = list(known_times)
+
+        rescued = 0
         for i in range(0, len(device_ids), self.GPS_BATCH_SIZE):
             batch = device_ids[i : i + self.GPS_BATCH_SIZE]
-            count = await self._sync_gps_batch(db, batch)
-            updated += count
-        return updated
+            rescued += await self._sync_gps_batch(db, batch, known_times)
+
+        self._gps_rescued_total += rescued
+        if rescued:
+            logger.info(
+                f"🛰️ VMS GPS gap fill: rescued {rescued}/{len(device_ids)} polled "
+                f"({len(rows)} devices without a fix in {self.gps_gap_seconds}s)"
+            )
+        return rescued
 
     async def _sync_gps_batch(
-        self, db: Session, batch: List[str]
+        self, db: Session, batch: List[str], known_times: Dict[str, Optional[datetime]]
     ) -> int:
         try:
             loop = asyncio.get_running_loop()
@@ -328,51 +478,73 @@ class VMSSyncService:
             return 0
 
         device_list = (result.get("data") or {}).get("list") or []
-        updated = 0
+        now = datetime.utcnow()
+        updates: Dict[str, Dict[str, Any]] = {}
 
         for item in device_list:
             did = item.get("deviceId")
-            if not did:
+            if not did or did not in known_times:
                 continue
 
             gps = item.get("gps") or {}
             lat = gps.get("latitude")
             lng = gps.get("longitude")
-            if lat is None or lng is None:
+            gps_time_unix = gps.get("time")
+            if lat is None or lng is None or not gps_time_unix:
+                continue  # an undated fix can't be proven newer
+
+            gps_time = datetime.fromtimestamp(gps_time_unix)
+            known = known_times[did]
+            if known is not None and gps_time <= known:
                 continue
 
             speed_raw = gps.get("speed")
-            speed = speed_raw / 10.0 if speed_raw is not None else None
-
-            direction = gps.get("direction")
-            altitude = gps.get("altitude")
-            gps_time_unix = gps.get("time")
             last_online_unix = item.get("lastOnlineTime")
+            updates[did] = {
+                "_device_id": did,
+                "_gps_time": gps_time,
+                "_latitude": lat,
+                "_longitude": lng,
+                "_speed": speed_raw / 10.0 if speed_raw is not None else None,
+                "_direction": gps.get("direction"),
+                "_altitude": gps.get("altitude"),
+                "_last_online_time": (
+                    datetime.utcfromtimestamp(last_online_unix) if last_online_unix else None
+                ),
+            }
+
+        if not updates:
+            return 0
 
-            cache = db.query(DeviceCacheDB).filter(
-                DeviceCacheDB.device_id == did
-            ).first()
-
-            now = datetime.utcnow()
-            if cache is None:
-                cache = DeviceCacheDB(device_id=did)
-                db.add(cache)
-
-            cache.latitude = lat
-            cache.longitude = lng
-            cache.speed = speed
-            cache.direction = direction
-            cache.altitude = altitude
-
-            if gps_time_unix:
-                cache.gps_time = datetime.utcfromtimestamp(gps_time_unix)
-            if last_online_unix:
-                cache.last_online_time = datetime.utcfromtimestamp(last_online_unix)
-
-            cache.updated_at = now
-            updated += 1
+        # Devices with no cache row yet: create them (a concurrent webhook wins)
+        missing = [did for did in updates if known_times[did] is None]
+        if missing:
+            upsert_rows(
+                db, DeviceCacheDB,
+                [{"device_id": did} for did in missing],
+                conflict_columns=["device_id"], update_columns=[],
+            )
 
-        return updated
+        # Guarded in SQL too, so a forwarded fix that landed meanwhile is kept
+        table = DeviceCacheDB.__table__
+        stmt = (
+            update(table)
+            .where(table.c.device_id == bindparam("_device_id"))
+            .where(or_(table.c.gps_time.is_(None), table.c.gps_time < bindparam("_gps_time")))
+            .values(
+                latitude=bindparam("_latitude"),
+                longitude=bindparam("_longitude"),
+                speed=bindparam("_speed"),
+                direction=bindparam("_direction"),
+                altitude=bindparam("_altitude"),
+                gps_time=bindparam("_gps_time"),
+                last_online_time=func.coalesce(bindparam("_last_online_time"), table.c.last_online_time),
+                updated_at=now,
+            )
+        )
+        # One statement per device: executemany rowcount isn't reliable across
+        # drivers, and only rows the guard let through count as rescued
+        return sum(db.execute(stmt, params).rowcount for params in updates.values())
 
 
 vms_sync = VMSSyncService()
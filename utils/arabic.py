@@ -0,0 +1,49 @@
+"""
+Arabic text normalization for name matching.
+
+Folds the spelling variants that show up in user-typed district and city
+names (أ/إ/آ → ا, ة → ه, ى → ي, tatweel, diacritics, Arabic-Indic digits)
+so "حي النَّسيم" and "النسيم" resolve to the same key.
+"""
+import re
+
+_DIACRITICS = re.compile(r"[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED]")
+_TATWEEL = "\u0640"
+_PUNCT = re.compile(r"[^\w\s]", re.UNICODE)
+_SPACES = re.compile(r"\s+")
+
+_CHAR_MAP = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ة": "ه",
+    "ى": "ي",
+    "ؤ": "و",
+    "ئ": "ي",
+    "٠": "0", "١": "1", "٢": "2", "٣": "3", "٤": "4",
+    "٥": "5", "٦": "6", "٧": "7", "٨": "8", "٩": "9",
+})
+
+# Generic prefixes people put in front of district names ("حي الملقا", "Al Malqa District")
+_DISTRICT_PREFIXES = ("حي ", "حى ", "district ")
+_DISTRICT_SUFFIXES = (" district", " dist")
+
+
+def normalize_arabic(text: str) -> str:
+    """Lowercased, variant-folded, punctuation-free form of `text` for comparisons."""
+    if not text:
+        return ""
+    text = _DIACRITICS.sub("", text).replace(_TATWEEL, "")
+    text = text.translate(_CHAR_MAP).casefold()
+    text = _PUNCT.sub(" ", text)
+    return _SPACES.sub(" ", text).strip()
+
+
+def normalize_place_name(name: str) -> str:
+    """normalize_arabic plus removal of generic "حي"/"district" wrappers."""
+    key = normalize_arabic(name)
+    for prefix in _DISTRICT_PREFIXES:
+        if key.startswith(prefix):
+            key = key[len(prefix):]
+    for suffix in _DISTRICT_SUFFIXES:
+        if key.endswith(suffix):
+            key = key[: -len(suffix)]
+    return key.strip()
@@ -0,0 +1,82 @@
+"""
+Bulk upsert helper — one multi-row INSERT ... ON CONFLICT statement per chunk.
+
+Production runs PostgreSQL and local development MySQL, so the statement is
+built with the matching dialect construct. Any other dialect falls back to a
+per-row merge, which is correct but not set-based.
+"""
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy.orm import Session
+
+UPSERT_CHUNK_SIZE = 500
+
+
+def upsert_rows(
+    db: Session,
+    model,
+    rows: List[Dict[str, Any]],
+    conflict_columns: Sequence[str],
+    update_columns: Optional[Sequence[str]] = None,
+) -> int:
+    """
+    Insert rows, updating `update_columns` when `conflict_columns` collide.
+
+    Args:
+        db: Session to execute in (caller commits)
+        model: Declarative model class
+        rows: Column dicts; every row must carry the same keys
+        conflict_columns: Columns of the unique constraint to upsert on
+        update_columns: Columns to overwrite on conflict (default: all
+            non-conflict columns present in the rows; empty = do nothing)
+
+    Returns:
+        Number of rows submitted
+    """
+    if not rows:
+        return 0
+
+    if update_columns is None:
+        update_columns = [c for c in rows[0].keys() if c not in conflict_columns]
+
+    dialect = db.get_bind().dialect.name
+
+    for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        chunk = rows[start:start + UPSERT_CHUNK_SIZE]
+
+        if dialect in ("postgresql", "sqlite"):
+            if dialect == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+            stmt = insert(model).values(chunk)
+            if update_columns:
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=list(conflict_columns),
+                    set_={c: stmt.excluded[c] for c in update_columns},
+                )
+            else:
+                stmt = stmt.on_conflict_do_nothing(index_elements=list(conflict_columns))
+            db.execute(stmt)
+
+        elif dialect == "mysql":
+            from sqlalchemy.dialects.mysql import insert
+            stmt = insert(model).values(chunk)
+            # MySQL has no DO NOTHING; re-assigning the key column is a no-op update
+            set_ = {c: stmt.inserted[c] for c in update_columns} or {
+                conflict_columns[0]: stmt.inserted[conflict_columns[0]]
+            }
+            db.execute(stmt.on_duplicate_key_update(**set_))
+
+        else:
+            for row in chunk:
+                existing = db.query(model).filter_by(
+                    **{c: row[c] for c in conflict_columns}
+                ).first()
+                if existing is None:
+                    db.add(model(**row))
+                else:
+                    for c in update_columns:
+                        setattr(existing, c, row[c])
+
+    return len(rows)
@@ -0,0 +1,102 @@
+"""
+Geo helpers — great-circle distance and a uniform-grid spatial index.
+
+The grid index buckets points into fixed lat/lng cells (geohash-style) so a
+radius query only inspects the handful of cells around the query point.
+"""
+import math
+from typing import Callable, Dict, Hashable, Optional, Set, Tuple
+
+EARTH_RADIUS_M = 6_371_000.0
+METERS_PER_DEG_LAT = 111_320.0
+
+
+def haversine_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance between two points in meters."""
+    d_lat = math.radians(lat2 - lat1)
+    d_lng = math.radians(lng2 - lng1)
+    a = (math.sin(d_lat / 2) ** 2 +
+         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
+         math.sin(d_lng / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(lat: float, lng: float, radius_m: float) -> Tuple[float, float, float, float]:
+    """(min_lat, max_lat, min_lng, max_lng) enclosing a circle of radius_m."""
+    d_lat = radius_m / METERS_PER_DEG_LAT
+    d_lng = radius_m / (METERS_PER_DEG_LAT * max(math.cos(math.radians(lat)), 0.01))
+    return lat - d_lat, lat + d_lat, lng - d_lng, lng + d_lng
+
+
+class SpatialGrid:
+    """
+    Uniform grid index of keyed points.
+
+    Not thread-safe on its own — callers guard it with their own lock
+    (GeocodingService uses its cache lock).
+    """
+
+    def __init__(self, cell_deg: float = 0.001):
+        self.cell_deg = cell_deg
+        self._cells: Dict[Tuple[int, int], Set[Hashable]] = {}
+        self._points: Dict[Hashable, Tuple[float, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg)
+
+    def insert(self, key: Hashable, lat: float, lng: float):
+        if key in self._points:
+            self.remove(key)
+        self._points[key] = (lat, lng)
+        self._cells.setdefault(self._cell(lat, lng), set()).add(key)
+
+    def remove(self, key: Hashable):
+        point = self._points.pop(key, None)
+        if point is None:
+            return
+        cell = self._cell(*point)
+        bucket = self._cells.get(cell)
+        if bucket is not None:
+            bucket.discard(key)
+            if not bucket:
+                del self._cells[cell]
+
+    def clear(self):
+        self._cells.clear()
+        self._points.clear()
+
+    def nearest(
+        self,
+        lat: float,
+        lng: float,
+        radius_m: float,
+        accept: Optional[Callable[[Hashable], bool]] = None,
+    ) -> Optional[Tuple[Hashable, float]]:
+        """
+        Nearest key within radius_m of (lat, lng), or None.
+
+        Args:
+            accept: Optional filter (e.g. staleness check) applied to candidates
+
+        Returns:
+            (key, distance_m) tuple
+        """
+        min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_m)
+        lo_r, lo_c = self._cell(min_lat, min_lng)
+        hi_r, hi_c = self._cell(max_lat, max_lng)
+
+        best: Optional[Tuple[Hashable, float]] = None
+        for r in range(lo_r, hi_r + 1):
+            for c in range(lo_c, hi_c + 1):
+                for key in self._cells.get((r, c), ()):
+                    p_lat, p_lng = self._points[key]
+                    dist = haversine_m(lat, lng, p_lat, p_lng)
+                    if dist > radius_m or (best is not None and dist >= best[1]):
+                        continue
+                    if accept is not None and not accept(key):
+                        continue
+                    best = (key, dist)
+        return best
@@ -0,0 +1,203 @@
+"""
+Compact encodings for track playback responses.
+
+The default /gps/history body is one JSON object per point with five named
+fields, ~120 bytes per point. Clients that ask for it via Accept get a
+columnar form instead:
+
+  polyline (application/vnd.dashcam.track.polyline+json)
+      Google encoded polyline (precision 5, ~1 m) for the coordinates and
+      delta-encoded integer arrays for timestamp_ms, speed (km/h x10) and
+      direction (degrees). Decodable with any polyline library.
+
+  msgpack (application/x-msgpack)
+      The same columns as delta-encoded integer lists in a MessagePack map,
+      with coordinates at 1e-6 degrees (lossless for vendor data).
+
+Delta arrays hold the first value followed by differences. A null (missing
+speed/direction) stays null and the next value is relative to the last
+non-null one.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import msgpack
+
+from models.dto import TrackPlaybackDto, TrackPointDto
+
+JSON_MEDIA_TYPE = "application/json"
+POLYLINE_MEDIA_TYPE = "application/vnd.dashcam.track.polyline+json"
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+_MSGPACK_ALIASES = ("application/msgpack", "application/vnd.msgpack")
+
+POLYLINE_PRECISION = 5
+MSGPACK_COORD_SCALE = 1_000_000
+
+
+# ----------------------------------------------------------------------
+# Primitives
+# ----------------------------------------------------------------------
+
+def encode_polyline(latitudes: Sequence[float], longitudes: Sequence[float], precision: int = POLYLINE_PRECISION) -> str:
+    factor = 10 ** precision
+    out: List[str] = []
+    prev_lat = prev_lng = 0
+    for lat, lng in zip(latitudes, longitudes):
+        lat_i, lng_i = round(lat * factor), round(lng * factor)
+        for delta in (lat_i - prev_lat, lng_i - prev_lng):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                out.append(chr((0x20 | (value & 0x1F)) + 63))
+                value >>= 5
+            out.append(chr(value + 63))
+        prev_lat, prev_lng = lat_i, lng_i
+    return "".join(out)
+
+
+def decode_polyline(encoded: str, precision: int = POLYLINE_PRECISION) -> List[Tuple[float, float]]:
+    factor = 10 ** precision
+    coords: List[Tuple[float, float]] = []
+    index = lat = lng = 0
+    while index < len(encoded):
+        pair = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1F) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            pair.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += pair[0]
+        lng += pair[1]
+        coords.append((lat / factor, lng / factor))
+    return coords
+
+
+def delta_encode(values: Iterable[Optional[int]]) -> List[Optional[int]]:
+    out: List[Optional[int]] = []
+    prev = 0
+    for value in values:
+        if value is None:
+            out.append(None)
+            continue
+        out.append(value - prev)
+        prev = value
+    return out
+
+
+def delta_decode(deltas: Iterable[Optional[int]]) -> List[Optional[int]]:
+    out: List[Optional[int]] = []
+    current = 0
+    for delta in deltas:
+        if delta is None:
+            out.append(None)
+            continue
+        current += delta
+        out.append(current)
+    return out
+
+
+def _scaled(values: Iterable[Optional[float]], scale: float) -> List[Optional[int]]:
+    return [None if v is None else round(v * scale) for v in values]
+
+
+# ----------------------------------------------------------------------
+# Track encoders
+# ----------------------------------------------------------------------
+
+def _header(playback: TrackPlaybackDto, encoding: str, extra: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    body = {
+        "success": True,
+        "device_id": playback.device_id,
+        "start_time_ms": playback.start_time_ms,
+        "end_time_ms": playback.end_time_ms,
+        "encoding": encoding,
+        "count": len(playback.points),
+    }
+    if extra:
+        body.update(extra)
+    return body
+
+
+def _columns(points: List[TrackPointDto]) -> Dict[str, List[Optional[int]]]:
+    return {
+        "timestamp_ms_delta": delta_encode(p.timestamp_ms for p in points),
+        "speed_x10_delta": delta_encode(_scaled((p.speed_kmh for p in points), 10)),
+        "direction_delta": delta_encode(_scaled((p.direction_deg for p in points), 1)),
+    }
+
+
+def encode_polyline_track(playback: TrackPlaybackDto, extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    points = playback.points
+    body = _header(playback, "polyline", extra)
+    body["precision"] = POLYLINE_PRECISION
+    body["polyline"] = encode_polyline([p.latitude for p in points], [p.longitude for p in points])
+    body.update(_columns(points))
+    return body
+
+
+def encode_msgpack_track(playback: TrackPlaybackDto, extra: Optional[Dict[str, Any]] = None) -> bytes:
+    points = playback.points
+    body = _header(playback, "columnar", extra)
+    body["coord_scale"] = MSGPACK_COORD_SCALE
+    body["latitude_delta"] = delta_encode(_scaled((p.latitude for p in points), MSGPACK_COORD_SCALE))
+    body["longitude_delta"] = delta_encode(_scaled((p.longitude for p in points), MSGPACK_COORD_SCALE))
+    body.update(_columns(points))
+    return msgpack.packb(body, use_bin_type=True)
+
+
+def decode_msgpack_track(payload: bytes) -> Dict[str, Any]:
+    """Inverse of encode_msgpack_track, back to the default JSON shape."""
+    body = msgpack.unpackb(payload, raw=False)
+    scale = body.pop("coord_scale")
+    columns = [
+        delta_decode(body.pop("latitude_delta")),
+        delta_decode(body.pop("longitude_delta")),
+        delta_decode(body.pop("timestamp_ms_delta")),
+        delta_decode(body.pop("speed_x10_delta")),
+        delta_decode(body.pop("direction_delta")),
+    ]
+    body.pop("encoding", None)
+    body.pop("count", None)
+    body["points"] = [
+        {
+            "latitude": lat / scale,
+            "longitude": lng / scale,
+            "timestamp_ms": ts,
+            "speed_kmh": None if speed is None else speed / 10,
+            "direction_deg": direction,
+        }
+        for lat, lng, ts, speed, direction in zip(*columns)
+    ]
+    return body
+
+
+# ----------------------------------------------------------------------
+# Negotiation
+# ----------------------------------------------------------------------
+
+def negotiate(accept: Optional[str]) -> str:
+    """
+    Pick the track media type for an Accept header: highest q wins, ties
+    go to the earlier entry; anything unrecognised falls back to JSON.
+    """
+    best, best_q = JSON_MEDIA_TYPE, 0.0
+    for part in (accept or "").split(","):
+        fields = [f.strip() for f in part.split(";")]
+        media_type = fields[0].lower()
+        if media_type in _MSGPACK_ALIASES:
+            media_type = MSGPACK_MEDIA_TYPE
+        if media_type not in (POLYLINE_MEDIA_TYPE, MSGPACK_MEDIA_TYPE, JSON_MEDIA_TYPE):
+            continue
+        q = 1.0
+        for param in fields[1:]:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if q > best_q:
+            best, best_q = media_type, q
+    return best
@@ -0,0 +1,120 @@
+"""
+Track simplification — Douglas-Peucker over a day's GPS points.
+
+The mobile client draws /gps/history as a polyline. At a given zoom, any
+vertex within a pixel of the line through its neighbours is invisible, so
+a long driving day (tens of thousands of points) collapses to a few
+thousand without a visible change.
+
+Points are projected to local meters (equirectangular around the track's
+mean latitude). Douglas-Peucker runs level by level: every round measures
+all open spans in one set of NumPy expressions and splits each at its
+farthest point, so the cost is a few dozen array passes rather than one
+Python step per kept vertex. Indices passed as `keep` (stops, alarm points)
+are anchors from the start, so they always survive.
+"""
+import math
+from typing import Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from utils.geo import METERS_PER_DEG_LAT
+
+# Web-mercator ground resolution at zoom 0 on the equator (m/pixel)
+_METERS_PER_PIXEL_Z0 = 156_543.03392
+
+STOP_SPEED_KMH = 1.0
+STOP_GAP_MS = 3 * 60 * 1000  # no points for 3 min: device parked/off
+
+
+def tolerance_for_zoom(zoom: float, latitude: float, pixels: float = 1.0) -> float:
+    """Meters covered by `pixels` screen pixels at this zoom and latitude."""
+    return pixels * _METERS_PER_PIXEL_Z0 * math.cos(math.radians(latitude)) / (2 ** zoom)
+
+
+def stop_indices(speeds: Sequence[Optional[float]], timestamps_ms: Sequence[int]) -> List[int]:
+    """
+    First and last index of every stop: runs of points below STOP_SPEED_KMH,
+    plus both sides of gaps longer than STOP_GAP_MS.
+    """
+    n = len(timestamps_ms)
+    if n < 2:
+        return list(range(n))
+    speed = np.array([s if s is not None else np.inf for s in speeds], dtype=float)
+    stopped = speed < STOP_SPEED_KMH
+    edges = np.flatnonzero(np.diff(stopped.astype(np.int8)))
+    # diff marks the last point before a change: run starts at edge+1, ends at edge
+    keep = set((edges[stopped[edges + 1]] + 1).tolist()) | set(edges[stopped[edges]].tolist())
+    if stopped[0]:
+        keep.add(0)
+    if stopped[-1]:
+        keep.add(n - 1)
+    gaps = np.flatnonzero(np.diff(np.asarray(timestamps_ms, dtype=np.int64)) > STOP_GAP_MS)
+    keep.update(gaps.tolist())
+    keep.update((gaps + 1).tolist())
+    return sorted(keep)
+
+
+def nearest_indices(timestamps_ms: Sequence[int], targets_ms: Iterable[int]) -> List[int]:
+    """Index of the point closest in time to each target (alarm times)."""
+    ts = np.asarray(timestamps_ms, dtype=np.int64)
+    if not len(ts):
+        return []
+    return sorted({int(np.abs(ts - t).argmin()) for t in targets_ms})
+
+
+def simplify(
+    latitudes: Sequence[float],
+    longitudes: Sequence[float],
+    tolerance_m: float,
+    keep: Iterable[int] = (),
+) -> np.ndarray:
+    """Sorted indices of the points to keep (always includes first and last)."""
+    n = len(latitudes)
+    if n <= 2 or tolerance_m <= 0:
+        return np.arange(n)
+
+    lat = np.asarray(latitudes, dtype=float)
+    lng = np.asarray(longitudes, dtype=float)
+    scale = math.cos(math.radians(float(lat.mean())))
+    x = lng * (METERS_PER_DEG_LAT * scale)
+    y = lat * METERS_PER_DEG_LAT
+
+    kept = np.zeros(n, dtype=bool)
+    kept[[0, n - 1]] = True
+    kept[[i for i in keep if 0 <= i < n]] = True
+    settled = kept.copy()
+    tol_sq = tolerance_m * tolerance_m
+
+    # Level-synchronous: each round splits every open span at its farthest
+    # point in one pass, instead of one NumPy call per span
+    while True:
+        candidates = np.flatnonzero(~settled)
+        if not len(candidates):
+            break
+        anchors = np.flatnonzero(kept)
+        span = np.searchsorted(anchors, candidates) - 1
+        start, end = anchors[span], anchors[span + 1]
+
+        dx, dy = x[end] - x[start], y[end] - y[start]
+        px, py = x[candidates] - x[start], y[candidates] - y[start]
+        seg_sq = dx * dx + dy * dy
+        # Distance to the segment, not the infinite line, so back-tracks count;
+        # a closed loop (start == end) measures distance to that point
+        t = np.clip(np.divide(px * dx + py * dy, seg_sq, out=np.zeros_like(px), where=seg_sq > 0), 0.0, 1.0)
+        ex, ey = px - t * dx, py - t * dy
+        dist_sq = ex * ex + ey * ey
+
+        # candidates are sorted, so each span's points are contiguous
+        group_starts = np.flatnonzero(np.r_[True, span[1:] != span[:-1]])
+        group = np.repeat(np.arange(len(group_starts)), np.diff(np.r_[group_starts, len(span)]))
+        span_max = np.maximum.reduceat(dist_sq, group_starts)
+        split = span_max[group] > tol_sq
+
+        settled[candidates[~split]] = True
+        farthest = np.flatnonzero(split & (dist_sq == span_max[group]))
+        farthest = farthest[np.r_[True, group[farthest[1:]] != group[farthest[:-1]]]] if len(farthest) else farthest
+        kept[candidates[farthest]] = True
+        settled[candidates[farthest]] = True
+
+    return np.flatnonzero(kept)